@@ -0,0 +1,225 @@
+# Batch mode of the CLI: many files analysed concurrently through one pooled keep-alive client.
+#
+# Each file is uploaded once, streamed from disk as a multipart body to POST /datasets/, and every
+# later call refers to it by the returned dataset_id. Files are processed `concurrency` at a time
+# over a shared connection pool. Requests failing with a connection error or a 429/502/503/504
+# are retried with exponential backoff, honouring Retry-After. Report generation is not idempotent,
+# so it is only retried when the server cannot have started it: a failed connect or a 429.
+
+import asyncio
+import glob
+import json
+import os
+from typing import NamedTuple
+
+import httpx
+from rich.console import Console
+from rich.progress import BarColumn, Progress, TaskProgressColumn, TextColumn, TimeRemainingColumn
+
+from app import config
+
+# Analysis type -> (route, CLI option -> query parameter)
+ANALYSES = {
+    "descriptive": ("/descriptive/", {}),
+    "linear_regression": ("/linear_regression/", {"x_column": "x", "y_column": "y"}),
+    "decision_tree": ("/decision_tree/", {"target_column": "target_column", "feature_columns": "feature_columns"}),
+}
+RETRY_STATUSES = {429, 502, 503, 504}
+# Refused before any work was done, so safe to retry for calls that are not idempotent
+REJECTED_STATUSES = {429}
+
+
+class BatchError(Exception):
+    pass
+
+
+class BatchJob(NamedTuple):
+    path: str
+    analysis: str = None  # one of ANALYSES, or None to only generate a report
+    params: dict = {}  # query parameters of the analysis
+    report: bool = False
+
+
+def analysis_params(analysis: str, **options) -> dict:
+    """Query parameters of an analysis from the CLI's column options; unset options are left out."""
+    return {param: options[option] for option, param in ANALYSES[analysis][1].items() if options.get(option)}
+
+
+def jobs_from_glob(pattern: str, analysis: str = None, params: dict = None, report: bool = False) -> list:
+    paths = sorted(path for path in glob.glob(pattern, recursive=True) if os.path.isfile(path))
+    return [BatchJob(path, analysis, params or {}, report) for path in paths]
+
+
+def jobs_from_manifest(path: str) -> list:
+    """
+    Jobs listed in a JSON manifest: a list of {"file", "type", "params", "report"} objects.
+    Relative file paths are resolved against the manifest's directory. Raises ValueError for an unknown type.
+    """
+    with open(path) as f:
+        entries = json.load(f)
+    base = os.path.dirname(os.path.abspath(path))
+    jobs = []
+    for entry in entries:
+        analysis = entry.get("type")
+        if analysis is not None and analysis not in ANALYSES:
+            raise ValueError(f"Unknown analysis type: {analysis}; use one of {', '.join(ANALYSES)}.")
+        jobs.append(BatchJob(os.path.join(base, entry["file"]), analysis, entry.get("params", {}),
+                             entry.get("report", False)))
+    return jobs
+
+
+class _ProgressReader:
+    """Read-through file wrapper advancing a progress bar as httpx streams the body."""
+
+    def __init__(self, file, progress: Progress, task):
+        self.file = file
+        self.progress = progress
+        self.task = task
+        self.sent = 0
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self.file.read(size)
+        self.sent += len(chunk)
+        self.progress.advance(self.task, len(chunk))
+        return chunk
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+
+def _detail(response: httpx.Response) -> str:
+    try:
+        return str(response.json().get("detail", response.text))
+    except (ValueError, AttributeError):
+        return response.text
+
+
+class BatchRunner:
+    def __init__(self, base_url: str, concurrency: int = None, retries: int = None, timeout: float = None,
+                 backoff: float = 0.5, console: Console = None, transport: httpx.AsyncBaseTransport = None):
+        """
+        Runs BatchJobs against the API.
+        :param concurrency: Files processed at once, and the size of the connection pool.
+        :param retries: Attempts per request before its error is reported.
+        :param backoff: Seconds before the first retry, doubled for each further one.
+        """
+        self.base_url = base_url
+        self.concurrency = concurrency or config.CLI_BATCH_CONCURRENCY
+        self.retries = max(1, retries or config.CLI_BATCH_RETRIES)
+        self.timeout = timeout or config.CLI_REQUEST_TIMEOUT
+        self.backoff = backoff
+        self.console = console or Console()
+        self.transport = transport
+        self._progress = None
+        self._uploaded = None  # progress task of the uploaded bytes
+        self._done = None  # progress task of the finished files
+
+    def run(self, jobs: list) -> list:
+        """Results in job order: {"file", "dataset_id", "analysis", "report_id"} or {"file", "error"}."""
+        return asyncio.run(self.run_async(jobs))
+
+    async def run_async(self, jobs: list) -> list:
+        limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        columns = (TextColumn("{task.description}"), BarColumn(), TaskProgressColumn(), TimeRemainingColumn())
+        with Progress(*columns, console=self.console, transient=True) as progress:
+            self._progress = progress
+            self._uploaded = progress.add_task("Uploading", total=sum(self._size(job.path) for job in jobs))
+            self._done = progress.add_task("Files", total=len(jobs))
+            async with httpx.AsyncClient(base_url=self.base_url, limits=limits, timeout=self.timeout,
+                                         transport=self.transport) as client:
+                return await asyncio.gather(*(self._run_job(client, semaphore, job) for job in jobs))
+
+    @staticmethod
+    def _size(path: str) -> int:
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+
+    async def _run_job(self, client: httpx.AsyncClient, semaphore: asyncio.Semaphore, job: BatchJob) -> dict:
+        result = {"file": job.path}
+        async with semaphore:
+            try:
+                result["dataset_id"] = await self._upload(client, job.path)
+                if job.analysis is not None:
+                    result["analysis"] = await self._call(client, job.path, result, ANALYSES[job.analysis][0],
+                                                          job.params)
+                if job.report:
+                    report = await self._call(client, job.path, result, "/generate_report/", {}, idempotent=False)
+                    result["report_id"] = report["report_id"]
+            except (BatchError, httpx.HTTPError, OSError) as e:
+                result["error"] = str(e) or type(e).__name__
+        self._progress.advance(self._done)
+        return result
+
+    async def _upload(self, client: httpx.AsyncClient, path: str) -> str:
+        response = await self._post(client, "/datasets/", {}, path)
+        return self._check(response)["dataset_id"]
+
+    async def _call(self, client: httpx.AsyncClient, path: str, result: dict, url: str, params: dict,
+                    idempotent: bool = True) -> dict:
+        response = await self._post(client, url, {**params, "dataset_id": result["dataset_id"]}, idempotent=idempotent)
+        if response.status_code == 404:
+            # The server dropped the dataset (or another replica answered): upload it again once
+            result["dataset_id"] = await self._upload(client, path)
+            response = await self._post(client, url, {**params, "dataset_id": result["dataset_id"]},
+                                        idempotent=idempotent)
+        return self._check(response)
+
+    async def _post(self, client: httpx.AsyncClient, url: str, params: dict, path: str = None,
+                    idempotent: bool = True) -> httpx.Response:
+        """
+        POST with retries; the file at `path`, if any, is re-opened and streamed on each attempt.
+        :param idempotent: False to only retry requests the server refused or never received.
+        """
+        retry_statuses = RETRY_STATUSES if idempotent else REJECTED_STATUSES
+        retry_errors = httpx.TransportError if idempotent else (httpx.ConnectError, httpx.ConnectTimeout)
+        for attempt in range(self.retries):
+            last = attempt == self.retries - 1
+            reader = None
+            try:
+                if path is None:
+                    response = await client.post(url, params=params)
+                else:
+                    with open(path, "rb") as f:
+                        reader = _ProgressReader(f, self._progress, self._uploaded)
+                        response = await client.post(url, params=params,
+                                                     files={"file": (os.path.basename(path), reader)})
+            except retry_errors:
+                if last:
+                    raise
+                delay = self.backoff * 2 ** attempt
+            else:
+                if response.status_code not in retry_statuses or last:
+                    return response
+                retry_after = response.headers.get("retry-after", "")
+                delay = float(retry_after) if retry_after.isdigit() else self.backoff * 2 ** attempt
+            if reader is not None:
+                self._progress.advance(self._uploaded, -reader.sent)
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    def _check(response: httpx.Response) -> dict:
+        if response.status_code >= 400:
+            raise BatchError(f"{response.status_code} {response.request.url.path}: {_detail(response)}")
+        return response.json()
+
+
+def run_batch(jobs: list, base_url: str, concurrency: int = None, retries: int = None, output: str = None,
+              console: Console = None) -> list:
+    """Run the jobs, then print one line per file, or write the results as JSON lines to `output`."""
+    console = console or Console()
+    results = BatchRunner(base_url, concurrency, retries, console=console).run(jobs)
+    if output:
+        with open(output, "w") as f:
+            for result in results:
+                f.write(json.dumps(result, default=str) + "\n")
+    for result in results:
+        if "error" in result:
+            console.print(f"[bold red]Error:[/bold red] {result['file']}: {result['error']}")
+        elif not output:
+            console.print(f"{result['file']}: {json.dumps({k: v for k, v in result.items() if k != 'file'})}")
+    failed = sum("error" in result for result in results)
+    console.print(f"{len(results) - failed} of {len(results)} files processed" + (f", {failed} failed" if failed else ""))
+    return results
@@ -66,6 +66,29 @@ def download_report(report_id):
     else:
         console.print(f"[bold red]Error:[/bold red] {response.text}")
 
+def run_batch(args):
+    # httpx is only needed here; keep it out of the CLI's cold start
+    from app.cli.batch import analysis_params, jobs_from_glob, jobs_from_manifest, run_batch as run_jobs
+
+    if args.manifest:
+        try:
+            jobs = jobs_from_manifest(args.manifest)
+        except (OSError, ValueError) as e:
+            console.print(f"[bold red]Error:[/bold red] Invalid manifest: {e}")
+            return
+    elif args.file:
+        params = analysis_params(args.type, x_column=args.x_column, y_column=args.y_column,
+                                 target_column=args.target_column,
+                                 feature_columns=args.feature_columns) if args.type else {}
+        jobs = jobs_from_glob(args.file, args.type, params, args.report)
+    else:
+        console.print("[bold red]Error:[/bold red] A glob pattern or --manifest must be specified.")
+        return
+    if not jobs:
+        console.print("[bold red]Error:[/bold red] No files to process.")
+        return
+    run_jobs(jobs, API_URL, args.concurrency, args.retries, args.output, console)
+
 def process_command(query):
     tokens = process_user_query(query)
     action = interpret_query(tokens)
@@ -74,13 +97,18 @@ def process_command(query):
 def main():
     parser = argparse.ArgumentParser(description="AI Employee CLI for data analysis and reporting.")
     parser.add_argument("command", help="The action to perform.")
-    parser.add_argument("file", help="Path to the file for upload or analysis.", nargs='?')
+    parser.add_argument("file", help="Path to the file for upload or analysis, or a glob pattern for batch.", nargs='?')
     parser.add_argument("--type", choices=["descriptive", "linear_regression", "decision_tree"], help="Type of analysis to perform.")
     parser.add_argument("--x_column", help="Column name for x in linear regression.")
     parser.add_argument("--y_column", help="Column name for y in linear regression.")
     parser.add_argument("--target_column", help="Target column for decision tree regression.")
     parser.add_argument("--feature_columns", help="Comma-separated feature columns for decision tree regression.")
     parser.add_argument("--report_id", help="ID of the report to download.")
+    parser.add_argument("--manifest", help="JSON list of {file, type, params, report} jobs for batch.")
+    parser.add_argument("--report", action="store_true", help="Also generate a report for each file in batch.")
+    parser.add_argument("--concurrency", type=int, help="Files processed at once in batch.")
+    parser.add_argument("--retries", type=int, help="Attempts per request in batch.")
+    parser.add_argument("--output", help="Write the batch results to this file as JSON lines.")
     
     args = parser.parse_args()
 
@@ -109,6 +137,8 @@ def main():
                 generate_report(args.file)
             else:
                 console.print("[bold red]Error:[/bold red] File path must be specified.")
+        elif args.command == "batch":
+            run_batch(args)
         elif args.command == "list":
             list_reports()
         elif args.command == "download":
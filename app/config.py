@@ -0,0 +1,109 @@
+import os
+
+# Root directory for state the service keeps on local disk
+DATA_DIR = os.getenv("AI_EMPLOYEE_DATA_DIR", "data")
+
+# Web worker processes serving the app; `python -m app.serve` defaults this to the CPU count
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+# Each web worker's share of the cores, the default size of its compute pool and tree fits
+WORKER_CORES = max(1, (os.cpu_count() or 1) // WEB_CONCURRENCY)
+# Directory the web workers write their metrics to every METRICS_FLUSH_SECONDS, so /metrics adds up all
+# of them; `python -m app.serve` creates one when it runs several workers. Empty: this process only
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+
+# Reports and spilled datasets live in a directory (shared by all workers and replicas when they run
+# on a common volume) or in an S3 bucket: REPORTS_DIR and DATASET_SPILL_DIR accept s3://bucket/prefix
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")  # e.g. http://minio:9000; unset for AWS
+S3_MAX_POOL_CONNECTIONS = int(os.getenv("S3_MAX_POOL_CONNECTIONS", "32"))
+
+# Dataset store: in-memory byte budget and spill directory for evicted frames
+DATASET_CACHE_BYTES = int(os.getenv("DATASET_CACHE_BYTES", str(1024 ** 3)))
+DATASET_SPILL_DIR = os.getenv("DATASET_SPILL_DIR", os.path.join(DATA_DIR, "datasets"))
+# Write every stored dataset to DATASET_SPILL_DIR too, so any worker can serve its dataset_id
+DATASET_WRITE_THROUGH = os.getenv("DATASET_WRITE_THROUGH", "1" if WEB_CONCURRENCY > 1 else "0") == "1"
+
+# Rows per chunk when streaming uploads with read_file_chunks
+STREAM_CHUNK_ROWS = int(os.getenv("STREAM_CHUNK_ROWS", "100000"))
+
+# Default normalized rank error for approximate quantiles (KLL sketches)
+QUANTILE_ERROR = float(os.getenv("QUANTILE_ERROR", "0.01"))
+
+# Column profiles shared by descriptive statistics and reports
+PROFILE_TOP_K = int(os.getenv("PROFILE_TOP_K", "20"))
+PROFILE_HISTOGRAM_BINS = int(os.getenv("PROFILE_HISTOGRAM_BINS", "50"))
+PROFILE_CACHE_ENTRIES = int(os.getenv("PROFILE_CACHE_ENTRIES", "256"))
+
+# Fitted model registry: joblib files on disk, the most recently used also kept in memory
+MODEL_DIR = os.getenv("MODEL_DIR", os.path.join(DATA_DIR, "models"))
+MODEL_STORE_ENTRIES = int(os.getenv("MODEL_STORE_ENTRIES", "256"))
+MODEL_CACHE_ENTRIES = int(os.getenv("MODEL_CACHE_ENTRIES", "16"))
+# Tree models: cores per fit or search (-1 = all), cross-validation folds of the hyperparameter search
+TREE_N_JOBS = int(os.getenv("TREE_N_JOBS", str(WORKER_CORES)))
+TREE_SEARCH_CV = int(os.getenv("TREE_SEARCH_CV", "5"))
+# Grouped aggregation: datasets with more rows are split into shards aggregated on separate compute workers
+AGGREGATION_SHARD_ROWS = int(os.getenv("AGGREGATION_SHARD_ROWS", "1000000"))
+# Default and maximum number of predictions returned per page
+PREDICTIONS_PAGE_SIZE = int(os.getenv("PREDICTIONS_PAGE_SIZE", "1000"))
+PREDICTIONS_MAX_PAGE_SIZE = int(os.getenv("PREDICTIONS_MAX_PAGE_SIZE", "100000"))
+# Rows per NDJSON line batch or Arrow record batch when streaming results
+RESPONSE_CHUNK_ROWS = int(os.getenv("RESPONSE_CHUNK_ROWS", "50000"))
+# Cache of JSON analysis results: memory size (0 disables), seconds a result is served for (0 = until evicted),
+# optional directory that survives restarts and its size, and the code version in the key (default: source hash)
+RESULT_CACHE_BYTES = int(os.getenv("RESULT_CACHE_BYTES", str(64 * 1024 ** 2)))
+RESULT_CACHE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", "3600"))
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", "")
+RESULT_CACHE_DISK_BYTES = int(os.getenv("RESULT_CACHE_DISK_BYTES", str(1024 ** 3)))
+RESULT_CACHE_VERSION = os.getenv("RESULT_CACHE_VERSION", "")
+
+# Compute executor for CPU-bound analysis and report jobs
+COMPUTE_EXECUTOR = os.getenv("COMPUTE_EXECUTOR", "process")  # "process" or "thread"
+COMPUTE_START_METHOD = os.getenv("COMPUTE_START_METHOD", "spawn")
+COMPUTE_WORKERS = int(os.getenv("COMPUTE_WORKERS", str(WORKER_CORES)))
+COMPUTE_QUEUE_SIZE = int(os.getenv("COMPUTE_QUEUE_SIZE", "32"))
+COMPUTE_TIMEOUT = float(os.getenv("COMPUTE_TIMEOUT", "300"))
+
+# Generated PDF reports and the background report job queue
+REPORTS_DIR = os.getenv("REPORTS_DIR", "generated_reports")
+REPORT_JOBS_DB = os.getenv("REPORT_JOBS_DB", os.path.join(DATA_DIR, "report_jobs.sqlite3"))
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "2"))
+# Running jobs of a worker on another host are requeued once they have made no progress for this long
+REPORT_JOB_LEASE_SECONDS = float(os.getenv("REPORT_JOB_LEASE_SECONDS", "900"))
+# Seconds between checks for running jobs whose worker exited or whose lease expired
+REPORT_JOB_RECHECK_SECONDS = float(os.getenv("REPORT_JOB_RECHECK_SECONDS", "60"))
+# Catalog of stored reports; the oldest PDFs are deleted beyond the age and size limits (0 = no limit)
+REPORT_CATALOG_DB = os.getenv("REPORT_CATALOG_DB", os.path.join(DATA_DIR, "report_catalog.sqlite3"))
+REPORTS_MAX_AGE_DAYS = float(os.getenv("REPORTS_MAX_AGE_DAYS", "0"))
+REPORTS_MAX_BYTES = int(os.getenv("REPORTS_MAX_BYTES", "0"))
+# Seconds between re-reads of the report storage by GET /reports/, to list reports stored by other
+# replicas with their own catalog (0 = only on first use)
+REPORT_CATALOG_SYNC_SECONDS = float(os.getenv("REPORT_CATALOG_SYNC_SECONDS", "0"))
+# Default and maximum number of reports returned per page by GET /reports/
+REPORTS_PAGE_SIZE = int(os.getenv("REPORTS_PAGE_SIZE", "100"))
+REPORTS_MAX_PAGE_SIZE = int(os.getenv("REPORTS_MAX_PAGE_SIZE", "1000"))
+
+# Chart rendering for reports
+CHART_BACKEND = os.getenv("CHART_BACKEND", "plotly")  # "plotly" or "matplotlib"
+CHART_WORKERS = int(os.getenv("CHART_WORKERS", "4"))
+CHART_CACHE_ENTRIES = int(os.getenv("CHART_CACHE_ENTRIES", "512"))
+CHART_MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", "2000"))
+CHART_TOP_K = int(os.getenv("CHART_TOP_K", "10"))
+CHART_NUMERIC_STYLE = os.getenv("CHART_NUMERIC_STYLE", "series")  # "series" or "histogram"
+
+# Cold-start import budget for the CLI, checked by tests/test_cli_startup.py
+CLI_IMPORT_BUDGET_MS = float(os.getenv("CLI_IMPORT_BUDGET_MS", "500"))
+# CLI batch mode: files processed at once, attempts per request, per-request timeout in seconds
+CLI_BATCH_CONCURRENCY = int(os.getenv("CLI_BATCH_CONCURRENCY", "8"))
+CLI_BATCH_RETRIES = int(os.getenv("CLI_BATCH_RETRIES", "3"))
+CLI_REQUEST_TIMEOUT = float(os.getenv("CLI_REQUEST_TIMEOUT", "300"))
+
+# Token clients send in X-Admin-Token for the /admin routes and X-Profile requests; unset disables both
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# Opt-in request profiling: stacks are sampled during every request and saved, as collapsed
+# stacks, for requests slower than the threshold or sent with an X-Profile header and the admin token
+REQUEST_PROFILING = os.getenv("REQUEST_PROFILING", "0").lower() in ("1", "true", "yes")
+PROFILE_THRESHOLD_SECONDS = float(os.getenv("PROFILE_THRESHOLD_SECONDS", "5"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "10"))
+PROFILES_DIR = os.getenv("PROFILES_DIR", os.path.join(DATA_DIR, "profiles"))
+PROFILES_KEPT = int(os.getenv("PROFILES_KEPT", "100"))
@@ -1,11 +1,38 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from app.routes import analysis, reports
-
-app = FastAPI()
-
-# Include routes from analysis and reports
+from app import config
+from app.routes import admin, analysis, datasets, metrics, reports
+from app.services.executor import compute
+from app.services.report_jobs import report_jobs
+from app.utils.metrics import MetricsMiddleware, start_flushing
+from app.utils.profiler import ProfilingMiddleware
+from app.utils.responses import FastJSONResponse
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Resume report jobs that were queued before the last shutdown
+    report_jobs.start()
+    # Publish this worker's metrics for the /metrics of the others
+    stop_flushing = start_flushing(config.METRICS_DIR, config.METRICS_FLUSH_SECONDS) if config.METRICS_DIR else None
+    yield
+    if stop_flushing is not None:
+        stop_flushing()
+    report_jobs.shutdown()
+    compute.shutdown()
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+# Request counts and latencies for /metrics; X-Timing requests get a Server-Timing breakdown
+app.add_middleware(MetricsMiddleware)
+if config.REQUEST_PROFILING:
+    # Stacks are sampled during every request; slow or X-Profile requests are saved for /admin/profiles
+    app.add_middleware(ProfilingMiddleware)
+
+# Include routes from analysis, datasets, reports, metrics and admin
 app.include_router(analysis.router)
+app.include_router(datasets.router)
 app.include_router(reports.router)
+app.include_router(metrics.router)
+app.include_router(admin.router)
 
 # Serve the static files (if needed)
 from fastapi.staticfiles import StaticFiles
@@ -1,14 +1,28 @@
-import nltk
-from nltk.tokenize import word_tokenize
-from nltk.corpus import stopwords
+import functools
+import os
 
-nltk.download('punkt')
-nltk.download('stopwords')
+# Bundled copy of NLTK's English stopword list, so queries work offline without nltk.download()
+STOPWORDS_PATH = os.path.join(os.path.dirname(__file__), "english_stopwords.txt")
+
+
+@functools.lru_cache(maxsize=None)
+def stop_words() -> frozenset:
+    with open(STOPWORDS_PATH, encoding="utf-8") as f:
+        return frozenset(line.strip() for line in f if line.strip())
+
+
+@functools.lru_cache(maxsize=None)
+def _tokenizer():
+    # NLTK takes over a second to import, so it is loaded on the first query rather than with
+    # the CLI. NLTKWordTokenizer is the word splitter behind word_tokenize and needs no data
+    # files; queries are short enough not to need Punkt sentence splitting first.
+    from nltk.tokenize import NLTKWordTokenizer
+    return NLTKWordTokenizer()
 
 def process_user_query(query):
-    tokens = word_tokenize(query.lower())
-    stop_words = set(stopwords.words('english'))
-    filtered_tokens = [word for word in tokens if word not in stop_words]
+    tokens = _tokenizer().tokenize(query.lower())
+    stop_words_set = stop_words()
+    filtered_tokens = [word for word in tokens if word not in stop_words_set]
     
     return filtered_tokens
 
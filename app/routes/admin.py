@@ -0,0 +1,25 @@
+import os
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
+
+from app import config
+from app.utils.auth import require_admin
+from app.utils.profiler import PROFILE_NAME, list_profiles, run_in_threadpool
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)])
+
+
+@router.get("/profiles")
+async def get_profiles():
+    """Saved request profiles, newest first (see REQUEST_PROFILING)."""
+    return {"enabled": config.REQUEST_PROFILING, "profiles": await run_in_threadpool(list_profiles)}
+
+
+@router.get("/profiles/{name}")
+async def download_profile(name: str):
+    path = os.path.join(config.PROFILES_DIR, name)
+    if not PROFILE_NAME.fullmatch(name) or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Profile not found.")
+    # Collapsed stacks: open in https://www.speedscope.app or pipe to flamegraph.pl
+    return FileResponse(path, media_type="text/plain", filename=name)
@@ -1,131 +1,537 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Query,Form
-from fastapi.responses import FileResponse,JSONResponse
-from app.utils.file_handler import read_file
-from app.services.data_processing import clean_data, preprocess_data
-from app.services.analysis_engine import AnalysisEngine
-from app.services.report_generator import ReportGenerator
-import io
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from app.routes.datasets import load_dataset, load_profile, plan_request, stream_upload, upload_dataset_id
+from app.services import tasks
+from app.services.aggregation import GroupedAggregator
+from app.services.analysis_engine import TREE_MODELS, AnalysisEngine
+from app.services.executor import compute
+from app.services.report_catalog import report_catalog
+from app.services.result_cache import etag_matches, result_cache, result_etag, result_key
+from app.services.report_jobs import new_report_id
+from app.services.chart_renderer import BACKENDS
+from app.services.data_processing import ENCODINGS
+from app.services.model_registry import model_key, model_registry
+from app import config
+from app.utils.profiler import run_in_threadpool
+from app.utils.responses import JSON_MEDIA_TYPE, FastJSONResponse, frame_chunks, negotiate, stream_frames
 from pydantic import BaseModel
+import asyncio
+import functools
+import itertools
+import math
+import numpy as np
 import pandas as pd
-from sklearn.linear_model import LinearRegression, LogisticRegression
-from sklearn.preprocessing import LabelEncoder
-import os
-import uuid
-from datetime import datetime
 
 
 router = APIRouter()
 
 # Existing data processing endpoint
 @router.post("/process/")
-async def process_file(file: UploadFile = File(...)):
-    # Read the file contents
-    contents = await file.read()
-    file_like_object = io.BytesIO(contents)
-
-    # Read the file using the read_file function, passing the filename
-    df = read_file(file_like_object, file.filename)
+async def process_file(
+    file: UploadFile = File(None),
+    dataset_id: str = Query(None),
+    stream: bool = Query(False),
+    encoding: str = Query("dense", description="dense, sparse or codes"),
+    memory: bool = Query(False, description="Also report each stage's peak memory; tracing it is slower")
+):
+    if encoding not in ENCODINGS:
+        raise HTTPException(status_code=400, detail=f"Unsupported encoding: {encoding}")
+    if stream and file is not None:
+        # Clean the spooled upload chunk by chunk instead of buffering the whole body
+        df = stream_upload(file)
+    else:
+        # Parse the upload, or reuse an already stored dataset
+        _, df = await load_dataset(file, dataset_id)
 
-    # Clean the data
-    df_cleaned = clean_data(df)
+    # Clean and preprocess the data on the compute executor
+    result = await compute.run(tasks.process_dataset, df, encoding, memory)
 
-    # Preprocess the data
-    df_preprocessed = preprocess_data(df_cleaned)
+    return {"status": "success", "columns": result["columns"], "stages": result["stages"]}
 
-    return {"status": "success", "columns": df_preprocessed.columns.tolist()}
+def iter_chunks(data: bytes, chunk_size: int = 64 * 1024):
+    view = memoryview(data)
+    for start in range(0, len(view), chunk_size):
+        yield view[start:start + chunk_size]
 
 # Analysis Engine Endpoints
 
-# Request models
-class LinearRegressionRequest(BaseModel):
-    target_column: str
-
-class DecisionTreeRequest(BaseModel):
-    target_column: str
-    feature_columns: str
-    max_depth: int = None
+WHERE = 'Comma-separated row conditions, e.g. "age>=18,city==Paris"; only matching rows are used'
+FORMAT = "json, ndjson or arrow; defaults to the best match of the Accept header"
 
+# Request models
 class CLICommand(BaseModel):
     command: str
 
+async def request_dataset_id(file: UploadFile, dataset_id: str):
+    """The dataset id of an upload (hashed without parsing it) or the given one, to key cached results."""
+    if file is not None:
+        return await run_in_threadpool(upload_dataset_id, file)
+    return dataset_id
+
+async def cached_response(request: Request, endpoint: str, dataset_id: str, params: dict, load, compute_result,
+                          refresh: bool = False):
+    """
+    JSON response with the result of compute_result(load()), served from the result cache when possible.
+    The ETag follows from the cache key, so a client sending it back in If-None-Match gets a 304
+    before the dataset is even loaded.
+    :param load: Coroutine function reading the request's upload or dataset. Identical requests share
+                 one compute_result(), which must therefore not touch an upload closed when its request ends.
+    :param refresh: Compute the result again, e.g. because a model it refers to is gone.
+    """
+    if dataset_id is None:
+        # Nothing to key on; load_dataset rejects the request
+        return FastJSONResponse(await compute_result(await load()))
+    key = result_key(endpoint, dataset_id, params)
+    headers = {"ETag": result_etag(key), "Cache-Control": "no-cache"}
+    if not refresh and etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    body, hit = await result_cache.get_or_compute(key, compute_result, refresh, load)
+    headers["X-Cache"] = "hit" if hit else "miss"
+    return Response(body, media_type=JSON_MEDIA_TYPE, headers=headers)
+
 @router.post("/descriptive/")
-async def get_descriptive_statistics(file: UploadFile = File(...)):
-    contents = await file.read()
-    file_like_object = io.BytesIO(contents)
-    df = read_file(file_like_object, file.filename)
-    
-    analysis_engine = AnalysisEngine(df)
-    result = analysis_engine.descriptive_statistics()
-    return {"descriptive_statistics": result}
+async def get_descriptive_statistics(
+    request: Request,
+    file: UploadFile = File(None),
+    dataset_id: str = Query(None),
+    stream: bool = Query(False),
+    exact: bool = Query(True),
+    format: str = Query(None, description=f"{FORMAT}; ndjson and arrow have one row per column")
+):
+    media_type = negotiate(request, format)
+
+    streamed = stream and file is not None
+
+    async def load(upload_id: str = None):
+        if streamed:
+            # A streamed upload is summarized as it is read, so each request reads its own
+            return await compute.run(tasks.descriptive_statistics, stream_upload(file), exact)
+        return await load_dataset(file, dataset_id, upload_id=upload_id)
+
+    async def statistics(loaded):
+        if streamed:
+            return loaded
+        # Stored datasets read from their memoized column profile
+        loaded_id, df = loaded
+        profile = await load_profile(loaded_id, df, exact)
+        try:
+            return AnalysisEngine(df, profile).descriptive_statistics()
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    if media_type == JSON_MEDIA_TYPE:
+        key_id = await request_dataset_id(file, dataset_id)
+
+        async def result(loaded):
+            return {"descriptive_statistics": await statistics(loaded)}
+        return await cached_response(request, "descriptive", key_id, {"exact": exact, "stream": streamed},
+                                     functools.partial(load, key_id), result)
+    return statistics_response(await statistics(await load()), media_type)
+
+def statistics_response(result: dict, media_type: str):
+    if media_type == JSON_MEDIA_TYPE:
+        return FastJSONResponse({"descriptive_statistics": result})
+    table = pd.DataFrame(result).rename_axis("column").reset_index()
+    table["column"] = table["column"].astype(str)
+    return stream_frames(frame_chunks(table, config.RESPONSE_CHUNK_ROWS), media_type)
+
+@router.post("/profile/")
+async def get_profile(
+    request: Request,
+    file: UploadFile = File(None),
+    dataset_id: str = Query(None),
+    exact: bool = Query(True)
+):
+    key_id = await request_dataset_id(file, dataset_id)
+
+    async def result(loaded):
+        loaded_id, df = loaded
+        profile = await load_profile(loaded_id, df, exact)
+        return {"dataset_id": loaded_id, "profile": profile}
+    return await cached_response(request, "profile", key_id, {"exact": exact},
+                                 functools.partial(load_dataset, file, dataset_id, upload_id=key_id), result)
+
+async def get_or_fit_model(model_id: str, fit_task, df: pd.DataFrame, *args):
+    """Return the registered model for model_id, fitting and registering it on the compute executor if needed."""
+    model = await run_in_threadpool(model_registry.get, model_id)
+    if model is None:
+        try:
+            model = await compute.run(fit_task, df, *args)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        await run_in_threadpool(model_registry.put, model_id, model)
+    return model
+
+async def load_regression_data(file: UploadFile, dataset_id: str, stream: bool, plan):
+    """(dataset_id, DataFrame or chunk iterator); streamed uploads are hashed without being parsed whole."""
+    if stream and file is not None:
+        dataset_id = await run_in_threadpool(upload_dataset_id, file)
+        return dataset_id, stream_upload(file, plan)
+    return await load_dataset(file, dataset_id, plan)
+
+def regression_plan(features: list, target_column: str, where: str = None):
+    # The regression only takes numbers, so named columns are parsed straight to float
+    if not features:
+        return plan_request(None, where)
+    columns = [*features, target_column]
+    return plan_request(columns, where, dtypes={col: "float64" for col in columns})
+
+async def prediction_page(model, df: pd.DataFrame, offset: int, limit: int = None) -> dict:
+    """Score one page of rows; clients walk the pages with next_offset."""
+    limit = min(limit or config.PREDICTIONS_PAGE_SIZE, config.PREDICTIONS_MAX_PAGE_SIZE)
+    page = df.iloc[offset:offset + limit]
+    try:
+        # Pages are small, so they are scored here rather than shipping the model to a worker
+        predictions = await run_in_threadpool(tasks.predict, page, model)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    end = offset + len(page)
+    return {
+        "predictions": predictions,
+        "offset": offset,
+        "total": len(df),
+        "next_offset": end if end < len(df) else None,
+    }
+
+def prediction_frames(model, df: pd.DataFrame, start: int, end: int):
+    # Always at least one frame, possibly empty, so the stream has a schema
+    for chunk_start in range(start, max(end, start + 1), config.RESPONSE_CHUNK_ROWS):
+        chunk = df.iloc[chunk_start:min(chunk_start + config.RESPONSE_CHUNK_ROWS, end)]
+        predictions = tasks.predict_array(chunk, model) if len(chunk) else np.empty(0)
+        yield pd.DataFrame({"row": np.arange(chunk_start, chunk_start + len(chunk)), "prediction": predictions})
+
+async def prediction_stream(model, df: pd.DataFrame, offset: int, limit: int, media_type: str, model_id: str):
+    """Stream the predictions of rows offset..offset + limit (to the end without a limit), scored chunk by chunk."""
+    end = len(df) if limit is None else min(len(df), offset + limit)
+    frames = prediction_frames(model, df, offset, end)
+    try:
+        # Score the first chunk before responding, so rows the model cannot score still get a 400
+        first = await run_in_threadpool(next, frames)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    headers = {"X-Model-Id": model_id, "X-Total-Rows": str(len(df))}
+    return stream_frames(itertools.chain([first], frames), media_type, headers)
+
+async def model_missing(model_id: str) -> bool:
+    # Results naming a model are only served from the cache while the model is still registered
+    return not await run_in_threadpool(model_registry.__contains__, model_id)
 
 @router.post("/linear_regression/")
 async def linear_regression(
-    file: UploadFile = File(...),
+    request: Request,
+    file: UploadFile = File(None),
     x_column: str = Query(..., alias="x"),
-    y_column: str = Query(..., alias="y")
+    y_column: str = Query(..., alias="y"),
+    dataset_id: str = Query(None),
+    where: str = Query(None, description=WHERE)
 ):
-    # Read the CSV file
-    df = pd.read_csv(file.file)
+    # Only the two columns, and the rows matching `where`, are read from the upload
+    plan = plan_request([x_column, y_column], where)
+    key_id = await request_dataset_id(file, dataset_id)
 
-    if x_column not in df.columns or y_column not in df.columns:
-        raise HTTPException(status_code=400, detail="Invalid column names.")
-
-    # Encode categorical data if necessary
-    if df[x_column].dtype == 'object':
-        le = LabelEncoder()
-        df[x_column] = le.fit_transform(df[x_column])
-    
-    if df[y_column].dtype == 'object':
-        le = LabelEncoder()
-        df[y_column] = le.fit_transform(df[y_column])
+    async def result(loaded):
+        loaded_id, df = loaded
+        if x_column not in df.columns or y_column not in df.columns:
+            raise HTTPException(status_code=400, detail="Invalid column names.")
 
-    # Extracting the x and y values
-    X = df[[x_column]].values
-    y = df[y_column].values
+        model_id = model_key(loaded_id, "linear_regression", [x_column], y_column, plan.params())
+        model = await get_or_fit_model(model_id, tasks.fit_linear_regression_xy, df, x_column, y_column)
+        return {**model.metrics, "model_id": model_id}
 
-    # Perform linear regression
-    model = LinearRegression()
-    model.fit(X, y)
-    
-    # Return the slope and intercept
-    return {"slope": model.coef_[0], "intercept": model.intercept_}
+    model_id = model_key(key_id, "linear_regression", [x_column], y_column, plan.params())
+    key_params = {"x": x_column, "y": y_column, **plan.params()}
+    return await cached_response(request, "linear_regression", key_id, key_params,
+                                 functools.partial(load_dataset, file, dataset_id, plan, key_id), result,
+                                 refresh=await model_missing(model_id))
 
 @router.post("/decision_tree/")
 async def decision_tree_regression(
-    file: UploadFile = File(...),
+    request: Request,
+    file: UploadFile = File(None),
     target_column: str = Query(...),
-    feature_columns: str = Query(...)
+    feature_columns: str = Query(...),
+    dataset_id: str = Query(None),
+    include_predictions: bool = Query(False, description="Return a page of in-sample predictions"),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(None, ge=1),
+    where: str = Query(None, description=WHERE),
+    model: str = Query("decision_tree", description=f"One of {', '.join(TREE_MODELS)}"),
+    max_depth: int = Query(None, ge=1),
+    min_samples_leaf: int = Query(None, ge=1),
+    max_leaf_nodes: int = Query(None, ge=2),
+    n_estimators: int = Query(None, ge=1, description="Number of trees of random_forest and gradient_boosting"),
+    search: bool = Query(False, description="Pick the other hyperparameters by cross-validated search"),
+    sample_rows: int = Query(None, ge=1, description="Fit on a random sample of at most this many rows"),
+    format: str = Query(None, description=f"{FORMAT}; ndjson and arrow stream the predictions")
 ):
-    contents = await file.read()
-    file_like_object = io.BytesIO(contents)
-    df = pd.read_csv(file_like_object)
-
+    media_type = negotiate(request, format)
+    if model not in TREE_MODELS:
+        raise HTTPException(status_code=400, detail=f"Unknown model; use one of {', '.join(TREE_MODELS)}.")
     feature_columns = feature_columns.split(",")
+    plan = plan_request([*feature_columns, target_column], where)
 
-    if target_column not in df.columns or any(col not in df.columns for col in feature_columns):
-        raise HTTPException(status_code=400, detail="Invalid column names.")
+    params = {"max_depth": max_depth, "min_samples_leaf": min_samples_leaf, "max_leaf_nodes": max_leaf_nodes,
+              "n_estimators": n_estimators}
+    params = {name: value for name, value in params.items() if value is not None}
+    # Default options stay out of the key, so plain decision trees keep their model ids
+    options = {**params, **plan.params()}
+    if search:
+        options["search"] = True
+    if sample_rows:
+        options["sample_rows"] = sample_rows
+
+    async def fit(loaded):
+        loaded_id, df = loaded
+        if target_column not in df.columns or any(col not in df.columns for col in feature_columns):
+            raise HTTPException(status_code=400, detail="Invalid column names.")
+        model_id = model_key(loaded_id, model, feature_columns, target_column, options)
+        fitted = await get_or_fit_model(model_id, tasks.fit_tree_model, df, target_column, feature_columns,
+                                        model, params, search, sample_rows)
+        return model_id, fitted, df
+
+    if media_type != JSON_MEDIA_TYPE:
+        # Streams carry only the predictions; the metrics are at /models/{model_id}
+        model_id, fitted, df = await fit(await load_dataset(file, dataset_id, plan))
+        return await prediction_stream(fitted, df, offset, limit, media_type, model_id)
+
+    key_id = await request_dataset_id(file, dataset_id)
+
+    async def result(loaded):
+        model_id, fitted, df = await fit(loaded)
+        result = {**fitted.metrics, "model_id": model_id}
+        if include_predictions:
+            result.update(await prediction_page(fitted, df, offset, limit))
+        return result
+
+    model_id = model_key(key_id, model, feature_columns, target_column, options)
+    key_params = {**options, "model": model, "features": feature_columns, "target": target_column}
+    if include_predictions:
+        key_params.update(include_predictions=True, offset=offset, limit=limit)
+    return await cached_response(request, "decision_tree", key_id, key_params,
+                                 functools.partial(load_dataset, file, dataset_id, plan, key_id), result,
+                                 refresh=await model_missing(model_id))
+
+@router.post("/regression/")
+async def incremental_regression(
+    file: UploadFile = File(None),
+    dataset_id: str = Query(None),
+    target_column: str = Query(...),
+    feature_columns: str = Query(None, description="Comma-separated; defaults to every other column"),
+    stream: bool = Query(False),
+    where: str = Query(None, description=WHERE)
+):
+    # Out-of-core least squares: memory depends on the number of features, not rows
+    features = feature_columns.split(",") if feature_columns else None
+    plan = regression_plan(features, target_column, where)
+    dataset_id, data = await load_regression_data(file, dataset_id, stream, plan)
+
+    model_id = model_key(dataset_id, "incremental_linear_regression", features or [], target_column, plan.params())
+    model = await get_or_fit_model(model_id, tasks.fit_incremental_regression, data, target_column, features)
+    return {**model.metrics, "model_id": model_id}
+
+@router.post("/regression/{model_id}/append")
+async def append_to_regression(
+    model_id: str,
+    file: UploadFile = File(None),
+    dataset_id: str = Query(None),
+    stream: bool = Query(False),
+    where: str = Query(None, description=WHERE)
+):
+    # Fit new rows on top of an existing regression; the result is registered as a new model
+    base = await run_in_threadpool(model_registry.get, model_id)
+    if base is None:
+        raise HTTPException(status_code=404, detail="Model not found.")
+    if base.algorithm != "incremental_linear_regression":
+        raise HTTPException(status_code=400, detail="Only /regression/ models can be appended to.")
+
+    plan = regression_plan(base.features, base.target, where)
+    dataset_id, data = await load_regression_data(file, dataset_id, stream, plan)
+    new_model_id = model_key(dataset_id, base.algorithm, base.features, base.target,
+                             {"append_to": model_id, **plan.params()})
+    model = await get_or_fit_model(new_model_id, tasks.fit_incremental_regression, data,
+                                   base.target, base.features, base)
+    return {**model.metrics, "model_id": new_model_id, "appended_to": model_id}
+
+def split_columns(columns: str) -> list:
+    return [col for col in columns.split(",") if col] if columns else []
+
+async def fit_aggregation(aggregation_id: str, data, spec: dict, base=None):
+    """
+    Return the registered aggregation for aggregation_id, computing and registering it if needed.
+    Large DataFrames are split into shards aggregated on separate compute workers and then merged.
+    """
+    model = await run_in_threadpool(model_registry.get, aggregation_id)
+    if model is not None:
+        return model
+    try:
+        shards = 1
+        if isinstance(data, pd.DataFrame):
+            shards = min(compute.max_workers, math.ceil(len(data) / config.AGGREGATION_SHARD_ROWS))
+        if shards > 1:
+            size = math.ceil(len(data) / shards)
+            parts = await asyncio.gather(*(compute.run(tasks.fit_aggregation, data.iloc[start:start + size], spec)
+                                           for start in range(0, len(data), size)))
+            model = await run_in_threadpool(tasks.merge_aggregations, [base, *parts] if base else parts)
+        else:
+            model = await compute.run(tasks.fit_aggregation, data, spec, base)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    await run_in_threadpool(model_registry.put, aggregation_id, model)
+    return model
+
+async def aggregation_response(model, aggregation_id: str, rolling: int, media_type: str, **extra):
+    try:
+        table = await run_in_threadpool(model.estimator.result, rolling)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if media_type == JSON_MEDIA_TYPE:
+        return FastJSONResponse({"aggregation_id": aggregation_id, **extra, **model.metrics,
+                                 "result": table.to_dict(orient="records")})
+    headers = {"X-Aggregation-Id": aggregation_id, "X-Total-Rows": str(len(table))}
+    return stream_frames(frame_chunks(table, config.RESPONSE_CHUNK_ROWS), media_type, headers)
+
+def aggregation_plan(spec: dict, where: str = None):
+    # Only the keys and aggregated columns are read, unless the columns default to every numeric one
+    if spec["value_columns"] is None:
+        return plan_request(None, where)
+    time_column = [spec["time_column"]] if spec["time_column"] else []
+    return plan_request([*spec["group_by"], *time_column, *spec["value_columns"]], where)
+
+ROLLING = "Report each window together with the rolling - 1 windows before it, e.g. 7 over 1D windows"
+
+@router.post("/aggregate/")
+async def aggregate(
+    request: Request,
+    file: UploadFile = File(None),
+    dataset_id: str = Query(None),
+    stream: bool = Query(False),
+    group_by: str = Query(None, description="Comma-separated key columns"),
+    columns: str = Query(None, description="Comma-separated numeric columns; defaults to every other numeric column"),
+    time_column: str = Query(None, description="Timestamp column to group into windows"),
+    window: str = Query(None, description="Tumbling window length, e.g. 15min, 1h or 1D"),
+    rolling: int = Query(None, ge=1, description=ROLLING),
+    quantiles: str = Query(None, description="Comma-separated, e.g. 0.5,0.9"),
+    where: str = Query(None, description=WHERE),
+    format: str = Query(None, description=f"{FORMAT}; ndjson and arrow have one row per group")
+):
+    # Count, sum, mean, std, min, max and quantiles of each group, computed from factorized group codes
+    media_type = negotiate(request, format)
+    try:
+        spec = GroupedAggregator(split_columns(group_by), split_columns(columns) or None, time_column, window,
+                                 [float(q) for q in split_columns(quantiles)]).spec()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    plan = aggregation_plan(spec, where)
+    dataset_id, data = await load_regression_data(file, dataset_id, stream, plan)
+
+    aggregation_id = model_key(dataset_id, "aggregation", spec["value_columns"] or [], None,
+                               {**spec, **plan.params()})
+    model = await fit_aggregation(aggregation_id, data, spec)
+    return await aggregation_response(model, aggregation_id, rolling, media_type)
+
+@router.get("/aggregate/{aggregation_id}")
+async def get_aggregation(
+    request: Request,
+    aggregation_id: str,
+    rolling: int = Query(None, ge=1, description=ROLLING),
+    format: str = Query(None, description=f"{FORMAT}; ndjson and arrow have one row per group")
+):
+    media_type = negotiate(request, format)
+    model = await run_in_threadpool(model_registry.get, aggregation_id)
+    if model is None or model.algorithm != "aggregation":
+        raise HTTPException(status_code=404, detail="Aggregation not found.")
+    return await aggregation_response(model, aggregation_id, rolling, media_type)
+
+@router.post("/aggregate/{aggregation_id}/append")
+async def append_to_aggregation(
+    request: Request,
+    aggregation_id: str,
+    file: UploadFile = File(None),
+    dataset_id: str = Query(None),
+    stream: bool = Query(False),
+    rolling: int = Query(None, ge=1, description=ROLLING),
+    where: str = Query(None, description=WHERE),
+    format: str = Query(None, description=f"{FORMAT}; ndjson and arrow have one row per group")
+):
+    # Fold new rows into an existing aggregation; the result is registered as a new aggregation
+    media_type = negotiate(request, format)
+    base = await run_in_threadpool(model_registry.get, aggregation_id)
+    if base is None or base.algorithm != "aggregation":
+        raise HTTPException(status_code=404, detail="Aggregation not found.")
+
+    spec = base.estimator.spec()
+    plan = aggregation_plan(spec, where)
+    dataset_id, data = await load_regression_data(file, dataset_id, stream, plan)
+    new_aggregation_id = model_key(dataset_id, "aggregation", spec["value_columns"] or [], None,
+                                   {"append_to": aggregation_id, **plan.params()})
+    model = await fit_aggregation(new_aggregation_id, data, spec, base)
+    return await aggregation_response(model, new_aggregation_id, rolling, media_type, appended_to=aggregation_id)
+
+@router.post("/predict/")
+async def predict(
+    request: Request,
+    model_id: str = Query(...),
+    file: UploadFile = File(None),
+    dataset_id: str = Query(None),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(None, ge=1),
+    format: str = Query(None, description=f"{FORMAT}; ndjson and arrow stream every row from offset without paging")
+):
+    media_type = negotiate(request, format)
+    # Score new rows against a model fitted by /linear_regression/ or /decision_tree/
+    model = await run_in_threadpool(model_registry.get, model_id)
+    if model is None:
+        raise HTTPException(status_code=404, detail="Model not found.")
+    if model.algorithm == "aggregation":
+        raise HTTPException(status_code=400, detail="Aggregations do not score rows.")
+
+    _, df = await load_dataset(file, dataset_id, plan_request(model.features))
+    if media_type != JSON_MEDIA_TYPE:
+        return await prediction_stream(model, df, offset, limit, media_type, model_id)
+    page = await prediction_page(model, df, offset, limit)
+    return FastJSONResponse({"model_id": model_id, **page})
+
+@router.get("/models/{model_id}")
+async def get_model(model_id: str):
+    model = await run_in_threadpool(model_registry.get, model_id)
+    if model is None:
+        raise HTTPException(status_code=404, detail="Model not found.")
+    return {"model_id": model_id, **model.info()}
 
-    analysis_engine = AnalysisEngine(df)
-    result = analysis_engine.decision_tree_regression(target_column, feature_columns)
-    
-    return result
 @router.post("/generate_report/")
-async def generate_report(file: UploadFile = File(...)):
-    # Load the uploaded file into a pandas DataFrame
-    df = pd.read_csv(file.file)
+async def generate_report(
+    file: UploadFile = File(None),
+    dataset_id: str = Query(None),
+    chart_backend: str = Query(None, description="plotly or matplotlib"),
+    download: bool = Query(False, description="Return the PDF in the response instead of storing it")
+):
+    if chart_backend is not None and chart_backend not in BACKENDS:
+        raise HTTPException(status_code=400, detail=f"Unsupported chart backend: {chart_backend}")
+
+    # Load the uploaded file, or a stored dataset, into a pandas DataFrame
+    dataset_id, df = await load_dataset(file, dataset_id)
+    profile = await load_profile(dataset_id, df)
 
-    # Create a report generator
-    report_generator = ReportGenerator(df)
+    if download:
+        # Nothing touches the filesystem: the PDF is built in memory and sent back directly
+        pdf = await compute.run(tasks.render_report, df, chart_backend, profile)
+        return StreamingResponse(
+            iter_chunks(pdf), media_type='application/pdf',
+            headers={"Content-Disposition": f'attachment; filename="{new_report_id()}"'},
+        )
 
     # Generate a unique filename for the report
-    if not os.path.exists("generated_reports/"):
-        os.makedirs("generated_reports/")
-    
-    report_id = f"report_{uuid.uuid4()}_{datetime.now().strftime('%Y%m%d%H%M%S')}.pdf"
-    output_pdf_path = f"generated_reports/{report_id}"
+    report_id = new_report_id()
+    staging_path = report_catalog.staging_path(report_id)
 
-    # Generate the report
-    report_generator.create_report(output_pdf_path)
+    # Generate the report on the compute executor, then publish it to the report storage in one step
+    try:
+        await compute.run(tasks.create_report, df, staging_path, chart_backend, profile)
+    except BaseException:
+        report_catalog.discard(staging_path)
+        raise
+    await run_in_threadpool(report_catalog.publish, staging_path, report_id, dataset_id, df.columns, len(df),
+                            chart_backend)
 
     # Return the generated report ID and filename
     return {"message": "Report generated successfully.", "report_id": report_id}
@@ -0,0 +1,93 @@
+from fastapi import APIRouter, UploadFile, File, HTTPException
+import pandas as pd
+
+from app.services import tasks
+from app.services.dataset_store import DatasetStore, dataset_store
+from app.services.executor import compute
+from app.services.profiling import profile_cache
+from app.services.query_plan import QueryPlan, plan_query
+from app.utils.file_handler import read_file_chunks
+from app.utils.profiler import run_in_threadpool
+
+router = APIRouter()
+
+
+def plan_request(columns: list = None, where: str = None, dtypes: dict = None) -> QueryPlan:
+    """QueryPlan for a request's columns and `where` parameter; 400 for a malformed filter."""
+    try:
+        return plan_query(columns, where, dtypes)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+async def load_dataset(file: UploadFile = None, dataset_id: str = None, plan: QueryPlan = None,
+                       upload_id: str = None) -> tuple[str, pd.DataFrame]:
+    """
+    Resolve an upload or a previously stored dataset id into (dataset_id, DataFrame).
+    :param plan: Columns and rows the caller needs; the rest of an upload that is not stored yet is not read.
+    :param upload_id: The upload's upload_dataset_id() if the caller already hashed it.
+    """
+    if file is not None:
+        try:
+            # Hashing and parsing are CPU-bound, keep them off the event loop
+            return await run_in_threadpool(dataset_store.add_file, file.file, file.filename, plan, upload_id)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    if dataset_id is None:
+        raise HTTPException(status_code=400, detail="Either a file or a dataset_id must be provided.")
+
+    try:
+        df = await run_in_threadpool(dataset_store.get, dataset_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Dataset not found.")
+    if plan is None:
+        return dataset_id, df
+    try:
+        return dataset_id, await run_in_threadpool(plan.apply, df)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+async def load_profile(dataset_id: str, df: pd.DataFrame, exact: bool = True) -> dict:
+    """Column profile of a stored dataset, computed on the compute executor once and then memoized."""
+    profile = profile_cache.get(dataset_id, exact)
+    if profile is None:
+        profile = await compute.run(tasks.profile_dataset, df, exact)
+        profile_cache.put(dataset_id, profile, exact)
+    return profile
+
+
+def upload_dataset_id(file: UploadFile) -> str:
+    """The dataset id the upload would get if stored, computed without parsing or buffering it."""
+    return DatasetStore.dataset_id_of_file(file.file, file.filename)
+
+
+def stream_upload(file: UploadFile, plan: QueryPlan = None):
+    """Iterate the spooled upload in chunks without reading the whole body into memory."""
+    try:
+        if plan is not None:
+            chunks = plan.read_chunks(file.file, file.filename)
+        else:
+            chunks = read_file_chunks(file.file, file.filename)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _parsed_chunks(chunks)
+
+
+def _parsed_chunks(chunks):
+    # Chunks are parsed as the consumer pulls them, so malformed input only shows up then
+    try:
+        yield from chunks
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Could not parse the upload: {e}")
+
+
+@router.post("/datasets/")
+async def upload_dataset(file: UploadFile = File(...)):
+    dataset_id, df = await load_dataset(file)
+    return {"dataset_id": dataset_id, "rows": len(df), "columns": df.columns.tolist()}
+
+
+@router.get("/datasets/stats")
+async def dataset_stats():
+    return {**dataset_store.info(), "profile_cache": profile_cache.info()}
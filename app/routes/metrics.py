@@ -0,0 +1,46 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app import config
+
+from app.services.chart_renderer import renderer_stats
+from app.services.dataset_store import dataset_store
+from app.services.executor import compute
+from app.services.model_registry import model_registry
+from app.services.profiling import profile_cache
+from app.services.result_cache import result_cache
+from app.utils import metrics
+
+router = APIRouter()
+
+# Prometheus text format, version 0.0.4
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+cache_stats = metrics.Gauge("cache", "Cache counters and sizes, read at scrape time.", ("cache", "stat"))
+compute_pending = metrics.Gauge("compute_pending_jobs", "Compute jobs running or waiting for a worker.")
+compute_workers = metrics.Gauge("compute_workers", "Compute worker processes or threads.")
+
+
+def _record_cache(cache: str, info: dict):
+    for stat, value in info.items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            cache_stats.set(value, cache=cache, stat=stat)
+
+
+@metrics.on_collect
+def _record_gauges():
+    _record_cache("datasets", dataset_store.info())
+    _record_cache("profiles", profile_cache.info())
+    _record_cache("models", model_registry.info())
+    _record_cache("results", result_cache.info())
+    for backend, stats in renderer_stats().items():
+        _record_cache(f"charts_{backend}", stats)
+    info = compute.info()
+    compute_pending.set(info["pending"])
+    compute_workers.set(info["workers"])
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    # Added up over every web worker when they share METRICS_DIR
+    return PlainTextResponse(metrics.render(config.METRICS_DIR or None), media_type=CONTENT_TYPE)
@@ -1,26 +1,115 @@
-from fastapi import APIRouter , HTTPException
-from fastapi.responses import FileResponse
+from fastapi import APIRouter , HTTPException, UploadFile, File, Query, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
 import os
+import re
+from app import config
+from app.routes.datasets import load_dataset
+from app.services.report_catalog import report_catalog
+from app.services.report_jobs import report_jobs, DONE, FAILED
+from app.utils.profiler import run_in_threadpool
 
 router = APIRouter()
 
+# A single byte range: "bytes=start-end", "bytes=start-" or "bytes=-suffix_length"
+_BYTE_RANGE = re.compile(r"bytes=(\d*)-(\d*)")
+# Report ids are unique, so a report's bytes never change and proxies may cache it indefinitely
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
 @router.get("/reports/")
-async def list_reports():
-    report_dir = "generated_reports/"
-    
-    # Check if the directory exists
-    if not os.path.exists(report_dir):
-        return {"message": "No reports available."}
-
-    # List all PDF files in the directory
-    reports = [f for f in os.listdir(report_dir) if f.endswith('.pdf')]
-    return {"available_reports": reports}
+async def list_reports(
+    offset: int = Query(0, ge=0),
+    limit: int = Query(None, ge=1),
+    dataset_id: str = Query(None),
+    created_after: str = Query(None, description="ISO date or timestamp"),
+    created_before: str = Query(None, description="ISO date or timestamp"),
+    sort: str = Query("created_at", description="created_at, bytes, rows or report_id"),
+    order: str = Query("desc", pattern="^(asc|desc)$")
+):
+    # Served from the report catalog instead of scanning the reports directory
+    try:
+        total, reports = await run_in_threadpool(
+            report_catalog.list, offset, limit, dataset_id, created_after, created_before, sort, order == "desc")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    end = offset + len(reports)
+    return {
+        "available_reports": [report["report_id"] for report in reports],
+        "reports": reports,
+        "offset": offset,
+        "total": total,
+        "next_offset": end if end < total else None,
+    }
+
+@router.post("/reports/jobs/", status_code=202)
+async def submit_report_job(file: UploadFile = File(None), dataset_id: str = Query(None)):
+    # Queue the report and return right away; poll /reports/jobs/{job_id} for progress
+    dataset_id, _ = await load_dataset(file, dataset_id)
+    job_id = await run_in_threadpool(report_jobs.submit, dataset_id)
+    return {"job_id": job_id, "status": "queued"}
+
+@router.get("/reports/jobs/{job_id}")
+async def get_report_job(job_id: str):
+    job = await run_in_threadpool(report_jobs.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "progress": {"charts_done": job["charts_done"], "charts_total": job["charts_total"]},
+        "report_id": job["report_id"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+    }
+
 @router.get("/download_report/{report_id}")
-async def download_report(report_id: str):
-    report_path = f"generated_reports/{report_id}"
-    
-    # Check if the report exists
-    if not os.path.exists(report_path):
+async def download_report(report_id: str, request: Request):
+    # A report job id can be used in place of the report id once the job is done
+    job = await run_in_threadpool(report_jobs.get, report_id)
+    if job is not None:
+        if job["status"] == FAILED:
+            raise HTTPException(status_code=500, detail=f"Report generation failed: {job['error']}")
+        if job["status"] != DONE:
+            raise HTTPException(status_code=409, detail=f"Report is not ready yet (status: {job['status']}).")
+        report_id = job["report_id"]
+
+    if os.path.basename(report_id) != report_id:
         raise HTTPException(status_code=404, detail="Report not found.")
-    
-    return FileResponse(report_path, media_type='application/pdf', filename=report_id)
+    report = await run_in_threadpool(report_catalog.get, report_id)
+    storage = report_catalog.storage
+
+    # Check if the report exists; retention on another worker may have just deleted it
+    if report is None or await run_in_threadpool(storage.size, report_id) is None:
+        raise HTTPException(status_code=404, detail="Report not found.")
+
+    return file_response(request, storage, report_id, report["bytes"], report["etag"], report_id)
+
+def file_response(request: Request, storage, key: str, size: int, etag: str, filename: str):
+    """
+    Serve a stored object with its ETag, answering If-None-Match with 304 and a single-range Range
+    request with 206, so proxies can revalidate and interrupted downloads can resume.
+    """
+    headers = {"ETag": etag, "Accept-Ranges": "bytes", "Cache-Control": CACHE_CONTROL,
+               "Content-Disposition": f'attachment; filename="{filename}"'}
+    if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    match = _BYTE_RANGE.fullmatch(request.headers.get("range", "").strip())
+    # A Range is only honoured if the file still has the ETag the client resumed from
+    if match is None or request.headers.get("if-range", etag) != etag or match.groups() == ("", ""):
+        path = storage.local_path(key)
+        if path is not None:
+            return FileResponse(path, media_type='application/pdf', headers=headers)
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(storage.read_range(key, 0, size - 1), media_type='application/pdf', headers=headers)
+
+    first, last = match.groups()
+    if first:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    else:
+        start, end = max(size - int(last), 0), size - 1
+    if start >= size or start > end:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+    headers.update({"Content-Range": f"bytes {start}-{end}/{size}", "Content-Length": str(end - start + 1)})
+    return StreamingResponse(storage.read_range(key, start, end), status_code=206, media_type='application/pdf',
+                             headers=headers)
@@ -0,0 +1,31 @@
+# Multi-process server: `python -m app.serve` runs WEB_CONCURRENCY uvicorn workers (the CPU count
+# by default) behind one port. Each worker has its own compute pool, sized to its share of the
+# cores (see config.COMPUTE_WORKERS). Reports and datasets are shared through REPORTS_DIR and
+# DATASET_SPILL_DIR, which may be a common volume or an s3:// bucket. The workers publish their
+# metrics to METRICS_DIR, so /metrics covers all of them.
+
+import glob
+import os
+import tempfile
+
+
+def main():
+    # Set before the app is imported, so the workers size their pools and share datasets accordingly
+    os.environ.setdefault("WEB_CONCURRENCY", str(os.cpu_count() or 1))
+    if int(os.environ["WEB_CONCURRENCY"]) > 1 and not os.getenv("METRICS_DIR"):
+        os.environ["METRICS_DIR"] = tempfile.mkdtemp(prefix="ai-employee-metrics-")
+    metrics_dir = os.getenv("METRICS_DIR")
+    if metrics_dir:
+        # Counters start from zero with the server, as they do for a single process
+        for path in glob.glob(os.path.join(metrics_dir, "*.json")):
+            os.remove(path)
+
+    import uvicorn
+    from app import config
+
+    uvicorn.run("app.main:app", host=os.getenv("HOST", "0.0.0.0"), port=int(os.getenv("PORT", "8000")),
+                workers=config.WEB_CONCURRENCY)
+
+
+if __name__ == "__main__":
+    main()
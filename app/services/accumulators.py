@@ -0,0 +1,235 @@
+import math
+import numpy as np
+import pandas as pd
+
+from app import config
+
+
+class MomentsAccumulator:
+    def __init__(self):
+        """
+        Mergeable count, mean, variance (Welford/Chan), min and max for a set of numeric columns.
+        Each update is one vectorized pass over a 2-D chunk; states from separate chunks or
+        shards can be combined with merge().
+        """
+        self.columns = []
+        self.count = np.zeros(0)
+        self.mean = np.zeros(0)
+        self.m2 = np.zeros(0)
+        self.min = np.zeros(0)
+        self.max = np.zeros(0)
+
+    def update(self, columns, values: np.ndarray):
+        """
+        Add a chunk of observations.
+        :param columns: Column names, one per column of `values`.
+        :param values: 2-D float array of shape (rows, columns), NaN marking missing values.
+        """
+        mask = ~np.isnan(values)
+        count = mask.sum(axis=0).astype(float)
+        filled = np.where(mask, values, 0.0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(count > 0, filled.sum(axis=0) / count, 0.0)
+        m2 = np.where(mask, (values - mean) ** 2, 0.0).sum(axis=0)
+        minimum = np.where(mask, values, np.inf).min(axis=0, initial=np.inf)
+        maximum = np.where(mask, values, -np.inf).max(axis=0, initial=-np.inf)
+        self._combine(list(columns), count, mean, m2, minimum, maximum)
+
+    def merge(self, other: "MomentsAccumulator"):
+        self._combine(other.columns, other.count, other.mean, other.m2, other.min, other.max)
+
+    def variance(self, ddof: int = 1) -> np.ndarray:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.count > ddof, self.m2 / (self.count - ddof), np.nan)
+
+    def _combine(self, columns, count, mean, m2, minimum, maximum):
+        idx = self._index(columns)
+        n_a, n_b = self.count[idx], count
+        n = n_a + n_b
+        delta = mean - self.mean[idx]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.mean[idx] = np.where(n > 0, self.mean[idx] + delta * n_b / n, 0.0)
+            self.m2[idx] = self.m2[idx] + m2 + np.where(n > 0, delta ** 2 * n_a * n_b / n, 0.0)
+        self.count[idx] = n
+        self.min[idx] = np.minimum(self.min[idx], minimum)
+        self.max[idx] = np.maximum(self.max[idx], maximum)
+
+    def _index(self, columns) -> np.ndarray:
+        new = [col for col in columns if col not in self.columns]
+        if new:
+            self.columns.extend(new)
+            pad = len(new)
+            self.count = np.concatenate([self.count, np.zeros(pad)])
+            self.mean = np.concatenate([self.mean, np.zeros(pad)])
+            self.m2 = np.concatenate([self.m2, np.zeros(pad)])
+            self.min = np.concatenate([self.min, np.full(pad, np.inf)])
+            self.max = np.concatenate([self.max, np.full(pad, -np.inf)])
+        positions = {col: i for i, col in enumerate(self.columns)}
+        return np.array([positions[col] for col in columns], dtype=int)
+
+
+class KLLSketch:
+    def __init__(self, error: float = None, seed: int = 0):
+        """
+        KLL quantile sketch with bounded memory.
+        :param error: Target normalized rank error; sets the top compactor size k = 3 / error.
+        :param seed: Seed for the compaction coin flips, so equal input gives equal output.
+        """
+        self.error = error or config.QUANTILE_ERROR
+        self.k = max(8, math.ceil(3 / self.error))
+        self.count = 0
+        self.compactors = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, values: np.ndarray):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if values.size:
+            self.compactors[0] = np.concatenate([self.compactors[0], values])
+            self.count += values.size
+            self._compress()
+
+    def merge(self, other: "KLLSketch"):
+        for level, items in enumerate(other.compactors):
+            if level == len(self.compactors):
+                self.compactors.append(np.empty(0))
+            self.compactors[level] = np.concatenate([self.compactors[level], items])
+        self.count += other.count
+        self._compress()
+
+    def quantile(self, q):
+        """Approximate quantile(s) for q in [0, 1]; NaN when the sketch is empty."""
+        if not self.count:
+            return np.full(np.shape(q), np.nan) if np.ndim(q) else np.nan
+        items, weights = self.weighted_items()
+        order = np.argsort(items, kind='stable')
+        items, cumulative = items[order], np.cumsum(weights[order])
+        ranks = np.asarray(q, dtype=float) * cumulative[-1]
+        positions = np.minimum(np.searchsorted(cumulative, ranks, side='left'), len(items) - 1)
+        return items[positions]
+
+    def weighted_items(self):
+        """Retained items and their weights; each item stands for 2 ** level input values."""
+        items = np.concatenate(self.compactors)
+        weights = np.concatenate([np.full(len(c), 2.0 ** level) for level, c in enumerate(self.compactors)])
+        return items, weights
+
+    def _capacity(self, level: int) -> int:
+        # Lower levels shrink geometrically (factor 2/3) below the top compactor of size k
+        depth = len(self.compactors) - level - 1
+        return max(2, math.ceil(self.k * (2 / 3) ** depth))
+
+    def _compress(self):
+        level = 0
+        while level < len(self.compactors):
+            items = self.compactors[level]
+            if len(items) <= self._capacity(level):
+                level += 1
+                continue
+            items = np.sort(items)
+            # Keep one item behind when the level is odd; promote every other item with a random offset
+            kept, items = (items[-1:], items[:-1]) if len(items) % 2 else (items[:0], items)
+            promoted = items[self._rng.integers(2)::2]
+            self.compactors[level] = kept
+            if level + 1 == len(self.compactors):
+                self.compactors.append(promoted)
+                # A new top level changes every capacity, so re-check from the bottom
+                level = 0
+            else:
+                self.compactors[level + 1] = np.concatenate([self.compactors[level + 1], promoted])
+                level += 1
+
+
+class ColumnStatsAccumulator:
+    def __init__(self, exact: bool = True, error: float = None):
+        """
+        Descriptive statistics for numeric columns, accumulated chunk by chunk.
+        :param exact: Keep the column values for exact medians; otherwise use a KLL sketch per column.
+        :param error: Rank error bound for the sketches when exact is False.
+        """
+        self.exact = exact
+        self.error = error or config.QUANTILE_ERROR
+        self.moments = MomentsAccumulator()
+        self.rows = 0
+        self.dtypes = {}
+        self.values = {}
+        self.sketches = {}
+
+    def update(self, df: pd.DataFrame):
+        numeric = df.select_dtypes(include='number')
+        if not len(numeric.columns):
+            return
+        self.rows += len(numeric)
+        for col in numeric.columns:
+            self.dtypes.setdefault(col, numeric[col].dtype)
+        values = numeric.to_numpy(dtype=float, na_value=np.nan)
+        self.moments.update(numeric.columns, values)
+        for i, col in enumerate(numeric.columns):
+            if self.exact:
+                self.values.setdefault(col, []).append(values[:, i])
+            else:
+                if col not in self.sketches:
+                    self.sketches[col] = KLLSketch(self.error)
+                self.sketches[col].update(values[:, i])
+
+    def merge(self, other: "ColumnStatsAccumulator"):
+        self.moments.merge(other.moments)
+        self.rows += other.rows
+        for col, dtype in other.dtypes.items():
+            self.dtypes.setdefault(col, dtype)
+        for col, parts in other.values.items():
+            self.values.setdefault(col, []).extend(parts)
+        for col, sketch in other.sketches.items():
+            if col in self.sketches:
+                self.sketches[col].merge(sketch)
+            else:
+                self.sketches[col] = sketch
+
+    def _column_values(self, col) -> np.ndarray:
+        parts = self.values[col]
+        values = parts[0] if len(parts) == 1 else np.concatenate(parts)
+        return values[~np.isnan(values)]
+
+    def quantile(self, col, q):
+        """Quantile(s) of a column for q in [0, 1]; exact or from the column's sketch."""
+        if self.exact:
+            values = self._column_values(col)
+            if not values.size:
+                return np.full(np.shape(q), np.nan) if np.ndim(q) else np.nan
+            result = np.quantile(values, q)
+        else:
+            result = self.sketches[col].quantile(q)
+        return result.astype(float) if np.ndim(q) else float(result)
+
+    def histogram(self, col, max_bins: int):
+        """
+        Bin counts of a column as (counts, edges), using numpy's 'auto' bins capped at max_bins.
+        Without exact values the sketch items are binned with their weights, so counts are estimates.
+        """
+        if self.exact:
+            values, weights = self._column_values(col), None
+        else:
+            values, weights = self.sketches[col].weighted_items()
+        if not values.size:
+            return np.zeros(0, dtype='int64'), np.zeros(0)
+        edges = np.histogram_bin_edges(values, bins='auto')
+        if len(edges) - 1 > max_bins:
+            edges = np.histogram_bin_edges(values, bins=max_bins)
+        counts, edges = np.histogram(values, bins=edges, weights=weights)
+        return counts.round().astype('int64'), edges
+
+    def summary(self) -> dict:
+        """Return mean, median, std_dev, min, max and count keyed by column name."""
+        m = self.moments
+        std = np.sqrt(m.variance())
+        result = {key: {} for key in ("mean", "median", "std_dev", "min", "max", "count")}
+        for i, col in enumerate(m.columns):
+            present = m.count[i] > 0
+            integer = pd.api.types.is_integer_dtype(self.dtypes[col])
+            result["mean"][col] = float(m.mean[i]) if present else np.nan
+            result["median"][col] = self.quantile(col, 0.5)
+            result["std_dev"][col] = float(std[i])
+            result["min"][col] = (int(m.min[i]) if integer else float(m.min[i])) if present else np.nan
+            result["max"][col] = (int(m.max[i]) if integer else float(m.max[i])) if present else np.nan
+            result["count"][col] = int(m.count[i])
+        return result
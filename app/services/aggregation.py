@@ -0,0 +1,290 @@
+# Grouped and windowed aggregation.
+#
+# Rows are grouped by key columns and, optionally, by tumbling time window (the timestamp floored
+# to the window length). Each chunk's keys are factorized into integer group codes, and every
+# statistic is a NumPy reduction over those codes (np.bincount, ufunc.at), so no Python runs per
+# row or per group. Quantiles come from a KLL sketch per group and column, so their memory stays
+# bounded however many rows a group collects. The state is mergeable: shards aggregated on separate
+# cores, and rows appended later, are folded in with merge() / update(). Rolling windows are read
+# from the per-window state.
+
+import numpy as np
+import pandas as pd
+
+from app.services.accumulators import KLLSketch
+
+WINDOW = "window"
+STATISTICS = ("count", "sum", "mean", "std", "min", "max")
+
+
+def parse_window(window) -> pd.Timedelta:
+    try:
+        length = pd.Timedelta(window)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid window: {window}; use a fixed length such as 15min, 1h or 1D.") from None
+    if length <= pd.Timedelta(0):
+        raise ValueError(f"Invalid window: {window}; it must be positive.")
+    return length
+
+
+def factorize_keys(columns: list) -> tuple:
+    """
+    Integer group codes for rows keyed by several columns.
+    :return: (codes, keys, valid): a code for each row with no missing key, numbered in order of
+             first appearance; for each column the key values of every group; and the mask of those rows.
+    """
+    factorized = [pd.factorize(column) for column in columns]
+    valid = np.logical_and.reduce([codes >= 0 for codes, _ in factorized])
+    everything = valid.all()
+    per_column = [codes if everything else codes[valid] for codes, _ in factorized]
+    combined = per_column[0]
+    for (_, uniques), codes in zip(factorized[1:], per_column[1:]):
+        # Renumbering after every column keeps the combined codes below the row count, so they never overflow
+        combined, _ = pd.factorize(combined * len(uniques) + codes)
+    # Index of each group's first row: written back to front, so the first occurrence is written last
+    first = np.empty(combined.max() + 1 if len(combined) else 0, dtype=np.int64)
+    first[combined[::-1]] = np.arange(len(combined))[::-1]
+    keys = [uniques[codes[first]] for (_, uniques), codes in zip(factorized, per_column)]
+    return combined, keys, valid
+
+
+def _group_moments(codes: np.ndarray, n_groups: int, values: np.ndarray):
+    # Count, sum, sum of squared deviations, min and max of each column, per group
+    shape = (n_groups, values.shape[1])
+    count, total, m2 = np.zeros(shape), np.zeros(shape), np.zeros(shape)
+    minimum, maximum = np.full(shape, np.inf), np.full(shape, -np.inf)
+    for j in range(values.shape[1]):
+        column = values[:, j]
+        mask = ~np.isnan(column)
+        filled = np.where(mask, column, 0.0)
+        count[:, j] = np.bincount(codes, weights=mask, minlength=n_groups)
+        total[:, j] = np.bincount(codes, weights=filled, minlength=n_groups)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(count[:, j] > 0, total[:, j] / count[:, j], 0.0)
+        m2[:, j] = np.bincount(codes, weights=np.where(mask, (column - mean[codes]) ** 2, 0.0), minlength=n_groups)
+        np.fmin.at(minimum[:, j], codes, column)
+        np.fmax.at(maximum[:, j], codes, column)
+    return count, total, m2, minimum, maximum
+
+
+def _combine_moments(a: tuple, b: tuple) -> tuple:
+    # Chan's pairwise update of (count, sum, m2, min, max)
+    n_a, sum_a, m2_a, min_a, max_a = a
+    n_b, sum_b, m2_b, min_b, max_b = b
+    n = n_a + n_b
+    with np.errstate(invalid='ignore', divide='ignore'):
+        delta = np.where(n_b > 0, sum_b / n_b, 0.0) - np.where(n_a > 0, sum_a / n_a, 0.0)
+        m2 = m2_a + m2_b + np.where(n > 0, delta ** 2 * n_a * n_b / n, 0.0)
+    return n, sum_a + sum_b, m2, np.fmin(min_a, min_b), np.fmax(max_a, max_b)
+
+
+class GroupedAggregator:
+    def __init__(self, group_by: list, value_columns: list = None, time_column: str = None, window=None,
+                 quantiles=()):
+        """
+        Mergeable per-group row count and count, sum, mean, standard deviation, min and max of
+        numeric columns, with optional approximate quantiles.
+        :param group_by: Key columns; rows with a missing key are skipped.
+        :param value_columns: Numeric columns to aggregate; defaults to the other numeric columns
+                              of the first chunk.
+        :param time_column: Timestamp column; with `window`, rows are also grouped by tumbling window.
+        :param window: Window length, e.g. "15min", "1h" or "1D"; windows start at multiples of it.
+        :param quantiles: Quantiles in [0, 1], read from a KLL sketch of each group's values with a
+                          normalized rank error of about config.QUANTILE_ERROR.
+        """
+        if (time_column is None) != (window is None):
+            raise ValueError("A time window needs both time_column and window.")
+        if not group_by and time_column is None:
+            raise ValueError("Group by at least one column or by a time window.")
+        if any(not 0 <= q <= 1 for q in quantiles):
+            raise ValueError("Quantiles must be between 0 and 1.")
+        self.group_by = list(group_by)
+        self.value_columns = list(value_columns) if value_columns is not None else None
+        self.time_column = time_column
+        self.window = window
+        self.window_length = parse_window(window) if window is not None else None
+        self.quantiles = sorted(set(quantiles))
+        self.rows = 0
+        self._keys = None
+        self._counts = np.zeros(0)
+        self._moments = None
+        self._sketches = []  # per group, one KLLSketch per value column; empty without quantiles
+
+    @property
+    def key_names(self) -> list:
+        return self.group_by + ([WINDOW] if self.window is not None else [])
+
+    @property
+    def n_groups(self) -> int:
+        return 0 if self._keys is None else len(self._keys)
+
+    def spec(self) -> dict:
+        """Constructor arguments, to start an aggregation of other rows the same way."""
+        return {"group_by": self.group_by, "value_columns": self.value_columns, "time_column": self.time_column,
+                "window": self.window, "quantiles": self.quantiles}
+
+    def _grouping(self) -> tuple:
+        return self.group_by, self.time_column, self.window_length, self.quantiles
+
+    def update(self, df: pd.DataFrame):
+        """Add a chunk of rows."""
+        columns = [*self.group_by, *([self.time_column] if self.time_column else [])]
+        missing = [col for col in columns + (self.value_columns or []) if col not in df.columns]
+        if missing:
+            raise ValueError(f"Missing columns: {', '.join(map(str, missing))}")
+        if self.value_columns is None:
+            self.value_columns = [col for col in df.columns
+                                  if col not in columns and pd.api.types.is_numeric_dtype(df[col])]
+        non_numeric = [col for col in self.value_columns if not pd.api.types.is_numeric_dtype(df[col])]
+        if non_numeric:
+            raise ValueError(f"Aggregated columns must be numeric: {', '.join(map(str, non_numeric))}")
+
+        keys = [df[col] for col in self.group_by]
+        if self.time_column is not None:
+            timestamps = df[self.time_column]
+            if not pd.api.types.is_datetime64_any_dtype(timestamps):
+                timestamps = pd.to_datetime(timestamps, errors="coerce")
+            keys.append(timestamps.dt.floor(self.window_length))
+        codes, uniques, valid = factorize_keys(keys)
+        if not len(codes):
+            return
+        values = df[self.value_columns].to_numpy(dtype=float)
+        if len(codes) < len(values):
+            values = values[valid]
+
+        ids = self._assign(uniques)
+        n_local = len(ids)
+        self.rows += len(codes)
+        self._counts[ids] += np.bincount(codes, minlength=n_local)
+        local = _group_moments(codes, n_local, values)
+        combined = _combine_moments(tuple(state[ids] for state in self._moments), local)
+        for state, part in zip(self._moments, combined):
+            state[ids] = part
+        if self.quantiles:
+            self._sketch(ids[codes], values)
+
+    def merge(self, other: "GroupedAggregator"):
+        """Fold in another aggregation of the same spec (e.g. of another shard of the rows)."""
+        if other._grouping() != self._grouping():
+            raise ValueError("Only aggregations of the same groups, windows and quantiles can be merged.")
+        if self.value_columns is None:
+            self.value_columns = other.value_columns
+        elif other.value_columns is not None and other.value_columns != self.value_columns:
+            raise ValueError("Only aggregations of the same columns can be merged.")
+        if not other.n_groups:
+            return
+        keys = other._keys
+        ids = self._assign([keys.get_level_values(i).to_numpy() for i in range(keys.nlevels)])
+        self.rows += other.rows
+        self._counts[ids] += other._counts
+        combined = _combine_moments(tuple(state[ids] for state in self._moments), other._moments)
+        for state, part in zip(self._moments, combined):
+            state[ids] = part
+        for group, sketches in zip(ids, other._sketches):
+            for sketch, other_sketch in zip(self._sketches[group], sketches):
+                sketch.merge(other_sketch)
+
+    def _assign(self, keys: list) -> np.ndarray:
+        # Map the keys of a chunk's groups to group ids of this aggregation, adding the new ones
+        index = pd.MultiIndex.from_arrays(keys, names=self.key_names)
+        if self._keys is None:
+            self._keys = index
+            ids = np.arange(len(index))
+        else:
+            ids = self._keys.get_indexer(index)
+            new = ids < 0
+            if new.any():
+                ids[new] = len(self._keys) + np.arange(new.sum())
+                self._keys = self._keys.append(index[new])
+        self._grow(len(self._keys))
+        return ids
+
+    def _grow(self, n_groups: int):
+        width = len(self.value_columns)
+        if self._moments is None:
+            self._moments = (np.zeros((0, width)),) * 3 + (np.full((0, width), np.inf), np.full((0, width), -np.inf))
+        pad = n_groups - len(self._counts)
+        if pad > 0:
+            self._counts = np.concatenate([self._counts, np.zeros(pad)])
+            fills = (0.0, 0.0, 0.0, np.inf, -np.inf)
+            self._moments = tuple(np.concatenate([state, np.full((pad, width), fill)])
+                                  for state, fill in zip(self._moments, fills))
+            if self.quantiles:
+                self._sketches.extend([KLLSketch() for _ in range(width)] for _ in range(pad))
+
+    def _sketch(self, ids: np.ndarray, values: np.ndarray):
+        # Rows sorted by group id, so each group's values are one slice
+        order = np.argsort(ids, kind="stable")
+        ids, values = ids[order], values[order]
+        groups, starts = np.unique(ids, return_index=True)
+        for group, start, end in zip(groups, starts, np.append(starts[1:], len(ids))):
+            for j, sketch in enumerate(self._sketches[group]):
+                sketch.update(values[start:end, j])
+
+    def result(self, rolling: int = None) -> pd.DataFrame:
+        """
+        One row per group (and window), sorted by key: the key columns, `rows`, and a
+        `<column>_<statistic>` column for each statistic and `<column>_p<percent>` for each quantile.
+        :param rolling: Aggregate each window together with the rolling - 1 windows before it, e.g. a
+                        7-day rolling window over daily windows. Rows are only reported for windows
+                        that have data.
+        """
+        keys = self._keys if self._keys is not None else pd.MultiIndex.from_arrays(
+            [[]] * len(self.key_names), names=self.key_names)
+        counts = self._counts
+        moments = self._moments if self._moments is not None else (np.zeros((0, len(self.value_columns or []))),) * 5
+        order = np.lexsort([pd.factorize(keys.get_level_values(i), sort=True)[0]
+                            for i in reversed(range(keys.nlevels))]) if len(keys) else np.zeros(0, dtype=np.int64)
+        keys, counts = keys[order], counts[order]
+        moments = tuple(state[order] for state in moments)
+        quantiles = self._quantiles()[order] if self.quantiles else None
+
+        if rolling is not None and rolling > 1:
+            if self.window is None:
+                raise ValueError("Rolling windows need a time_column and window.")
+            if self.quantiles:
+                raise ValueError("Quantiles are not available for rolling windows.")
+            counts, moments = self._rolling(keys, counts, moments, rolling)
+
+        frame = keys.to_frame(index=False)
+        frame["rows"] = counts.astype(np.int64)
+        count, total, m2, minimum, maximum = moments
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(count > 0, total / count, np.nan)
+            std = np.where(count > 1, np.sqrt(m2 / (count - 1)), np.nan)
+        minimum, maximum = np.where(count > 0, minimum, np.nan), np.where(count > 0, maximum, np.nan)
+        columns = {}
+        for j, col in enumerate(self.value_columns or []):
+            for name, values in zip(STATISTICS, (count.astype(np.int64), total, mean, std, minimum, maximum)):
+                columns[f"{col}_{name}"] = values[:, j]
+            if quantiles is not None:
+                for i, q in enumerate(self.quantiles):
+                    columns[f"{col}_p{q * 100:g}"] = quantiles[:, j, i]
+        return pd.concat([frame, pd.DataFrame(columns)], axis=1)
+
+    def _quantiles(self) -> np.ndarray:
+        result = np.full((self.n_groups, len(self.value_columns or []), len(self.quantiles)), np.nan)
+        for group, sketches in enumerate(self._sketches):
+            for j, sketch in enumerate(sketches):
+                result[group, j] = sketch.quantile(self.quantiles)
+        return result
+
+    def _rolling(self, keys: pd.MultiIndex, counts: np.ndarray, moments: tuple, periods: int):
+        # Rows are sorted by group, then window; window i takes in window i - k of the same group
+        # when it started less than `periods` window lengths earlier
+        group = factorize_keys([keys.get_level_values(i) for i in range(keys.nlevels - 1)])[0] \
+            if keys.nlevels > 1 else np.zeros(len(keys), dtype=np.int64)
+        starts = keys.get_level_values(WINDOW)
+        span = self.window_length * periods
+        rolled_counts, rolled = counts.copy(), moments
+        for k in range(1, min(periods, len(keys))):
+            inside = np.zeros(len(keys), dtype=bool)
+            inside[k:] = (group[k:] == group[:-k]) & (starts[k:] - starts[:-k] < span)
+            if not inside.any():
+                break
+            shifted = tuple(np.concatenate([np.zeros((k, state.shape[1])), state[:-k]]) for state in moments)
+            shifted = tuple(np.where(inside[:, None], state, empty) for state, empty in
+                            zip(shifted, (0.0, 0.0, 0.0, np.inf, -np.inf)))
+            rolled = _combine_moments(rolled, shifted)
+            rolled_counts = rolled_counts + np.where(inside, np.concatenate([np.zeros(k), counts[:-k]]), 0)
+        return rolled_counts, rolled
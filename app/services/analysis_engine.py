@@ -1,47 +1,118 @@
+import copy
+import time
 import numpy as np
 import pandas as pd
 from sklearn.linear_model import LinearRegression 
 from fastapi import HTTPException
 from sklearn.tree import  DecisionTreeRegressor
+from sklearn.ensemble import HistGradientBoostingRegressor, RandomForestRegressor
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.model_selection import HalvingGridSearchCV
+from threadpoolctl import threadpool_limits
+from app import config
+from app.services.aggregation import GroupedAggregator
+from app.services.incremental_regression import IncrementalLinearRegression
+from app.services.model_registry import FittedModel
+from app.services.profiling import NUMERIC, build_profile
+from app.utils.metrics import count_rows, observe_stage, timed
+
+TREE_MODELS = {
+    "decision_tree": DecisionTreeRegressor,
+    "random_forest": RandomForestRegressor,
+    "gradient_boosting": HistGradientBoostingRegressor,
+}
+# Limits accepted for every tree model; n_estimators is the number of trees of the ensembles
+TREE_PARAMS = ("max_depth", "min_samples_leaf", "max_leaf_nodes", "n_estimators")
+# Candidates tried by the hyperparameter search, on top of the limits given explicitly
+TREE_SEARCH_GRIDS = {
+    "decision_tree": {"max_depth": [4, 8, 16, None], "min_samples_leaf": [1, 5, 20]},
+    "random_forest": {"max_depth": [8, 16, None], "min_samples_leaf": [1, 5], "max_features": [1.0, 0.5]},
+    "gradient_boosting": {"learning_rate": [0.05, 0.1, 0.2], "max_leaf_nodes": [15, 31, 63],
+                          "min_samples_leaf": [5, 20]},
+}
+# Fits are deterministic, so a model id always stands for the same model
+RANDOM_STATE = 0
+
+
+def _tree_estimator(model: str, params: dict, n_jobs: int):
+    if model not in TREE_MODELS:
+        raise ValueError(f"Unknown tree model: {model}; use one of {', '.join(TREE_MODELS)}.")
+    params = dict(params)
+    if "n_estimators" in params:
+        if model == "decision_tree":
+            raise ValueError("n_estimators applies to random_forest and gradient_boosting only.")
+        if model == "gradient_boosting":
+            params["max_iter"] = params.pop("n_estimators")
+    if model == "random_forest":
+        params["n_jobs"] = n_jobs
+    if model == "gradient_boosting":
+        # Stop adding trees once the score on a held-out tenth of the rows stops improving
+        params.setdefault("max_iter", 500)
+        params["early_stopping"] = True
+    return TREE_MODELS[model](random_state=RANDOM_STATE, **params)
+
+
+def aggregation_model(aggregator: GroupedAggregator) -> FittedModel:
+    """Wrap an aggregation for the model registry, so it can be read again and appended to."""
+    spec = aggregator.spec()
+    params = {name: value for name, value in spec.items() if name != "value_columns"}
+    metrics = {"groups": aggregator.n_groups, "rows": aggregator.rows}
+    return FittedModel("aggregation", aggregator, spec["value_columns"] or [], None, params=params, metrics=metrics)
+
 
 class AnalysisEngine:
-    def __init__(self, data):
+    def __init__(self, data, profile=None):
         """
         Initialize the AnalysisEngine with data.
-        :param data: Pandas DataFrame containing the data to be analyzed.
+        :param data: Pandas DataFrame containing the data to be analyzed, or an iterator of
+                     DataFrame chunks (supported by descriptive_statistics only).
+        :param profile: Column profile of the data (see services.profiling), if already computed.
         """
         self.data = data
+        self.profile = profile
 
-    def descriptive_statistics(self):
+    def descriptive_statistics(self, exact=True, error=None):
         """
         Calculate and return descriptive statistics for numeric columns in the data.
+        Statistics are read from the column profile, which is built in a single pass over the
+        data (or over each streamed chunk) when none was given.
+        :param exact: If False, the median comes from a bounded-memory quantile sketch instead of
+                      the full column, so streamed data is never held in memory.
+        :param error: Rank error bound for the approximate median (defaults to config.QUANTILE_ERROR).
         """
-        # Select only numeric columns
-        numeric_data = self.data.select_dtypes(include='number')
-    
-        if numeric_data.empty:
+        profile = self.profile or build_profile(self.data, exact=exact, error=error)
+        numeric = {col: entry for col, entry in profile["columns"].items() if entry["kind"] == NUMERIC}
+
+        if not profile["rows"] or not numeric:
             raise ValueError("No numeric data available for statistical analysis.")
-    
+
         return {
-            "mean": numeric_data.mean().to_dict(),
-            "median": numeric_data.median().to_dict(),
-            "std_dev": numeric_data.std().to_dict(),
-            "min": numeric_data.min().to_dict(),
-            "max": numeric_data.max().to_dict(),
-            "count": numeric_data.count().to_dict(),
+            "mean": {col: entry["mean"] for col, entry in numeric.items()},
+            "median": {col: entry["quantiles"]["50%"] for col, entry in numeric.items()},
+            "std_dev": {col: entry["std_dev"] for col, entry in numeric.items()},
+            "min": {col: entry["min"] for col, entry in numeric.items()},
+            "max": {col: entry["max"] for col, entry in numeric.items()},
+            "count": {col: entry["count"] for col, entry in numeric.items()},
         }
 
-    def linear_regression(self, target_column):
+    def linear_regression(self, target_column, incremental=False):
         """
         Perform linear regression on the data.
         :param target_column: The column to be predicted (dependent variable).
+        :param incremental: Fit chunk by chunk from accumulated cross-products instead of the full
+                            X matrix; always used when the data is an iterator of chunks.
         :return: Dictionary with coefficients, intercept, and R-squared value.
         """
+        if incremental or not isinstance(self.data, pd.DataFrame):
+            return self.fit_incremental_regression(target_column).metrics
+
         X = self.data.drop(columns=[target_column])
         y = self.data[target_column]
 
         model = LinearRegression()
-        model.fit(X, y)
+        with timed("fit_linear_regression"):
+            model.fit(X, y)
+        count_rows("fit_linear_regression", len(X))
 
         regression_results = {
             "coefficients": dict(zip(X.columns, model.coef_)),
@@ -50,28 +121,172 @@ class AnalysisEngine:
         }
         return regression_results
 
-    def decision_tree_regression(self, target_column, feature_columns):
+    def fit_incremental_regression(self, target_column, feature_columns=None, model: FittedModel = None) -> FittedModel:
+        """
+        Fit an out-of-core linear regression over the data or its chunks.
+        Rows with missing values are skipped; features must be numeric.
+        :param feature_columns: Defaults to every column except the target.
+        :param model: A previous incremental fit to append these rows to; it is left unchanged.
+        """
+        chunks = [self.data] if isinstance(self.data, pd.DataFrame) else self.data
+        if model is not None:
+            estimator, feature_columns, target_column = copy.deepcopy(model.estimator), model.features, model.target
+        else:
+            estimator = IncrementalLinearRegression()
+
+        # Only the updates are timed; reading streamed chunks is timed as parsing
+        rows, seconds = estimator.n, 0.0
+        for chunk in chunks:
+            if feature_columns is None:
+                feature_columns = [col for col in chunk.columns if col != target_column]
+            columns = [*feature_columns, target_column]
+            missing = [col for col in columns if col not in chunk.columns]
+            if missing:
+                raise ValueError(f"Missing columns: {', '.join(map(str, missing))}")
+            non_numeric = [col for col in columns if not pd.api.types.is_numeric_dtype(chunk[col])]
+            if non_numeric:
+                raise ValueError(f"Incremental regression needs numeric columns: {', '.join(map(str, non_numeric))}")
+            values = chunk[columns].to_numpy(dtype=float)
+            values = values[~np.isnan(values).any(axis=1)]
+            start = time.perf_counter()
+            estimator.partial_fit(values[:, :-1], values[:, -1])
+            seconds += time.perf_counter() - start
+        observe_stage("fit_incremental_regression", seconds)
+        count_rows("fit_incremental_regression", estimator.n - rows)
+
+        if not estimator.n:
+            raise ValueError("No complete rows available for regression.")
+
+        metrics = {
+            "coefficients": dict(zip(feature_columns, estimator.coef_.tolist())),
+            "intercept": estimator.intercept_,
+            "r_squared": estimator.r_squared(),
+            "rows": estimator.n,
+        }
+        return FittedModel("incremental_linear_regression", estimator, feature_columns, target_column, metrics=metrics)
+
+    def fit_aggregation(self, group_by, value_columns=None, time_column=None, window=None, quantiles=(),
+                        model: FittedModel = None) -> FittedModel:
+        """
+        Aggregate the data, or its chunks, per group and time window (see services.aggregation).
+        :param group_by: Key columns.
+        :param value_columns: Numeric columns to aggregate; defaults to the other numeric columns.
+        :param time_column: Timestamp column, grouped into tumbling windows of length `window`.
+        :param quantiles: Per-group quantiles to compute, in [0, 1], from bounded-memory sketches.
+        :param model: A previous aggregation to add these rows to; it is left unchanged.
+        """
+        chunks = [self.data] if isinstance(self.data, pd.DataFrame) else self.data
+        if model is not None:
+            aggregator = copy.deepcopy(model.estimator)
+        else:
+            aggregator = GroupedAggregator(group_by, value_columns, time_column, window, quantiles)
+
+        rows, seconds = aggregator.rows, 0.0
+        for chunk in chunks:
+            start = time.perf_counter()
+            aggregator.update(chunk)
+            seconds += time.perf_counter() - start
+        observe_stage("aggregate", seconds)
+        count_rows("aggregate", aggregator.rows - rows)
+        return aggregation_model(aggregator)
+
+    def grouped_aggregation(self, group_by, value_columns=None, time_column=None, window=None, quantiles=(),
+                            rolling=None) -> pd.DataFrame:
+        """
+        Per-group statistics as a table, one row per group (and window); see GroupedAggregator.result.
+        :param rolling: Report each window together with the rolling - 1 windows before it.
+        """
+        model = self.fit_aggregation(group_by, value_columns, time_column, window, quantiles)
+        return model.estimator.result(rolling)
+
+    def decision_tree_regression(self, target_column, feature_columns, include_predictions=True, **options):
         """
         Perform Decision Tree Regression on the data.
         :param target_column: The column to be predicted (dependent variable).
         :param feature_columns: List of feature columns to be used for prediction.
+        :param include_predictions: Include the in-sample predictions, one per row.
+        :param options: Tree model options, see fit_tree_model.
         :return: Dictionary with feature importance, predictions, and R-squared value.
         """
+        model, X = self._fit_tree_model(target_column, feature_columns, **options)
+
+        decision_tree_results = dict(model.metrics)
+        if include_predictions:
+            decision_tree_results["predictions"] = model.estimator.predict(X).tolist()
+
+        return decision_tree_results
+
+    def fit_decision_tree(self, target_column, feature_columns) -> FittedModel:
+        """Fit a Decision Tree Regressor and return it with its metrics, for storing in the model registry."""
+        return self._fit_tree_model(target_column, feature_columns)[0]
+
+    def fit_tree_model(self, target_column, feature_columns, model="decision_tree", params=None, search=False,
+                       sample_rows=None, n_jobs=None) -> FittedModel:
+        """
+        Fit a tree model and return it with its metrics, for storing in the model registry.
+        :param model: One of TREE_MODELS.
+        :param params: Limits such as max_depth or min_samples_leaf (see TREE_PARAMS); the search keeps them fixed.
+        :param search: Pick the remaining hyperparameters by cross-validated successive halving, which
+                       scores every candidate on a few rows and only keeps the best on more.
+        :param sample_rows: Fit on a random sample of at most this many rows.
+        :param n_jobs: Cores used by forests and the search (defaults to config.TREE_N_JOBS).
+        """
+        return self._fit_tree_model(target_column, feature_columns, model, params, search, sample_rows, n_jobs)[0]
+
+    def _fit_tree_model(self, target_column, feature_columns, model="decision_tree", params=None, search=False,
+                        sample_rows=None, n_jobs=None):
+        params = {name: value for name, value in (params or {}).items() if value is not None}
+        unknown = [name for name in params if name not in TREE_PARAMS]
+        if unknown:
+            raise ValueError(f"Unknown tree parameters: {', '.join(unknown)}")
+        n_jobs = n_jobs or config.TREE_N_JOBS
+        estimator = _tree_estimator(model, params, n_jobs)
+
         X = self.data[feature_columns]
         y = self.data[target_column]
+        if sample_rows and len(X) > sample_rows:
+            rows = self.data.sample(n=sample_rows, random_state=RANDOM_STATE).index
+            X, y = X.loc[rows], y.loc[rows]
 
         # Handle non-numeric data by converting categorical features to dummy variables
         if X.select_dtypes(include='object').any().any():
             X = pd.get_dummies(X)
 
-        # Fit Decision Tree Regressor
-        model = DecisionTreeRegressor()
-        model.fit(X, y)
+        metrics = {}
+        # Gradient boosting runs on OpenMP threads rather than n_jobs
+        with timed(f"fit_{model}"), threadpool_limits(limits=n_jobs if n_jobs > 0 else None):
+            if search:
+                grid = {name: values for name, values in TREE_SEARCH_GRIDS[model].items() if name not in params}
+                estimator = self._search(estimator, grid, X, y, n_jobs)
+                metrics["cv_r_squared"] = estimator.best_score_
+                metrics["best_params"] = estimator.best_params_
+                estimator = estimator.best_estimator_
+            else:
+                estimator.fit(X, y)
+        count_rows(f"fit_{model}", len(X))
 
-        decision_tree_results = {
-            "feature_importance": dict(zip(X.columns, model.feature_importances_)),
-            "predictions": model.predict(X).tolist(),
-            "r_squared": model.score(X, y)
-        }
+        if hasattr(estimator, "feature_importances_"):
+            metrics["feature_importance"] = dict(zip(X.columns, estimator.feature_importances_))
+        metrics["r_squared"] = estimator.score(X, y)
+        if sample_rows:
+            metrics["rows_used"] = len(X)
+        fitted = FittedModel(model, estimator, feature_columns, target_column,
+                             params={**params, **metrics.get("best_params", {})},
+                             columns=X.columns.tolist(), metrics=metrics)
+        return fitted, X
 
-        return decision_tree_results
\ No newline at end of file
+    @staticmethod
+    def _search(estimator, grid: dict, X, y, n_jobs: int):
+        folds = config.TREE_SEARCH_CV
+        # Successive halving starts every candidate on 2 * folds rows
+        if len(X) < 4 * folds:
+            raise ValueError(f"Hyperparameter search needs at least {4 * folds} rows.")
+        # The cores go to the candidates; a forest trains its own trees one at a time meanwhile
+        forest = "n_jobs" in estimator.get_params()
+        if forest:
+            estimator.set_params(n_jobs=1)
+        search = HalvingGridSearchCV(estimator, grid, cv=folds, n_jobs=n_jobs, random_state=RANDOM_STATE)
+        search.fit(X, y)
+        if forest:
+            search.best_estimator_.set_params(n_jobs=n_jobs)
+        return search
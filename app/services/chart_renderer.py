@@ -0,0 +1,188 @@
+import hashlib
+import io
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+
+from app import config
+
+BACKENDS = ("plotly", "matplotlib")
+
+
+class ChartImage(NamedTuple):
+    data: bytes  # PNG
+    width: int  # pixels
+    height: int
+
+
+class ChartRenderer:
+    def __init__(self, backend: str, workers: int, cache_entries: int, width: int = 700, height: int = 500):
+        """
+        Renders bar and pie charts to PNG bytes in parallel, caching images by data and style.
+        :param backend: "plotly" (Kaleido export) or "matplotlib" (Agg, lower latency).
+        :param workers: Charts rendered at once; for plotly, one persistent Kaleido process each.
+        :param cache_entries: Number of rendered images kept in the LRU cache.
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f"Unsupported chart backend: {backend}")
+        self.backend = backend
+        self.workers = workers
+        self.cache_entries = cache_entries
+        self.width = width
+        self.height = height
+        self.stats = {"hits": 0, "misses": 0}
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix=f"chart-{backend}")
+        self._scopes = queue.Queue()
+        self._scopes_created = 0
+
+    def render(self, charts, progress=None) -> dict:
+        """
+        Render charts and return {name: ChartImage} in the order given.
+        :param charts: Iterable of (name, kind, series) with kind "bar" (values plotted against the
+                       index) or "pie" (counts indexed by label). Reduce large data before rendering.
+        :param progress: Optional callback called as progress(charts_done, charts_total).
+        """
+        charts = list(charts)
+        images, futures = {}, {}
+        for name, kind, series in charts:
+            key = self._cache_key(name, kind, series)
+            image = self._cache_get(key)
+            if image is not None:
+                images[name] = image
+            elif self.backend == "matplotlib":
+                futures[self._pool.submit(self._render_matplotlib, kind, series, self._title(name))] = (name, key)
+            else:
+                # Plotly figures are built here, since plotly's lazily loaded templates are not
+                # thread-safe; only the slow Kaleido export runs on the pool
+                figure = self._plotly_figure(kind, series, self._title(name))
+                futures[self._pool.submit(self._export_plotly, figure)] = (name, key)
+
+        if progress:
+            progress(len(images), len(charts))
+        for future in as_completed(futures):
+            name, key = futures[future]
+            images[name] = future.result()
+            self._cache_put(key, images[name])
+            if progress:
+                progress(len(images), len(charts))
+
+        return {name: ChartImage(images[name], self.width, self.height) for name, _, _ in charts}
+
+    def _cache_key(self, name, kind, series: pd.Series):
+        digest = hashlib.sha1(pd.util.hash_pandas_object(series, index=True).to_numpy().tobytes())
+        return digest.hexdigest(), str(name), kind, (self.backend, self.width, self.height)
+
+    def _cache_get(self, key):
+        with self._lock:
+            image = self._cache.get(key)
+            if image is None:
+                self.stats["misses"] += 1
+                return None
+            self._cache.move_to_end(key)
+            self.stats["hits"] += 1
+            return image
+
+    def _cache_put(self, key, image: bytes):
+        with self._lock:
+            self._cache[key] = image
+            while len(self._cache) > self.cache_entries:
+                self._cache.popitem(last=False)
+
+    @staticmethod
+    def _title(name) -> str:
+        return f'{name} Distribution'
+
+    @staticmethod
+    def _plotly_figure(kind, series: pd.Series, title: str) -> dict:
+        frame = series.to_frame(name=series.name)
+        if kind == "bar":
+            fig = px.bar(frame, x=frame.index, y=series.name, title=title)
+        else:
+            fig = px.pie(names=[str(label) for label in series.index], values=series.to_numpy(), title=title)
+        return fig.to_dict()
+
+    def _export_plotly(self, figure: dict) -> bytes:
+        scope = self._acquire_scope()
+        try:
+            return scope.transform(figure, format="png", width=self.width, height=self.height)
+        finally:
+            self._scopes.put(scope)
+
+    def _acquire_scope(self):
+        # Each Kaleido scope owns a long-lived Chromium subprocess; create them lazily up to `workers`
+        with self._lock:
+            if self._scopes.empty() and self._scopes_created < self.workers:
+                from kaleido.scopes.plotly import PlotlyScope
+                from plotly.io.kaleido import scope as default_scope
+                self._scopes_created += 1
+                # Use the plotly.js bundled with plotly, as fig.write_image does
+                return PlotlyScope(plotlyjs=default_scope.plotlyjs, mathjax=default_scope.mathjax)
+        return self._scopes.get()
+
+    def _render_matplotlib(self, kind, series: pd.Series, title: str) -> bytes:
+        # The object-oriented API with an Agg canvas is safe to use from several threads, unlike pyplot
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+
+        dpi = 100
+        fig = Figure(figsize=(self.width / dpi, self.height / dpi), dpi=dpi)
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot()
+        if kind == "bar":
+            index = series.index
+            x = index.to_numpy(dtype=float) if pd.api.types.is_numeric_dtype(index) else np.arange(len(series))
+            ax.add_collection(_bar_collection(x, series.to_numpy(dtype=float)))
+            ax.autoscale_view()
+            ax.set_ylabel(str(series.name))
+        else:
+            ax.pie(series.to_numpy(), labels=[str(label) for label in series.index], autopct='%1.1f%%')
+        ax.set_title(title)
+
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format="png")
+        return buffer.getvalue()
+
+
+def _bar_collection(x: np.ndarray, heights: np.ndarray):
+    """
+    All bars as one PolyCollection: Agg draws it in a single pass, where ax.bar adds (and draws)
+    a Rectangle patch per bar.
+    """
+    from matplotlib.collections import PolyCollection
+
+    gaps = np.diff(np.sort(x))
+    width = 0.8 * (gaps[gaps > 0].min() if (gaps > 0).any() else 1.0)
+    heights = np.nan_to_num(heights)
+    left, right = x - width / 2, x + width / 2
+    zeros = np.zeros_like(heights)
+    # (bars, 4 corners, xy)
+    vertices = np.stack([np.column_stack([left, zeros]), np.column_stack([left, heights]),
+                         np.column_stack([right, heights]), np.column_stack([right, zeros])], axis=1)
+    return PolyCollection(vertices, facecolors="C0", edgecolors="face", linewidths=0.5)
+
+
+_renderers = {}
+_renderers_lock = threading.Lock()
+
+
+def get_renderer(backend: str = None) -> ChartRenderer:
+    """Return the process-wide renderer for a backend, so its pool and cache are reused across reports."""
+    backend = backend or config.CHART_BACKEND
+    with _renderers_lock:
+        if backend not in _renderers:
+            _renderers[backend] = ChartRenderer(backend, config.CHART_WORKERS, config.CHART_CACHE_ENTRIES)
+        return _renderers[backend]
+
+
+def renderer_stats() -> dict:
+    """Cache statistics of each renderer created so far, by backend."""
+    with _renderers_lock:
+        return {backend: dict(renderer.stats) for backend, renderer in _renderers.items()}
@@ -1,22 +1,193 @@
 # app/core/data_processing.py
 
+import functools
+import threading
+import time
+import tracemalloc
+import numpy as np
 import pandas as pd
+from scipy import sparse
+from typing import Callable, Iterable, Iterator, List, NamedTuple, Union
 
-def clean_data(df: pd.DataFrame) -> pd.DataFrame:
-    """Clean the data by handling missing values, duplicates, etc."""
-    df = df.drop_duplicates()
-    df = df.dropna()  # You might want to handle NaNs differently depending on the context
-    # Add more cleaning steps as required
-    return df
-
-def preprocess_data(df: pd.DataFrame) -> pd.DataFrame:
-    """Preprocess the data (e.g., feature scaling, encoding)."""
-    # Example: Scaling numerical features
-    numeric_cols = df.select_dtypes(include=['float64', 'int64']).columns
-    df[numeric_cols] = (df[numeric_cols] - df[numeric_cols].mean()) / df[numeric_cols].std()
-    
-    # Example: Encoding categorical features
-    categorical_cols = df.select_dtypes(include=['object']).columns
-    df = pd.get_dummies(df, columns=categorical_cols)
-    
-    return df
+from app.utils.metrics import count_rows, observe_stage, timed
+
+def clean_data(df: Union[pd.DataFrame, Iterable[pd.DataFrame]]) -> Union[pd.DataFrame, Iterator[pd.DataFrame]]:
+    """
+    Clean the data by handling missing values, duplicates, etc.
+    Given an iterable of chunks instead of a DataFrame, returns a lazy iterator of cleaned chunks.
+    """
+    if not isinstance(df, pd.DataFrame):
+        return _clean_chunks(df)
+    return CLEANING.run(df)
+
+def _clean_chunks(chunks: Iterable[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+    # Rows seen in earlier chunks are tracked by their 64-bit row hash, 8 bytes per kept row, in
+    # sorted uint64 runs merged as they grow, so checking a chunk takes one binary search per run
+    seen = []
+    for chunk in chunks:
+        chunk = chunk.dropna()
+        # Hash numbers as float64, since a column can be int32 in one chunk and float64 in the next
+        numeric_cols = chunk.select_dtypes(include='number').columns
+        hashes = pd.util.hash_pandas_object(chunk.astype({col: 'float64' for col in numeric_cols}), index=False).to_numpy()
+        keep = ~pd.Series(hashes).duplicated().to_numpy()
+        # Searching in sorted order keeps the binary searches cache friendly
+        order = np.argsort(hashes)
+        ordered = hashes[order]
+        for run in seen:
+            keep[order[_sorted_contains(run, ordered)]] = False
+        if keep.any():
+            seen.append(np.sort(hashes[keep]))
+            # Like a binary counter: at most log2(rows) runs, each row merged log2(rows) times
+            while len(seen) > 1 and seen[-2].size <= seen[-1].size:
+                seen[-2:] = [np.sort(np.concatenate(seen[-2:]))]
+        yield chunk[keep]
+
+def _sorted_contains(run: np.ndarray, values: np.ndarray) -> np.ndarray:
+    positions = np.minimum(np.searchsorted(run, values), run.size - 1)
+    return run[positions] == values
+
+def preprocess_data(df: pd.DataFrame, encoding: str = "dense") -> pd.DataFrame:
+    """
+    Preprocess the data: float32 standardization of numeric columns and categorical encoding.
+    :param encoding: "dense" one-hot columns (as get_dummies), "sparse" one-hot columns named
+                     like them, or "codes" for integer category codes.
+    The input frame is left unchanged.
+    """
+    return preprocessing(encoding).run(df)
+
+
+class Stage(NamedTuple):
+    name: str
+    func: Callable[[pd.DataFrame], pd.DataFrame]
+
+
+class Pipeline:
+    def __init__(self, stages: List[Stage]):
+        """Cleaning/preprocessing stages applied in order; each takes and returns a DataFrame."""
+        self.stages = stages
+
+    def __add__(self, other: "Pipeline") -> "Pipeline":
+        return Pipeline(self.stages + other.stages)
+
+    def run(self, df: pd.DataFrame, report: list = None, memory: bool = False) -> pd.DataFrame:
+        """
+        Apply the stages to df.
+        :param report: Optional list; one {"stage", "seconds"} dict is appended per stage.
+        :param memory: Also add "peak_bytes" to each report entry, the memory the stage allocated on top
+                       of its input as traced by tracemalloc. Tracing is process-wide and slows the
+                       stages down, so such runs take turns and are meant for diagnostics only.
+        """
+        if report is None:
+            for stage in self.stages:
+                count_rows(stage.name, len(df))
+                with timed(stage.name):
+                    df = stage.func(df)
+            return df
+        if not memory:
+            return self._run_reported(df, report, None)
+
+        with _TRACING:
+            tracing = tracemalloc.is_tracing()
+            if not tracing:
+                tracemalloc.start()
+            try:
+                return self._run_reported(df, report, tracemalloc)
+            finally:
+                if not tracing:
+                    tracemalloc.stop()
+
+    def _run_reported(self, df: pd.DataFrame, report: list, tracer) -> pd.DataFrame:
+        for stage in self.stages:
+            count_rows(stage.name, len(df))
+            if tracer is not None:
+                tracer.reset_peak()
+                before = tracer.get_traced_memory()[0]
+            start = time.perf_counter()
+            df = stage.func(df)
+            seconds = time.perf_counter() - start
+            observe_stage(stage.name, seconds)
+            entry = {"stage": stage.name, "seconds": seconds}
+            if tracer is not None:
+                entry["peak_bytes"] = max(tracer.get_traced_memory()[1] - before, 0)
+            report.append(entry)
+        return df
+
+
+# tracemalloc is global to the process, so memory-reporting runs must not reset each other's peaks
+_TRACING = threading.Lock()
+
+
+def drop_nulls_and_duplicates(df: pd.DataFrame) -> pd.DataFrame:
+    """Drop rows with missing values and repeated rows, keeping first occurrences, with a single row selection."""
+    # Duplicates are found on a 64-bit digest per row rather than by comparing the rows themselves
+    hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    keep = ~df.isna().to_numpy().any(axis=1) & ~pd.Series(hashes).duplicated().to_numpy()
+    return df if keep.all() else df[keep]
+
+
+def standardize_numeric(df: pd.DataFrame) -> pd.DataFrame:
+    """Scale numeric columns to zero mean and unit variance, as float32."""
+    numeric_cols = df.select_dtypes(include='number').columns
+    if not len(numeric_cols):
+        return df
+    # One float32 copy of the numeric block; Fortran order makes it a single pandas block without another copy
+    values = np.asfortranarray(df[numeric_cols].to_numpy(dtype=np.float32))
+    if np.isnan(values).any():
+        mean = np.nanmean(values, axis=0, dtype=np.float64)
+        std = np.nanstd(values, axis=0, dtype=np.float64, ddof=1)
+        values -= mean.astype(np.float32)
+    else:
+        # Centre in place, then take the variance from the centred values without a temporary
+        mean = values.mean(axis=0, dtype=np.float64)
+        values -= mean.astype(np.float32)
+        std = np.sqrt(np.einsum('ij,ij->j', values, values, dtype=np.float64) / max(len(values) - 1, 1))
+    # Constant columns become 0 rather than NaN
+    std[~(std > 0)] = 1.0
+    values /= std.astype(np.float32)
+
+    scaled = pd.DataFrame(values, index=df.index, columns=numeric_cols, copy=False)
+    others = df.drop(columns=numeric_cols)
+    return pd.concat([scaled, others], axis=1, copy=False)[df.columns]
+
+
+def encode_categoricals(df: pd.DataFrame, encoding: str = "dense") -> pd.DataFrame:
+    """Encode object and category columns; see preprocess_data for the encodings."""
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unsupported encoding: {encoding}")
+    categorical_cols = df.select_dtypes(include=['object', 'category']).columns
+    if not len(categorical_cols):
+        return df
+    if encoding == "codes":
+        # Smallest integer dtype that fits each column's categories; missing values are -1
+        codes = {col: pd.Series(pd.Categorical(df[col]).codes, index=df.index) for col in categorical_cols}
+        return df.assign(**codes)
+    if encoding == "dense":
+        return pd.get_dummies(df, columns=categorical_cols)
+
+    # One-hot columns built from the category codes as a sparse matrix, named like get_dummies output;
+    # much faster than get_dummies(sparse=True), which densifies column by column
+    parts = [df.drop(columns=categorical_cols)]
+    for col in categorical_cols:
+        categorical = pd.Categorical(df[col])
+        present = categorical.codes >= 0
+        matrix = sparse.csc_matrix(
+            (np.ones(present.sum(), dtype=np.uint8), (np.flatnonzero(present), categorical.codes[present])),
+            shape=(len(df), len(categorical.categories)),
+        )
+        columns = [f"{col}_{category}" for category in categorical.categories]
+        parts.append(pd.DataFrame.sparse.from_spmatrix(matrix, index=df.index, columns=columns))
+    return pd.concat(parts, axis=1, copy=False)
+
+
+ENCODINGS = ("dense", "sparse", "codes")
+
+CLEANING = Pipeline([Stage("drop_nulls_and_duplicates", drop_nulls_and_duplicates)])
+
+
+def preprocessing(encoding: str = "dense") -> Pipeline:
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unsupported encoding: {encoding}")
+    return Pipeline([
+        Stage("standardize_numeric", standardize_numeric),
+        Stage(f"encode_categoricals_{encoding}", functools.partial(encode_categoricals, encoding=encoding)),
+    ])
@@ -0,0 +1,76 @@
+# Data reduction applied before plotting, so the number of points handed to the chart
+# renderer is bounded by a budget rather than by the row count.
+
+import numpy as np
+import pandas as pd
+
+
+def lttb(y: np.ndarray, n_out: int, x: np.ndarray = None) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+    :param y: Values of an ordered series.
+    :param n_out: Number of points to keep (including the first and last).
+    :param x: Optional x coordinates; defaults to positions 0..n-1.
+    :return: Sorted indices of the selected points.
+    """
+    n = len(y)
+    if n <= n_out:
+        return np.arange(n)
+    if n_out < 3:
+        return np.linspace(0, n - 1, max(n_out, 0)).astype(int)
+
+    y = np.asarray(y, dtype=float)
+    x = np.arange(n, dtype=float) if x is None else np.asarray(x, dtype=float)
+
+    # n_out - 2 buckets over the interior points; bucket averages are computed up front
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    sizes = np.diff(edges)
+    avg_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / sizes
+    avg_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / sizes
+
+    selected = np.empty(n_out, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    prev = 0
+    for i in range(n_out - 2):
+        start, stop = edges[i], edges[i + 1]
+        # The third vertex is the next bucket's average, or the last point for the final bucket
+        next_x, next_y = (avg_x[i + 1], avg_y[i + 1]) if i + 1 < n_out - 2 else (x[-1], y[-1])
+        area = np.abs((x[prev] - next_x) * (y[start:stop] - y[prev])
+                      - (x[prev] - x[start:stop]) * (next_y - y[prev]))
+        prev = start + int(np.argmax(area))
+        selected[i + 1] = prev
+    return selected
+
+
+def downsample_series(series: pd.Series, max_points: int) -> pd.Series:
+    """Keep at most max_points of an index-ordered series, preserving its visual shape with LTTB."""
+    series = series.dropna()
+    if len(series) <= max_points:
+        return series
+    return series.iloc[lttb(series.to_numpy(dtype=float), max_points)]
+
+
+def histogram(series: pd.Series, max_bins: int) -> pd.Series:
+    """Bin a numeric series with np.histogram; returns counts indexed by bin center."""
+    values = series.dropna().to_numpy(dtype=float)
+    if not values.size:
+        return pd.Series(dtype='int64', name=series.name)
+    edges = np.histogram_bin_edges(values, bins='auto')
+    if len(edges) - 1 > max_bins:
+        edges = np.histogram_bin_edges(values, bins=max_bins)
+    counts, edges = np.histogram(values, bins=edges)
+    centers = (edges[:-1] + edges[1:]) / 2
+    return pd.Series(counts, index=pd.Index(centers, name='bin'), name=series.name)
+
+
+def top_k_with_other(series: pd.Series, k: int, other_label: str = "Other") -> pd.Series:
+    """Value counts of the k most frequent values, with the rest folded into one `other_label` slice."""
+    counts = series.value_counts()
+    counts = counts[counts > 0]
+    if len(counts) > k:
+        other = counts.iloc[k:].sum()
+        counts = counts.iloc[:k]
+        counts.index = counts.index.astype(object)
+        counts = pd.concat([counts, pd.Series([other], index=[other_label])])
+    counts.name = series.name
+    return counts
@@ -0,0 +1,216 @@
+import hashlib
+import io
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from app import config
+from app.services.query_plan import QueryPlan
+from app.services.storage import open_storage
+from app.utils.file_handler import read_file
+
+_DATASET_ID = re.compile(r"[0-9a-f]{64}")
+
+
+class DatasetStore:
+    def __init__(self, max_bytes: int, spill_dir, write_through: bool = False):
+        """
+        Content-addressed store of parsed DataFrames.
+        :param max_bytes: Memory budget for the in-memory LRU, in bytes.
+        :param spill_dir: Directory, s3:// URL or storage evicted frames are written to as Parquet.
+        :param write_through: Write every new frame to spill_dir right away, so other worker
+                              processes and replicas sharing it can load the dataset by its id.
+        """
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.write_through = write_through
+        self._frames = OrderedDict()  # dataset_id -> (DataFrame, nbytes)
+        self._spilling = {}  # dataset_id -> DataFrame evicted but not yet written out
+        self._bytes = 0
+        # Guards the in-memory state only; storage is never read or written while it is held
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "disk_hits": 0, "evictions": 0, "spills": 0}
+
+    @staticmethod
+    def dataset_id(contents: bytes, file_name: str) -> str:
+        """Hash the raw upload; the extension is included since it decides how the bytes are parsed."""
+        digest = hashlib.sha256()
+        digest.update(os.path.splitext(file_name or "")[1].lower().encode())
+        digest.update(contents)
+        return digest.hexdigest()
+
+    @staticmethod
+    def dataset_id_of_file(file, file_name: str, block_size: int = 1024 ** 2) -> str:
+        """dataset_id() of a seekable file object, read in blocks and rewound afterwards."""
+        digest = hashlib.sha256()
+        digest.update(os.path.splitext(file_name or "")[1].lower().encode())
+        file.seek(0)
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+        file.seek(0)
+        return digest.hexdigest()
+
+    def add(self, contents: bytes, file_name: str) -> tuple[str, pd.DataFrame]:
+        """Parse an upload unless an identical one is already stored; return (dataset_id, DataFrame)."""
+        dataset_id = self.dataset_id(contents, file_name)
+        df = self._lookup(dataset_id)
+        if df is None:
+            df = read_file(io.BytesIO(contents), file_name)
+            self.put(dataset_id, df)
+        return dataset_id, df
+
+    def add_file(self, file, file_name: str, plan: QueryPlan = None, dataset_id: str = None) -> tuple[str, pd.DataFrame]:
+        """
+        Like add(), for a seekable file object such as a spooled upload, which is hashed in blocks
+        and parsed straight from the file instead of being buffered as bytes first.
+        :param plan: The columns and rows the caller needs. If the dataset is not stored yet, only
+                     those are read and the partial frame is not stored.
+        :param dataset_id: The file's dataset_id_of_file(), if already computed, so it is not hashed again.
+        """
+        if dataset_id is None:
+            dataset_id = self.dataset_id_of_file(file, file_name)
+        df = self._lookup(dataset_id)
+        if df is not None:
+            return dataset_id, df if plan is None else plan.apply(df)
+        if plan is not None and not plan.reads_everything:
+            return dataset_id, plan.read(file, file_name)
+        df = read_file(file, file_name)
+        self.put(dataset_id, df)
+        return dataset_id, df
+
+    @property
+    def storage(self):
+        return open_storage(self.spill_dir)
+
+    def put(self, dataset_id: str, df: pd.DataFrame):
+        nbytes = int(df.memory_usage(deep=True).sum())
+        with self._lock:
+            if dataset_id in self._frames:
+                return
+            self._frames[dataset_id] = (df, nbytes)
+            self._bytes += nbytes
+            evicted = self._evict()
+        # Outside the lock: other requests keep using the store while frames are written
+        self._write_evicted(evicted)
+        if self.write_through and self._spill_path(dataset_id) is None:
+            self._spill(dataset_id, df)
+
+    def get(self, dataset_id: str) -> pd.DataFrame:
+        """
+        Return the DataFrame for a dataset id.
+        Callers must treat the frame as read-only; it is shared between requests.
+        """
+        if not _DATASET_ID.fullmatch(dataset_id):
+            raise KeyError(dataset_id)
+        df = self._lookup(dataset_id)
+        if df is None:
+            raise KeyError(dataset_id)
+        return df
+
+    def persist(self, dataset_id: str):
+        """Make sure the dataset has a copy on disk, e.g. before background work that must survive a restart."""
+        df = self.get(dataset_id)
+        if self._spill_path(dataset_id) is None:
+            self._spill(dataset_id, df)
+
+    def __contains__(self, dataset_id: str) -> bool:
+        if not _DATASET_ID.fullmatch(dataset_id):
+            return False
+        with self._lock:
+            if dataset_id in self._frames or dataset_id in self._spilling:
+                return True
+        return self._spill_path(dataset_id) is not None
+
+    def clear(self):
+        """Drop the frames held in memory; spilled copies stay and are loaded again on use."""
+        with self._lock:
+            self._frames.clear()
+            self._bytes = 0
+
+    def info(self) -> dict:
+        with self._lock:
+            return {
+                **self.stats,
+                "entries": len(self._frames),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _lookup(self, dataset_id: str):
+        with self._lock:
+            entry = self._frames.get(dataset_id)
+            if entry is not None:
+                self._frames.move_to_end(dataset_id)
+                self.stats["hits"] += 1
+                return entry[0]
+            df = self._spilling.get(dataset_id)
+            if df is not None:
+                self.stats["hits"] += 1
+                return df
+
+        # A slow download or decode only holds up the request that needs the frame
+        path = self._spill_path(dataset_id)
+        if path is None:
+            with self._lock:
+                self.stats["misses"] += 1
+            return None
+        with self.storage.open(path) as f:
+            df = pd.read_parquet(f) if path.endswith(".parquet") else pd.read_pickle(f)
+        with self._lock:
+            self.stats["disk_hits"] += 1
+        self.put(dataset_id, df)
+        return df
+
+    def _evict(self) -> list:
+        """Remove frames over the budget, least recently used first, and return them for _write_evicted()."""
+        evicted = []
+        # Always keep the most recent frame, even if it alone exceeds the budget
+        while self._bytes > self.max_bytes and len(self._frames) > 1:
+            dataset_id, (df, nbytes) = self._frames.popitem(last=False)
+            self._bytes -= nbytes
+            self.stats["evictions"] += 1
+            # Still served from memory until its spilled copy exists
+            self._spilling[dataset_id] = df
+            evicted.append((dataset_id, df))
+        return evicted
+
+    def _write_evicted(self, evicted: list):
+        for dataset_id, df in evicted:
+            try:
+                if self._spill_path(dataset_id) is None:
+                    self._spill(dataset_id, df)
+            finally:
+                with self._lock:
+                    if self._spilling.get(dataset_id) is df:
+                        del self._spilling[dataset_id]
+
+    def _spill(self, dataset_id: str, df: pd.DataFrame):
+        # Written to a staging file and published in one step, so other workers never read a partial frame
+        key = f"{dataset_id}.parquet"
+        tmp_path = self.storage.staging_path(key)
+        try:
+            df.to_parquet(tmp_path)
+        except (TypeError, ValueError, NotImplementedError, ImportError):
+            # Mixed-type object columns cannot be written as Parquet
+            key = f"{dataset_id}.pkl"
+            df.to_pickle(tmp_path)
+        except BaseException:
+            self.storage.discard(tmp_path)
+            raise
+        self.storage.commit(tmp_path, key)
+        with self._lock:
+            self.stats["spills"] += 1
+
+    def _spill_path(self, dataset_id: str):
+        """Storage key of the dataset's spilled copy, or None."""
+        for ext in (".parquet", ".pkl"):
+            key = f"{dataset_id}{ext}"
+            if self.storage.size(key) is not None:
+                return key
+        return None
+
+
+dataset_store = DatasetStore(config.DATASET_CACHE_BYTES, config.DATASET_SPILL_DIR, config.DATASET_WRITE_THROUGH)
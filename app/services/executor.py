@@ -0,0 +1,177 @@
+import asyncio
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.shared_memory import SharedMemory
+
+import pandas as pd
+import pyarrow as pa
+from fastapi import HTTPException
+
+from app import config
+from app.utils.metrics import collect, replay
+from app.utils.profiler import current_session, in_session, profile_call, sampler
+
+
+class SharedFrame:
+    def __init__(self, df: pd.DataFrame):
+        """
+        Write a DataFrame as an Arrow IPC stream into a shared memory block.
+        Workers attach to the block by name, so the frame never goes through the pickle pipe.
+        """
+        table = pa.Table.from_pandas(df, preserve_index=True)
+        mock = pa.MockOutputStream()
+        _write_table(mock, table)
+        self.size = mock.size()
+
+        self.shm = SharedMemory(create=True, size=max(self.size, 1))
+        sink = pa.FixedSizeBufferWriter(pa.py_buffer(self.shm.buf))
+        _write_table(sink, table)
+        sink.close()
+        del sink
+
+    @property
+    def handle(self):
+        return self.shm.name, self.size
+
+    def release(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+def _write_table(sink, table: pa.Table):
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+
+
+def _attach_frame(handle) -> pd.DataFrame:
+    name, size = handle
+    shm = SharedMemory(name=name)
+    try:
+        # One memcpy out of the block; pandas may keep views into the Arrow buffers, which
+        # would otherwise pin the mapping until the task finishes
+        data = bytes(shm.buf[:size])
+    finally:
+        shm.close()
+    return pa.ipc.open_stream(pa.py_buffer(data)).read_all().to_pandas()
+
+
+def _run_shared(task, handle, args, profiled=False):
+    # Metrics recorded in the worker process, and its stack samples when the request is being
+    # profiled, are sent back with the result
+    df = _attach_frame(handle)
+    if profiled:
+        return profile_call(collect, task, df, *args)
+    return collect(task, df, *args), None
+
+
+def _run_local(task, data, args, session):
+    with sampler.attached(session):
+        return collect(task, data, *args), None
+
+
+class ComputeExecutor:
+    def __init__(self, mode: str, max_workers: int, queue_size: int, timeout: float):
+        """
+        Runs CPU-bound tasks away from the event loop.
+        :param mode: "process" for a process pool (falls back to threads if unavailable) or "thread".
+        :param max_workers: Number of worker processes or threads.
+        :param queue_size: Jobs allowed to wait for a worker before new ones are rejected with 429.
+        :param timeout: Default per-job timeout in seconds.
+        """
+        self.mode = mode
+        self.max_workers = max_workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.pending = 0
+        self._pool = None
+        self._threads = None
+
+    def _process_pool(self):
+        if self._pool is None and self.mode == "process":
+            try:
+                context = multiprocessing.get_context(config.COMPUTE_START_METHOD)
+                self._pool = ProcessPoolExecutor(self.max_workers, mp_context=context)
+            except (OSError, NotImplementedError, ImportError, ValueError):
+                # No working semaphores or shared memory on this platform
+                self.mode = "thread"
+        return self._pool
+
+    def _thread_pool(self):
+        if self._threads is None:
+            self._threads = ThreadPoolExecutor(self.max_workers, thread_name_prefix="compute")
+        return self._threads
+
+    async def run(self, task, data, *args, timeout: float = None):
+        """
+        Run task(data, *args) on a worker and return its result.
+        DataFrames go to worker processes through shared memory; other inputs (such as streamed
+        chunk iterators) cannot leave the process and run on the thread pool instead.
+        """
+        if self.pending >= self.max_workers + self.queue_size:
+            raise HTTPException(status_code=429, detail="Compute queue is full, retry later.",
+                                headers={"Retry-After": "1"})
+        self.pending += 1
+        shared = future = None
+        try:
+            pool = self._process_pool()
+            if pool is not None and isinstance(data, pd.DataFrame):
+                try:
+                    shared = await asyncio.to_thread(in_session, SharedFrame, data)
+                except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+                    # Mixed-type object columns have no Arrow representation
+                    shared = None
+            session = current_session()
+            if shared is not None:
+                future = pool.submit(_run_shared, task, shared.handle, args, session is not None)
+            else:
+                # Threads are sampled by this process's own profiler
+                future = self._thread_pool().submit(_run_local, task, data, args, session)
+            # The slot and the shared block are held until the job itself ends, not this request
+            future.add_done_callback(functools.partial(self._job_done, asyncio.get_running_loop(), shared))
+            (result, observations), stacks = await asyncio.wait_for(asyncio.wrap_future(future),
+                                                                    timeout or self.timeout)
+            # Replayed here so they also reach the timing breakdown of the request being served
+            replay(observations)
+            if stacks and session is not None:
+                session.merge(stacks, prefix=f"compute-worker:{task.__name__}")
+            return result
+        except asyncio.TimeoutError:
+            # Only a job still waiting for a worker can be cancelled; a running one finishes first
+            future.cancel()
+            raise HTTPException(status_code=504, detail="Computation timed out.")
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); start a fresh pool for the next job
+            self._pool = None
+            raise HTTPException(status_code=503, detail="Compute worker crashed, retry later.")
+        finally:
+            if future is None:
+                self._release(shared)
+
+    def _job_done(self, loop, shared, future):
+        # Called from the pool's thread, or right away if the job was cancelled before it started
+        try:
+            loop.call_soon_threadsafe(self._release, shared)
+        except RuntimeError:
+            # The event loop has closed meanwhile
+            self._release(shared)
+
+    def _release(self, shared):
+        self.pending -= 1
+        if shared is not None:
+            shared.release()
+
+    def info(self) -> dict:
+        return {"mode": self.mode, "workers": self.max_workers, "pending": self.pending,
+                "queue_size": self.queue_size}
+
+    def shutdown(self):
+        for pool in (self._pool, self._threads):
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = self._threads = None
+
+
+compute = ComputeExecutor(config.COMPUTE_EXECUTOR, config.COMPUTE_WORKERS, config.COMPUTE_QUEUE_SIZE,
+                          config.COMPUTE_TIMEOUT)
@@ -0,0 +1,80 @@
+import numpy as np
+
+
+class IncrementalLinearRegression:
+    def __init__(self):
+        """
+        Ordinary least squares fitted from streamed chunks.
+        Keeps only the row count, the means and the centred cross-product matrices, so memory
+        is O(features^2) whatever the number of rows, and new rows can be added to an existing
+        fit with partial_fit. States fitted on separate shards combine with merge().
+        """
+        self.n = 0
+        self.mean_x = None
+        self.mean_y = 0.0
+        self.sxx = None  # sum of (x - mean_x)(x - mean_x)^T
+        self.sxy = None  # sum of (x - mean_x)(y - mean_y)
+        self.syy = 0.0
+
+    def partial_fit(self, X, y):
+        X = np.asarray(X, dtype=float)
+        y = np.asarray(y, dtype=float)
+        if X.ndim == 1:
+            X = X.reshape(-1, 1)
+        if not len(X):
+            return self
+        mean_x = X.mean(axis=0)
+        mean_y = y.mean()
+        Xc = X - mean_x
+        yc = y - mean_y
+        self._combine(len(X), mean_x, mean_y, Xc.T @ Xc, Xc.T @ yc, float(yc @ yc))
+        return self
+
+    def merge(self, other: "IncrementalLinearRegression"):
+        if other.n:
+            self._combine(other.n, other.mean_x, other.mean_y, other.sxx, other.sxy, other.syy)
+        return self
+
+    def _combine(self, n_b, mean_x, mean_y, sxx, sxy, syy):
+        # Chan et al. pairwise update of the means and centred cross-products
+        if not self.n:
+            self.n, self.mean_x, self.mean_y = n_b, mean_x.copy(), mean_y
+            self.sxx, self.sxy, self.syy = sxx.copy(), sxy.copy(), syy
+            return
+        if len(mean_x) != len(self.mean_x):
+            raise ValueError("Chunks must have the same feature columns.")
+        n_a = self.n
+        n = n_a + n_b
+        dx = mean_x - self.mean_x
+        dy = mean_y - self.mean_y
+        weight = n_a * n_b / n
+        self.sxx = self.sxx + sxx + np.outer(dx, dx) * weight
+        self.sxy = self.sxy + sxy + dx * dy * weight
+        self.syy = self.syy + syy + dy * dy * weight
+        self.mean_x = self.mean_x + dx * n_b / n
+        self.mean_y = self.mean_y + dy * n_b / n
+        self.n = n
+
+    @property
+    def coef_(self) -> np.ndarray:
+        if not self.n:
+            raise ValueError("No rows have been fitted.")
+        # Least squares on the normal equations; lstsq also handles collinear features
+        return np.linalg.lstsq(self.sxx, self.sxy, rcond=None)[0]
+
+    @property
+    def intercept_(self) -> float:
+        return float(self.mean_y - self.mean_x @ self.coef_)
+
+    def r_squared(self) -> float:
+        """In-sample R-squared over every row fitted so far."""
+        if not self.syy:
+            return 1.0
+        residual = self.syy - self.coef_ @ self.sxy
+        return float(1 - residual / self.syy)
+
+    def predict(self, X) -> np.ndarray:
+        X = np.asarray(X, dtype=float)
+        if X.ndim == 1:
+            X = X.reshape(-1, 1)
+        return X @ self.coef_ + self.intercept_
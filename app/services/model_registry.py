@@ -0,0 +1,189 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from app import config
+
+_MODEL_ID = re.compile(r"[0-9a-f]{64}")
+
+
+def model_key(dataset_id: str, algorithm: str, features, target: str, params: dict = None) -> str:
+    """Model id: a hash of everything that determines the fitted model."""
+    spec = {
+        "dataset_id": dataset_id,
+        "algorithm": algorithm,
+        "features": list(features),
+        "target": target,
+        "params": params or {},
+    }
+    return hashlib.sha256(json.dumps(spec, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class FittedModel:
+    def __init__(self, algorithm: str, estimator, features: list, target: str, params: dict = None,
+                 columns: list = None, encoders: dict = None, metrics: dict = None):
+        """
+        A fitted estimator together with what is needed to score new rows the same way.
+        :param features: Input columns, as given by the client.
+        :param columns: Model input columns after encoding (dummy columns for tree models).
+        :param encoders: Column -> classes seen in training, for label-encoded columns.
+        :param metrics: Results reported when the model was fitted (R-squared, coefficients, ...).
+        """
+        self.algorithm = algorithm
+        self.estimator = estimator
+        self.features = list(features)
+        self.target = target
+        self.params = params or {}
+        self.columns = list(columns) if columns is not None else list(features)
+        self.encoders = encoders or {}
+        self.metrics = metrics or {}
+
+    def transform(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Encode new rows like the training data; raises ValueError for missing columns or unseen labels."""
+        missing = [col for col in self.features if col not in df.columns]
+        if missing:
+            raise ValueError(f"Missing feature columns: {', '.join(map(str, missing))}")
+        X = df[self.features]
+        if self.encoders:
+            X = X.copy()
+            for col, classes in self.encoders.items():
+                codes = pd.Index(classes).get_indexer(X[col])
+                if (codes < 0).any():
+                    raise ValueError(f"Column {col} has values not seen in training.")
+                X[col] = codes
+        if self.columns != self.features:
+            # Dummy columns absent from the new rows are all zero; unseen categories are dropped
+            X = pd.get_dummies(X).reindex(columns=self.columns, fill_value=0)
+        return X
+
+    def predict(self, df: pd.DataFrame) -> np.ndarray:
+        X = self.transform(df)
+        # Pass column names only to estimators that were fitted with them
+        return self.estimator.predict(X if hasattr(self.estimator, "feature_names_in_") else X.to_numpy())
+
+    def info(self) -> dict:
+        return {"algorithm": self.algorithm, "features": self.features, "target": self.target,
+                "params": self.params, **self.metrics}
+
+
+class ModelRegistry:
+    def __init__(self, store_dir: str, max_entries: int, memory_entries: int):
+        """
+        Fitted models keyed by model_key(), stored on disk with joblib.
+        :param max_entries: Models kept on disk; the least recently used are deleted beyond this.
+        :param memory_entries: Models also kept loaded in memory.
+        """
+        self.store_dir = store_dir
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self._models = OrderedDict()  # model_id -> FittedModel, most recently used last
+        self._stored = None  # model ids on disk, least recently used first; read from disk on first use
+        # Guards the in-memory state only; models are never loaded, dumped or deleted while it is held
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "disk_hits": 0, "evictions": 0}
+
+    def get(self, model_id: str) -> FittedModel:
+        """Return a stored model, or None."""
+        if not _MODEL_ID.fullmatch(model_id):
+            return None
+        with self._lock:
+            model = self._models.get(model_id)
+            if model is not None:
+                self._models.move_to_end(model_id)
+                self.stats["hits"] += 1
+                self._used(model_id)
+        if model is not None:
+            self._touch(model_id)
+            return model
+
+        try:
+            model = joblib.load(self._path(model_id))
+        except FileNotFoundError:
+            with self._lock:
+                self.stats["misses"] += 1
+            return None
+        with self._lock:
+            self.stats["disk_hits"] += 1
+            self._used(model_id)
+            self._remember(model_id, model)
+        self._touch(model_id)
+        return model
+
+    def put(self, model_id: str, model: FittedModel):
+        os.makedirs(self.store_dir, exist_ok=True)
+        path = self._path(model_id)
+        # Unique per writer, so workers storing the same model at once do not share a temporary file
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        joblib.dump(model, tmp_path)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._used(model_id)
+            self._remember(model_id, model)
+            evicted = self._evict_disk()
+        self._touch(model_id)
+        for evicted_id in evicted:
+            try:
+                os.remove(self._path(evicted_id))
+            except FileNotFoundError:
+                pass
+
+    def __contains__(self, model_id: str) -> bool:
+        if not _MODEL_ID.fullmatch(model_id):
+            return False
+        with self._lock:
+            if model_id in self._models:
+                return True
+        return os.path.exists(self._path(model_id))
+
+    def info(self) -> dict:
+        with self._lock:
+            return {**self.stats, "loaded": len(self._models), "stored": len(self._stored_ids())}
+
+    def _remember(self, model_id: str, model: FittedModel):
+        self._models[model_id] = model
+        self._models.move_to_end(model_id)
+        while len(self._models) > self.memory_entries:
+            self._models.popitem(last=False)
+
+    def _used(self, model_id: str):
+        self._stored_ids()[model_id] = None
+        self._stored.move_to_end(model_id)
+
+    def _touch(self, model_id: str):
+        # The file's mtime records last use, so the eviction order survives restarts
+        try:
+            os.utime(self._path(model_id))
+        except OSError:
+            pass
+
+    def _stored_ids(self) -> OrderedDict:
+        if self._stored is None:
+            names = os.listdir(self.store_dir) if os.path.isdir(self.store_dir) else []
+            paths = sorted((os.path.join(self.store_dir, name) for name in names if name.endswith(".joblib")),
+                           key=os.path.getmtime)
+            self._stored = OrderedDict((os.path.basename(path)[:-len(".joblib")], None) for path in paths)
+        return self._stored
+
+    def _evict_disk(self) -> list:
+        """Forget the least recently used models beyond max_entries; returns their ids, for the caller to delete."""
+        stored = self._stored_ids()
+        evicted = []
+        while len(stored) > self.max_entries:
+            model_id, _ = stored.popitem(last=False)
+            self._models.pop(model_id, None)
+            evicted.append(model_id)
+            self.stats["evictions"] += 1
+        return evicted
+
+    def _path(self, model_id: str) -> str:
+        return os.path.join(self.store_dir, f"{model_id}.joblib")
+
+
+model_registry = ModelRegistry(config.MODEL_DIR, config.MODEL_STORE_ENTRIES, config.MODEL_CACHE_ENTRIES)
@@ -0,0 +1,151 @@
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from app import config
+from app.services.accumulators import ColumnStatsAccumulator
+from app.utils.metrics import count_rows, timed
+
+NUMERIC, CATEGORICAL, OTHER = "numeric", "categorical", "other"
+
+# Quantiles reported for numeric columns, labelled as DataFrame.describe() labels them
+QUANTILES = {"25%": 0.25, "50%": 0.5, "75%": 0.75}
+
+
+def _scalar(value):
+    # Plain Python values, with NaN as None, so profiles serialize to JSON and pickle cheaply
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+class ProfileBuilder:
+    def __init__(self, exact: bool = True, error: float = None, top_k: int = None, max_bins: int = None):
+        """
+        Per-column profile accumulated chunk by chunk: dtype, count, nulls, moments, quantiles,
+        histogram bins for numeric columns and top-K values for categorical ones.
+        :param exact: Exact quantiles and histograms; otherwise both come from KLL sketches.
+        :param error: Rank error bound for the sketches when exact is False.
+        :param top_k: Most frequent values kept per categorical column (defaults to config.PROFILE_TOP_K).
+        :param max_bins: Upper bound on histogram bins (defaults to config.PROFILE_HISTOGRAM_BINS).
+        """
+        self.top_k = top_k or config.PROFILE_TOP_K
+        self.max_bins = max_bins or config.PROFILE_HISTOGRAM_BINS
+        self.stats = ColumnStatsAccumulator(exact=exact, error=error)
+        self.rows = 0
+        self.dtypes = {}
+        self.nulls = {}
+        self.value_counts = {}
+
+    def update(self, df: pd.DataFrame):
+        with timed("profile"):
+            self._update(df)
+        count_rows("profile", len(df))
+
+    def _update(self, df: pd.DataFrame):
+        self.rows += len(df)
+        for col in df.columns:
+            self.dtypes.setdefault(col, df[col].dtype)
+        # Numeric columns go through the accumulator in one vectorized pass over the block
+        self.stats.update(df)
+        nulls = df.isna().sum()
+        for col, count in nulls.items():
+            self.nulls[col] = self.nulls.get(col, 0) + int(count)
+        for col in df.select_dtypes(include=['object', 'category', 'bool']).columns:
+            counts = df[col].value_counts()
+            previous = self.value_counts.get(col)
+            self.value_counts[col] = counts if previous is None else previous.add(counts, fill_value=0)
+
+    def profile(self) -> dict:
+        summary = self.stats.summary()
+        columns = {}
+        for col, dtype in self.dtypes.items():
+            entry = {"dtype": str(dtype), "count": self.rows - self.nulls[col], "nulls": self.nulls[col]}
+            if col in self.stats.dtypes:
+                entry["kind"] = NUMERIC
+                entry.update({stat: _scalar(summary[stat][col]) for stat in ("mean", "std_dev", "min", "max")})
+                quantiles = self.stats.quantile(col, list(QUANTILES.values()))
+                entry["quantiles"] = {label: _scalar(q) for label, q in zip(QUANTILES, quantiles)}
+                counts, edges = self.stats.histogram(col, self.max_bins)
+                entry["histogram"] = {"edges": edges.tolist(), "counts": counts.tolist()}
+            elif col in self.value_counts:
+                counts = self.value_counts[col]
+                counts = counts[counts > 0].astype('int64')
+                try:
+                    # Break ties by value, so chunked and whole-frame profiles list the same top-K
+                    counts = counts.sort_index()
+                except TypeError:
+                    pass
+                counts = counts.sort_values(ascending=False, kind='stable')
+                entry["kind"] = CATEGORICAL
+                entry["unique"] = len(counts)
+                entry["top"] = [{"value": _scalar(value), "count": int(count)}
+                                for value, count in counts.iloc[:self.top_k].items()]
+                entry["other"] = int(counts.iloc[self.top_k:].sum())
+            else:
+                entry["kind"] = OTHER
+            columns[str(col)] = entry
+        return {"rows": self.rows, "columns": columns}
+
+
+def build_profile(data, exact: bool = True, error: float = None) -> dict:
+    """
+    Profile a DataFrame, or an iterator of DataFrame chunks, in a single pass.
+    :return: {"rows": n, "columns": {name: column profile}}, with NaN statistics as None.
+    """
+    builder = ProfileBuilder(exact=exact, error=error)
+    for chunk in [data] if isinstance(data, pd.DataFrame) else data:
+        builder.update(chunk)
+    return builder.profile()
+
+
+class ProfileCache:
+    def __init__(self, max_entries: int):
+        """
+        LRU of computed profiles keyed by dataset id and profile options.
+        Dataset ids are content hashes, so a cached profile never goes stale.
+        """
+        self.max_entries = max_entries
+        self._profiles = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, dataset_id: str, exact: bool = True):
+        with self._lock:
+            profile = self._profiles.get((dataset_id, exact))
+            if profile is None:
+                self.stats["misses"] += 1
+                return None
+            self._profiles.move_to_end((dataset_id, exact))
+            self.stats["hits"] += 1
+            return profile
+
+    def put(self, dataset_id: str, profile: dict, exact: bool = True):
+        with self._lock:
+            self._profiles[(dataset_id, exact)] = profile
+            self._profiles.move_to_end((dataset_id, exact))
+            while len(self._profiles) > self.max_entries:
+                self._profiles.popitem(last=False)
+
+    def get_or_build(self, dataset_id: str, df: pd.DataFrame, exact: bool = True) -> dict:
+        profile = self.get(dataset_id, exact)
+        if profile is None:
+            profile = build_profile(df, exact=exact)
+            self.put(dataset_id, profile, exact)
+        return profile
+
+    def clear(self):
+        with self._lock:
+            self._profiles.clear()
+
+    def info(self) -> dict:
+        with self._lock:
+            return {"profiles": len(self._profiles), **self.stats}
+
+
+profile_cache = ProfileCache(config.PROFILE_CACHE_ENTRIES)
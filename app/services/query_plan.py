@@ -0,0 +1,77 @@
+import re
+from typing import NamedTuple
+
+import pandas as pd
+
+from app.utils.file_handler import filter_rows, read_file, read_file_chunks
+
+# column op value, e.g. "age>=18" or 'city=="Paris"'; quoted values always compare as text
+_CONDITION = re.compile(r"\s*(.+?)\s*(==|!=|<=|>=|<|>|=)\s*(.+?)\s*")
+
+
+def _parse_value(text: str):
+    if len(text) >= 2 and text[0] == text[-1] and text[0] in "'\"":
+        return text[1:-1]
+    for parse in (int, float):
+        try:
+            return parse(text)
+        except ValueError:
+            pass
+    return text
+
+
+def parse_filters(where: str) -> tuple:
+    """
+    Parse a comma-separated list of conditions, all of which must hold, into (column, op, value) filters.
+    Raises ValueError for a condition without a comparison operator.
+    """
+    filters = []
+    for condition in (where or "").split(","):
+        if not condition.strip():
+            continue
+        match = _CONDITION.fullmatch(condition)
+        if match is None:
+            raise ValueError(f"Invalid filter: {condition.strip()}")
+        column, op, value = match.groups()
+        filters.append((column, "==" if op == "=" else op, _parse_value(value)))
+    return tuple(filters)
+
+
+class QueryPlan(NamedTuple):
+    """
+    The part of a dataset a request needs: which columns, which rows and what types.
+    Readers use it to skip columns and rows while parsing; stored datasets are cut down in memory.
+    """
+    columns: list = None  # None reads every column
+    filters: tuple = ()  # (column, op, value) tuples, ANDed
+    dtypes: dict = None  # dtype hints for text formats
+
+    @property
+    def reads_everything(self) -> bool:
+        return self.columns is None and not self.filters and not self.dtypes
+
+    def read(self, file, file_name: str) -> pd.DataFrame:
+        return read_file(file, file_name, columns=self.columns, filters=self.filters, dtypes=self.dtypes)
+
+    def read_chunks(self, file, file_name: str):
+        return read_file_chunks(file, file_name, columns=self.columns, filters=self.filters, dtypes=self.dtypes)
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        """The planned rows and columns of an already loaded frame."""
+        df = filter_rows(df, self.filters)
+        return df if self.columns is None else df[[col for col in df.columns if col in self.columns]]
+
+    def params(self) -> dict:
+        """Model parameters identifying the rows used, so filtered fits get their own model ids."""
+        return {"where": [list(f) for f in self.filters]} if self.filters else {}
+
+
+def plan_query(columns: list = None, where: str = None, dtypes: dict = None) -> QueryPlan:
+    """
+    Plan the read for a request from the columns it uses and its `where` parameter.
+    :param columns: Columns the request uses; None when it needs all of them.
+    :param where: Row conditions such as "age>=18,city==Paris"; ValueError if malformed.
+    """
+    if columns is not None:
+        columns = list(dict.fromkeys(columns))
+    return QueryPlan(columns, parse_filters(where), dtypes)
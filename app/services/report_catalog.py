@@ -0,0 +1,226 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing, contextmanager
+from datetime import datetime, timedelta
+
+from app import config
+from app.services.storage import file_etag, open_storage  # noqa: F401 (file_etag is re-exported)
+
+SORT_COLUMNS = ("created_at", "bytes", "rows", "report_id")
+
+
+class ReportCatalog:
+    def __init__(self, db_path: str, reports_dir=None, max_age_days: float = 0, max_bytes: int = 0,
+                 sync_seconds: float = 0):
+        """
+        SQLite index of the stored PDF reports, written when a report is created, so listing does
+        not scan the report storage. PDFs already stored are indexed once, on first use.
+        :param reports_dir: Directory, s3:// URL or storage holding the PDFs (defaults to
+                            config.REPORTS_DIR at the time of use).
+        :param max_age_days: Reports older than this are deleted (0 keeps them).
+        :param max_bytes: Oldest reports are deleted while the total size exceeds this (0 = no quota).
+        :param sync_seconds: Index reports stored by other replicas when listing, at most this often (0 = never).
+        """
+        self.db_path = db_path
+        self._reports_dir = reports_dir
+        self.max_age_days = max_age_days
+        self.max_bytes = max_bytes
+        self.sync_seconds = sync_seconds
+        self._synced = time.monotonic()
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    @contextmanager
+    def _connect(self):
+        if not self._initialized:
+            self._init_db()
+        db = sqlite3.connect(self.db_path, timeout=30)
+        db.row_factory = sqlite3.Row
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def _init_db(self):
+        with self._lock:
+            if self._initialized:
+                return
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            with closing(sqlite3.connect(self.db_path, timeout=30)) as db, db:
+                db.execute("PRAGMA journal_mode=WAL")
+                exists = db.execute("SELECT 1 FROM sqlite_master WHERE name = 'reports'").fetchone()
+                db.execute("""
+                    CREATE TABLE IF NOT EXISTS reports (
+                        report_id TEXT PRIMARY KEY,
+                        dataset_id TEXT,
+                        bytes INTEGER NOT NULL,
+                        rows INTEGER,
+                        columns TEXT,
+                        chart_backend TEXT,
+                        etag TEXT,
+                        created_at TEXT NOT NULL
+                    )
+                """)
+                db.execute("CREATE INDEX IF NOT EXISTS reports_created_at ON reports (created_at)")
+                db.execute("CREATE INDEX IF NOT EXISTS reports_dataset_id ON reports (dataset_id, created_at)")
+                if not exists:
+                    self._index_existing(db)
+            self._initialized = True
+
+    def _index_existing(self, db):
+        # Reports written before the catalog existed, or by another replica; their ETags are
+        # computed on first download
+        rows = [(key, size, datetime.fromtimestamp(modified).isoformat())
+                for key, size, modified in self.storage.list() if key.endswith(".pdf")]
+        db.executemany("INSERT OR IGNORE INTO reports (report_id, bytes, created_at) VALUES (?, ?, ?)", rows)
+
+    def sync(self):
+        """Index reports in the storage that this catalog has not seen."""
+        with self._connect() as db:
+            self._index_existing(db)
+        self._synced = time.monotonic()
+
+    @property
+    def reports_dir(self):
+        return self._reports_dir or config.REPORTS_DIR
+
+    @property
+    def storage(self):
+        return open_storage(self.reports_dir)
+
+    def path(self, report_id: str):
+        """Local path of the report's PDF; None for remote storage."""
+        return self.storage.local_path(report_id)
+
+    def staging_path(self, report_id: str) -> str:
+        """Local path to write a new report to before publish()."""
+        return self.storage.staging_path(report_id)
+
+    def publish(self, staging_path: str, report_id: str, dataset_id: str = None, columns=None, rows: int = None,
+                chart_backend: str = None) -> dict:
+        """Store a report written to staging_path() atomically, so no reader sees a partial PDF, and index it."""
+        self.storage.commit(staging_path, report_id)
+        return self.add(report_id, dataset_id, columns, rows, chart_backend)
+
+    def discard(self, staging_path: str):
+        self.storage.discard(staging_path)
+
+    def add(self, report_id: str, dataset_id: str = None, columns=None, rows: int = None,
+            chart_backend: str = None) -> dict:
+        """Index a report just written to the report storage, then apply retention."""
+        entry = {
+            "report_id": report_id,
+            "dataset_id": dataset_id,
+            "bytes": self.storage.size(report_id),
+            "rows": rows,
+            "columns": json.dumps([str(col) for col in columns]) if columns is not None else None,
+            "chart_backend": chart_backend,
+            "etag": self.storage.etag(report_id),
+            "created_at": datetime.now().isoformat(),
+        }
+        with self._connect() as db:
+            db.execute(f"INSERT OR REPLACE INTO reports ({', '.join(entry)}) VALUES ({', '.join('?' * len(entry))})",
+                       tuple(entry.values()))
+        self.evict(keep=report_id)
+        return self._entry(entry)
+
+    def get(self, report_id: str):
+        """
+        The report's catalog entry, with its ETag filled in if missing; None if unknown.
+        Reports in the storage but not yet in the catalog (stored by another replica) are indexed first.
+        """
+        with self._connect() as db:
+            row = db.execute("SELECT * FROM reports WHERE report_id = ?", (report_id,)).fetchone()
+        if row is None:
+            size = self.storage.size(report_id) if report_id.endswith(".pdf") else None
+            if size is None:
+                return None
+            with self._connect() as db:
+                db.execute("INSERT OR IGNORE INTO reports (report_id, bytes, created_at) VALUES (?, ?, ?)",
+                           (report_id, size, datetime.now().isoformat()))
+                row = db.execute("SELECT * FROM reports WHERE report_id = ?", (report_id,)).fetchone()
+        entry = dict(row)
+        if entry["etag"] is None and self.storage.size(report_id) is not None:
+            entry["etag"] = self.storage.etag(report_id)
+            with self._connect() as db:
+                db.execute("UPDATE reports SET etag = ? WHERE report_id = ?", (entry["etag"], report_id))
+        return self._entry(entry)
+
+    def list(self, offset: int = 0, limit: int = None, dataset_id: str = None, created_after: str = None,
+             created_before: str = None, sort: str = "created_at", descending: bool = True) -> tuple[int, list]:
+        """
+        One page of reports matching the filters, and the number of matching reports.
+        :param created_after: ISO timestamp or date; only reports created at or after it.
+        :param sort: One of SORT_COLUMNS; ValueError otherwise.
+        """
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f"Cannot sort by {sort}; use one of {', '.join(SORT_COLUMNS)}.")
+        if self.sync_seconds and time.monotonic() - self._synced >= self.sync_seconds:
+            self.sync()
+        limit = min(limit or config.REPORTS_PAGE_SIZE, config.REPORTS_MAX_PAGE_SIZE)
+        conditions, params = [], []
+        for condition, value in (("dataset_id = ?", dataset_id), ("created_at >= ?", created_after),
+                                 ("created_at < ?", created_before)):
+            if value is not None:
+                conditions.append(condition)
+                params.append(value)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        # report_id breaks ties so pages never overlap
+        order = f"{sort} {'DESC' if descending else 'ASC'}, report_id"
+        with self._connect() as db:
+            total = db.execute(f"SELECT COUNT(*) FROM reports {where}", params).fetchone()[0]
+            rows = db.execute(f"SELECT * FROM reports {where} ORDER BY {order} LIMIT ? OFFSET ?",
+                              (*params, limit, offset)).fetchall()
+        return total, [self._entry(dict(row)) for row in rows]
+
+    def remove(self, report_id: str):
+        """Delete a report's PDF and catalog entry."""
+        self.storage.delete(report_id)
+        with self._connect() as db:
+            db.execute("DELETE FROM reports WHERE report_id = ?", (report_id,))
+
+    def evict(self, keep: str = None) -> list:
+        """Delete reports past the age limit, then the oldest while over the size quota; returns their ids."""
+        evicted = []
+        if self.max_age_days:
+            cutoff = (datetime.now() - timedelta(days=self.max_age_days)).isoformat()
+            with self._connect() as db:
+                evicted += [row[0] for row in db.execute(
+                    "SELECT report_id FROM reports WHERE created_at < ? AND report_id IS NOT ?", (cutoff, keep))]
+            for report_id in evicted:
+                self.remove(report_id)
+        if self.max_bytes:
+            over_quota = []
+            with self._connect() as db:
+                excess = db.execute("SELECT COALESCE(SUM(bytes), 0) FROM reports").fetchone()[0] - self.max_bytes
+                if excess > 0:
+                    # Walk the oldest reports only as far as needed to get back under the quota
+                    for report_id, size in db.execute("SELECT report_id, bytes FROM reports WHERE report_id IS NOT ? "
+                                                      "ORDER BY created_at, report_id", (keep,)):
+                        if excess <= 0:
+                            break
+                        over_quota.append(report_id)
+                        excess -= size
+            for report_id in over_quota:
+                self.remove(report_id)
+            evicted += over_quota
+        return evicted
+
+    def info(self) -> dict:
+        with self._connect() as db:
+            count, size = db.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM reports").fetchone()
+        return {"reports": count, "bytes": size}
+
+    @staticmethod
+    def _entry(entry: dict) -> dict:
+        if entry.get("columns") is not None:
+            entry["columns"] = json.loads(entry["columns"])
+        return entry
+
+
+report_catalog = ReportCatalog(config.REPORT_CATALOG_DB, max_age_days=config.REPORTS_MAX_AGE_DAYS,
+                               max_bytes=config.REPORTS_MAX_BYTES, sync_seconds=config.REPORT_CATALOG_SYNC_SECONDS)
@@ -1,88 +1,170 @@
+import numpy as np
 import pandas as pd
-import plotly.express as px
 from reportlab.lib.pagesizes import letter
+from reportlab.lib.utils import ImageReader
 from reportlab.pdfgen import canvas
-from PIL import Image
-import os
+import io
+from app import config
+from app.services.chart_renderer import get_renderer
+from app.services.data_reduction import downsample_series, histogram
+from app.services.profiling import CATEGORICAL, NUMERIC, build_profile
+from app.utils.metrics import timed
+
+# Width of charts on the page, in points; the height follows the image's aspect ratio
+IMAGE_WIDTH = 400
 
 class ReportGenerator:
-    def __init__(self, dataframe: pd.DataFrame):
+    def __init__(self, dataframe: pd.DataFrame, chart_backend: str = None, max_points: int = None,
+                 numeric_chart: str = None, profile: dict = None):
+        # An iterator of DataFrame chunks is also accepted, for generate_summary only
         self.df = dataframe
+        # "plotly" or "matplotlib"; defaults to config.CHART_BACKEND
+        self.chart_backend = chart_backend
+        # Upper bound on the points (bars, slices) per chart, whatever the row count
+        self.max_points = max_points or config.CHART_MAX_POINTS
+        # "series" plots values by row (downsampled with LTTB), "histogram" plots binned counts
+        self.numeric_chart = numeric_chart or config.CHART_NUMERIC_STYLE
+        # Column profile shared with the descriptive statistics; built on first use if not given
+        self._profile = profile
+
+    @property
+    def profile(self) -> dict:
+        if self._profile is None:
+            self._profile = build_profile(self.df)
+        return self._profile
+
+    def _columns(self, kind):
+        return [col for col, entry in self.profile["columns"].items() if entry["kind"] == kind]
+
+    def generate_visualizations(self, progress=None):
+        """
+        Render one chart per column in memory; returns {column name: ChartImage}.
+        :param progress: Optional callback called as progress(charts_done, charts_total).
+        """
+        columns = self.profile["columns"]
+        # Profile keys are column names as strings
+        frame_columns = {str(col): col for col in self.df.columns}
 
-    def generate_visualizations(self):
-        numeric_columns = self.df.select_dtypes(include=['float64', 'int64']).columns
-        categorical_columns = self.df.select_dtypes(include=['object']).columns
-        figures = {}
+        # Bar charts for numeric columns, pie charts for categorical columns, reduced to the point budget
+        charts = []
+        for col in self._columns(NUMERIC):
+            if self.numeric_chart == "histogram":
+                charts.append((col, "bar", self._histogram(self.df[frame_columns[col]], columns[col]["histogram"])))
+            else:
+                charts.append((col, "bar", downsample_series(self.df[frame_columns[col]], self.max_points)))
+        k = min(config.CHART_TOP_K, self.max_points - 1)
+        charts += [(col, "pie", self._top_counts(col, columns[col], k)) for col in self._columns(CATEGORICAL)]
 
-        # Generate bar charts for numeric columns
-        for col in numeric_columns:
-            fig = px.bar(self.df, x=self.df.index, y=col, title=f'{col} Distribution')
-            fig_path = f"generated_reports/{col}_visualization.png"
-            fig.write_image(fig_path)
-            figures[col] = fig_path
+        with timed("charts"):
+            return get_renderer(self.chart_backend).render(charts, progress)
 
-        # Generate pie charts for categorical columns
-        for col in categorical_columns:
-            fig = px.pie(self.df, names=col, title=f'{col} Distribution')
-            fig_path = f"generated_reports/{col}_visualization.png"
-            fig.write_image(fig_path)
-            figures[col] = fig_path
+    def _histogram(self, series: pd.Series, bins: dict) -> pd.Series:
+        # The profile's bins are reused unless they exceed this report's point budget
+        if len(bins["counts"]) > self.max_points:
+            return histogram(series, self.max_points)
+        edges = np.asarray(bins["edges"])
+        centers = (edges[:-1] + edges[1:]) / 2
+        return pd.Series(bins["counts"], index=pd.Index(centers, name='bin'), name=series.name, dtype='int64')
 
-        return figures
+    @staticmethod
+    def _top_counts(col, entry: dict, k: int, other_label: str = "Other") -> pd.Series:
+        """Counts of the k most frequent values, with the rest of the column folded into one slice."""
+        top = entry["top"]
+        counts = pd.Series([item["count"] for item in top[:k]],
+                           index=pd.Index([item["value"] for item in top[:k]], dtype=object), name=col, dtype='int64')
+        other = entry["other"] + sum(item["count"] for item in top[k:])
+        if other:
+            counts = pd.concat([counts, pd.Series([other], index=[other_label], name=col)])
+        return counts
 
     def generate_summary(self):
+        if not isinstance(self.df, pd.DataFrame) and self._profile is None:
+            # Chunks can only be read once, so profile them as they stream by
+            self._profile = build_profile(self.df)
+
         summaries = []
-        
-        # Numeric columns summary
-        numeric_columns = self.df.select_dtypes(include=['float64', 'int64']).columns
-        for col in numeric_columns:
-            summary = self.df[col].describe()
+        columns = self.profile["columns"]
+
+        # Numeric columns summary, laid out as DataFrame.describe()
+        for col in self._columns(NUMERIC):
+            entry = columns[col]
+            summary = pd.Series({
+                "count": entry["count"], "mean": entry["mean"], "std": entry["std_dev"], "min": entry["min"],
+                **entry["quantiles"], "max": entry["max"],
+            }, dtype='float64', name=col)
             summaries.append(f"Summary of {col}:\n{summary.to_string()}\n")
-        
-        # Categorical columns summary
-        categorical_columns = self.df.select_dtypes(include=['object']).columns
-        for col in categorical_columns:
-            summary = self.df[col].value_counts()
+
+        # Categorical columns summary: most frequent values, the rest counted as Other
+        for col in self._columns(CATEGORICAL):
+            summary = self._top_counts(col, columns[col], config.PROFILE_TOP_K)
+            summary.index.name = col
+            summary.name = 'count'
             summaries.append(f"Summary of {col}:\n{summary.to_string()}\n")
 
         return summaries
 
-    def generate_pdf_with_visualizations(self, output_path: str, visualizations: dict):
-        c = canvas.Canvas(output_path, pagesize=letter)
-        width, height = letter
+    def layout_pages(self, summaries: list, visualizations: dict, page_size=letter) -> list:
+        """
+        Compute the page layout before drawing anything.
+        :return: One list of drawing operations per page: ("text", x, y, line) or
+                 ("image", x, y, width, height, ChartImage).
+        """
+        _, height = page_size
+        top, bottom, left = height - 100, 100, 100
+        pages = [[("title", 200, height - 50, "Report with Visualizations and Summaries")]]
+        y_position = top
 
-        # Add title
-        c.setFont("Helvetica", 24)
-        c.drawString(200, height - 50, "Report with Visualizations and Summaries")
-
-        # Add each visualization and its summary
-        y_position = height - 100
-        summaries = self.generate_summary()
-        for idx, (col, img_path) in enumerate(visualizations.items()):
+        for summary, image in zip(summaries, visualizations.values()):
             # Add summary text
-            c.setFont("Helvetica", 12)
-            for line in summaries[idx].split('\n'):
-                c.drawString(100, y_position, line)
+            for line in summary.split('\n'):
+                pages[-1].append(("text", left, y_position, line))
                 y_position -= 15
-                if y_position < 100:
-                    c.showPage()
-                    y_position = height - 100
-
-            # Add image
-            img = Image.open(img_path)
-            c.drawImage(img_path, 100, y_position - img.height, width=400, height=300)
-            y_position -= img.height + 50
-            if y_position < 100:
-                c.showPage()
-                y_position = height - 100
-        
-        c.save()
+                if y_position < bottom:
+                    pages.append([])
+                    y_position = top
+
+            # Add image, scaled to the column width; move to a new page if it does not fit
+            image_height = IMAGE_WIDTH * image.height / image.width
+            if y_position - image_height < bottom and pages[-1]:
+                pages.append([])
+                y_position = top
+            pages[-1].append(("image", left, y_position - image_height, IMAGE_WIDTH, image_height, image))
+            y_position -= image_height + 50
+            if y_position < bottom:
+                pages.append([])
+                y_position = top
+
+        return [page for page in pages if page]
 
-    def create_report(self, output_pdf_path: str):
-        visualizations = self.generate_visualizations()
-        self.generate_pdf_with_visualizations(output_pdf_path, visualizations)
+    def generate_pdf_with_visualizations(self, output, visualizations: dict):
+        """
+        Draw the report into `output`, a file path or a writable binary file object.
+        :param visualizations: Column name -> ChartImage, as returned by generate_visualizations.
+        """
+        pages = self.layout_pages(self.generate_summary(), visualizations)
+        c = canvas.Canvas(output, pagesize=letter)
+
+        for page in pages:
+            for op in page:
+                kind, x, y = op[:3]
+                if kind == "title":
+                    c.setFont("Helvetica", 24)
+                    c.drawString(x, y, op[3])
+                elif kind == "text":
+                    c.setFont("Helvetica", 12)
+                    c.drawString(x, y, op[3])
+                else:
+                    _, _, _, draw_width, draw_height, image = op
+                    c.drawImage(ImageReader(io.BytesIO(image.data)), x, y, width=draw_width, height=draw_height)
+            c.showPage()
+
+        c.save()
 
-        # Clean up image files
-        for img_path in visualizations.values():
-            if os.path.exists(img_path):
-                os.remove(img_path)
+    def create_report(self, output, progress=None):
+        """
+        Generate the report into `output`, a file path or a writable binary file object
+        (for example a SpooledTemporaryFile that is then streamed to the client).
+        """
+        visualizations = self.generate_visualizations(progress)
+        with timed("pdf"):
+            self.generate_pdf_with_visualizations(output, visualizations)
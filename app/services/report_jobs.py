@@ -0,0 +1,251 @@
+import asyncio
+import functools
+import os
+import socket
+import sqlite3
+import threading
+import uuid
+from contextlib import closing, contextmanager
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException
+
+from app import config
+from app.services import tasks
+from app.services.dataset_store import dataset_store
+from app.services.executor import ComputeExecutor, compute
+from app.services.profiling import profile_cache
+from app.services.report_catalog import ReportCatalog, report_catalog
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+def new_report_id() -> str:
+    return f"report_{uuid.uuid4()}_{datetime.now().strftime('%Y%m%d%H%M%S')}.pdf"
+
+
+def _owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _owner_gone(owner: str) -> bool:
+    """Whether the process that claimed a job has exited; only known for processes on this host."""
+    host, _, pid = (owner or "").rpartition(":")
+    if host != socket.gethostname() or not pid.isdigit():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
+
+
+def _record_progress(db_path: str, job_id: str, done: int, total: int):
+    # Called by the compute worker rendering the report, which may be another process
+    with closing(sqlite3.connect(db_path, timeout=30)) as db, db:
+        db.execute("UPDATE report_jobs SET charts_done = ?, charts_total = ?, updated_at = ? WHERE job_id = ?",
+                   (done, total, datetime.now().isoformat(), job_id))
+
+
+class ReportJobQueue:
+    def __init__(self, db_path: str, workers: int, catalog: ReportCatalog = None, executor: ComputeExecutor = None):
+        """
+        Background report generation with job state persisted in SQLite, shared by every worker
+        process using the same database. Jobs still queued or running when a process stops, or
+        running in a process that has exited, are picked up again by start() and then by a
+        periodic check of the running jobs' leases.
+        :param db_path: Path of the SQLite database holding job state.
+        :param workers: Number of reports generated concurrently.
+        :param catalog: Where finished reports are indexed (defaults to the shared report_catalog).
+        :param executor: Where reports are rendered (defaults to the shared compute executor).
+        """
+        self.db_path = db_path
+        self.workers = workers
+        self.catalog = catalog or report_catalog
+        self.executor = executor or compute
+        self._loop = None
+        self._slots = None
+        self._tasks = {}  # job_id -> task running or waiting to run it
+        self._watcher = None
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    @contextmanager
+    def _connect(self):
+        if not self._initialized:
+            self._init_db()
+        db = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def _init_db(self):
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        with closing(sqlite3.connect(self.db_path, timeout=30)) as db, db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS report_jobs (
+                    job_id TEXT PRIMARY KEY,
+                    dataset_id TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    charts_done INTEGER NOT NULL DEFAULT 0,
+                    charts_total INTEGER,
+                    report_id TEXT,
+                    error TEXT,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL,
+                    owner TEXT
+                )
+            """)
+            if "owner" not in [row[1] for row in db.execute("PRAGMA table_info(report_jobs)")]:
+                db.execute("ALTER TABLE report_jobs ADD COLUMN owner TEXT")
+        self._initialized = True
+
+    def start(self):
+        """
+        Resume jobs left unfinished by a previous run. Must be called on the event loop that runs
+        the jobs, as tasks that hand the rendering to the compute executor.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._loop is not None:
+                return
+            self._loop = loop
+            self._slots = asyncio.Semaphore(self.workers)
+        # Nothing runs here yet, so running jobs claimed under this process's name are from a previous
+        # run that got the same pid, as a restarted container usually does
+        for job_id in self._requeue_stale(restarted=True):
+            self._spawn(job_id)
+        self._watcher = asyncio.ensure_future(self._watch())
+
+    def shutdown(self):
+        with self._lock:
+            self._loop = None
+        if self._watcher is not None:
+            self._watcher.cancel()
+            self._watcher = None
+        for task in list(self._tasks.values()):
+            task.cancel()
+        if self._initialized:
+            # Handed back to the queue, for the next worker to start, instead of waiting out their lease
+            with self._connect() as db:
+                db.execute("UPDATE report_jobs SET status = ?, owner = NULL WHERE status = ? AND owner = ?",
+                           (QUEUED, RUNNING, _owner()))
+
+    def _requeue_stale(self, restarted: bool = False) -> list:
+        """
+        Requeue the running jobs that no longer have a worker; returns the ids of all queued jobs.
+        :param restarted: Also requeue the jobs claimed under this process's name.
+        """
+        # Other workers may be running jobs right now: only requeue those of exited processes on this
+        # host, and those of other hosts that stopped making progress
+        stale = (datetime.now() - timedelta(seconds=config.REPORT_JOB_LEASE_SECONDS)).isoformat()
+        with self._connect() as db:
+            for job_id, owner, updated_at in db.execute(
+                    "SELECT job_id, owner, updated_at FROM report_jobs WHERE status = ?", (RUNNING,)).fetchall():
+                if owner is None or (restarted and owner == _owner()) or _owner_gone(owner) or updated_at < stale:
+                    db.execute("UPDATE report_jobs SET status = ? WHERE job_id = ? AND status = ? AND owner IS ?",
+                               (QUEUED, job_id, RUNNING, owner))
+            return [row[0] for row in db.execute(
+                "SELECT job_id FROM report_jobs WHERE status = ? ORDER BY created_at", (QUEUED,))]
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(config.REPORT_JOB_RECHECK_SECONDS)
+            for job_id in await asyncio.to_thread(self._requeue_stale):
+                self._spawn(job_id)
+
+    def _schedule(self, job_id: str):
+        with self._lock:
+            loop = self._loop
+        # Jobs submitted before start() wait in the database for it
+        if loop is not None:
+            loop.call_soon_threadsafe(self._spawn, job_id)
+
+    def _spawn(self, job_id: str):
+        if job_id in self._tasks:
+            return
+        task = asyncio.ensure_future(self._run(job_id))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+
+    def submit(self, dataset_id: str) -> str:
+        """Queue a report of a stored dataset; safe to call from any thread."""
+        # The dataset must be on disk so the job can still run after a restart
+        dataset_store.persist(dataset_id)
+        job_id = uuid.uuid4().hex
+        now = datetime.now().isoformat()
+        with self._connect() as db:
+            db.execute(
+                "INSERT INTO report_jobs (job_id, dataset_id, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, dataset_id, QUEUED, now, now),
+            )
+        self._schedule(job_id)
+        return job_id
+
+    def get(self, job_id: str):
+        with self._connect() as db:
+            db.row_factory = sqlite3.Row
+            row = db.execute("SELECT * FROM report_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def _update(self, job_id: str, **fields):
+        fields["updated_at"] = datetime.now().isoformat()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as db:
+            db.execute(f"UPDATE report_jobs SET {assignments} WHERE job_id = ?", (*fields.values(), job_id))
+
+    def _claim(self, job_id: str) -> bool:
+        # Atomic, so a job is never run twice
+        with self._connect() as db:
+            return bool(db.execute(
+                "UPDATE report_jobs SET status = ?, owner = ?, updated_at = ? WHERE job_id = ? AND status = ?",
+                (RUNNING, _owner(), datetime.now().isoformat(), job_id, QUEUED),
+            ).rowcount)
+
+    async def _run(self, job_id: str):
+        async with self._slots:
+            if not await asyncio.to_thread(self._claim, job_id):
+                return
+            job = await asyncio.to_thread(self.get, job_id)
+            try:
+                df = await asyncio.to_thread(dataset_store.get, job["dataset_id"])
+            except KeyError:
+                await asyncio.to_thread(self._update, job_id, status=FAILED, error="Dataset not found.")
+                return
+
+            report_id = new_report_id()
+            staging_path = self.catalog.staging_path(report_id)
+            try:
+                # Without a cached profile, the compute worker builds one along with the report
+                profile = profile_cache.get(job["dataset_id"])
+                progress = functools.partial(_record_progress, self.db_path, job_id)
+                await self._render(df, staging_path, profile, progress)
+                await asyncio.to_thread(self.catalog.publish, staging_path, report_id, job["dataset_id"],
+                                        df.columns, len(df))
+            except asyncio.CancelledError:
+                # Left running in the database; shutdown() hands it back to the queue
+                self.catalog.discard(staging_path)
+                raise
+            except Exception as e:
+                self.catalog.discard(staging_path)
+                await asyncio.to_thread(self._update, job_id, status=FAILED, error=str(e))
+            else:
+                await asyncio.to_thread(self._update, job_id, status=DONE, report_id=report_id)
+
+    async def _render(self, df, staging_path: str, profile: dict, progress):
+        while True:
+            try:
+                return await self.executor.run(tasks.create_report, df, staging_path, None, profile, progress)
+            except HTTPException as e:
+                # A full compute queue delays a background job rather than failing it
+                if e.status_code != 429:
+                    raise
+                await asyncio.sleep(1)
+
+
+report_jobs = ReportJobQueue(config.REPORT_JOBS_DB, config.REPORT_WORKERS)
@@ -0,0 +1,254 @@
+# Cache of rendered analysis results.
+#
+# A result is determined by the dataset's content hash, the endpoint, its parameters and the code
+# that computed it, so those make the key and a cached result never goes stale; the TTL only
+# bounds how long an unused one is kept. Results are kept as JSON bytes in a size-bounded LRU,
+# optionally backed by a directory that survives restarts and is shared by the workers.
+# Identical requests arriving while a result is being computed wait for that computation
+# instead of starting their own.
+
+import asyncio
+import functools
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from app import config
+from app.utils.profiler import run_in_threadpool
+from app.utils.responses import dumps
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The disk tier's size is tracked as results are written; the directory is listed again this
+# often to count the results other workers wrote
+DISK_RESCAN_SECONDS = 60
+
+
+@functools.lru_cache(maxsize=None)
+def code_version() -> str:
+    """config.RESULT_CACHE_VERSION, or a hash of the app's source, so a deploy invalidates old results."""
+    if config.RESULT_CACHE_VERSION:
+        return config.RESULT_CACHE_VERSION
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(APP_DIR):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith(".py"):
+                path = os.path.join(root, name)
+                digest.update(os.path.relpath(path, APP_DIR).encode())
+                with open(path, "rb") as f:
+                    digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def result_key(endpoint: str, dataset_id: str, params: dict) -> str:
+    """Key of a result; parameters left at None are dropped, so omitting one and passing None agree."""
+    spec = {
+        "endpoint": endpoint,
+        "dataset_id": dataset_id,
+        "params": {name: value for name, value in params.items() if value is not None},
+        "version": code_version(),
+    }
+    return hashlib.sha256(json.dumps(spec, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def result_etag(key: str) -> str:
+    # Weak: equal keys give equivalent results, not necessarily identical bytes
+    return f'W/"{key[:32]}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison
+    return any(tag.strip().removeprefix("W/") == etag.removeprefix("W/") for tag in if_none_match.split(","))
+
+
+class ResultCache:
+    def __init__(self, max_bytes: int, ttl: float, disk_dir: str = None, disk_bytes: int = 0):
+        """
+        Rendered results by result_key().
+        :param max_bytes: Total size of the results kept in memory, least recently used evicted first; 0 disables.
+        :param ttl: Seconds a result is served for after it was computed; 0 keeps it until evicted.
+        :param disk_dir: Directory for a second tier that survives restarts; None or "" for memory only.
+        :param disk_bytes: Total size of the results on disk, oldest removed first.
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.disk_dir = disk_dir or None
+        self.disk_bytes = disk_bytes
+        self._results = OrderedDict()  # key -> (body, created), most recently used last
+        self._bytes = 0
+        self._flights = {}  # key -> future of the computation in progress
+        self._disk = None  # key -> (mtime, size) of the results on disk, oldest first; listed on first write
+        self._disk_total = 0
+        self._disk_scanned = 0.0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "disk_hits": 0, "shared": 0, "evictions": 0}
+
+    def get(self, key: str):
+        """The result's JSON bytes, or None if it is not cached or has expired."""
+        with self._lock:
+            entry = self._results.get(key)
+            if entry is not None and not self._expired(entry[1]):
+                self._results.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[0]
+            if entry is not None:
+                self._discard(key)
+        body, created = self._read(key)
+        with self._lock:
+            if body is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["disk_hits"] += 1
+            self._remember(key, body, created)
+            return body
+
+    def put(self, key: str, body: bytes):
+        created = time.time()
+        with self._lock:
+            self._remember(key, body, created)
+        self._write(key, body)
+
+    async def get_or_compute(self, key: str, compute, refresh: bool = False, prepare=None) -> tuple[bytes, bool]:
+        """
+        (JSON bytes, whether they came from the cache) of the result for key.
+        :param compute: Coroutine function returning the result; it is awaited once however many
+                        identical requests wait for it, and nothing is cached if it raises.
+        :param refresh: Compute the result again even if it is cached.
+        :param prepare: Coroutine function awaited, on a miss, by the request about to start the
+                        computation, which is then called as compute(prepared). Anything scoped to
+                        that request, such as its upload, belongs here: the computation outlives it.
+        """
+        if not refresh:
+            body = await run_in_threadpool(self.get, key)
+            if body is not None:
+                return body, True
+        flight = self._flights.get(key)
+        if flight is None and prepare is not None:
+            prepared = await prepare()
+            compute = functools.partial(compute, prepared)
+            # Another request may have started the computation meanwhile
+            flight = self._flights.get(key)
+        if flight is None:
+            flight = asyncio.ensure_future(self._compute(key, compute))
+            self._flights[key] = flight
+            flight.add_done_callback(lambda _: self._flights.pop(key, None))
+        else:
+            self.stats["shared"] += 1
+        # Shielded, so a client hanging up does not cancel the computation for the others
+        return await asyncio.shield(flight), False
+
+    async def _compute(self, key: str, compute) -> bytes:
+        body = dumps(await compute())
+        await run_in_threadpool(self.put, key, body)
+        return body
+
+    def clear(self):
+        """Drop the results held in memory; the disk tier is kept."""
+        with self._lock:
+            self._results.clear()
+            self._bytes = 0
+
+    def info(self) -> dict:
+        with self._lock:
+            return {**self.stats, "results": len(self._results), "bytes": self._bytes}
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl > 0 and time.time() - created > self.ttl
+
+    def _remember(self, key: str, body: bytes, created: float):
+        if len(body) > self.max_bytes:
+            return
+        self._discard(key)
+        self._results[key] = (body, created)
+        self._bytes += len(body)
+        while self._bytes > self.max_bytes:
+            _, (evicted, _) = self._results.popitem(last=False)
+            self._bytes -= len(evicted)
+            self.stats["evictions"] += 1
+
+    def _discard(self, key: str):
+        entry = self._results.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[0])
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _read(self, key: str):
+        if self.disk_dir is None:
+            return None, None
+        path = self._path(key)
+        try:
+            created = os.path.getmtime(path)
+            if self._expired(created):
+                os.remove(path)
+                with self._lock:
+                    self._forget_disk(key)
+                return None, None
+            with open(path, "rb") as f:
+                return f.read(), created
+        except FileNotFoundError:
+            return None, None
+
+    def _write(self, key: str, body: bytes):
+        if self.disk_dir is None or len(body) > self.disk_bytes:
+            return
+        os.makedirs(self.disk_dir, exist_ok=True)
+        # Written next to the final path and renamed, so other workers never read a partial result
+        tmp_path = os.path.join(self.disk_dir, f".{key}.{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(body)
+        os.replace(tmp_path, self._path(key))
+        if self._disk is None or time.time() - self._disk_scanned > DISK_RESCAN_SECONDS:
+            self._scan_disk()
+        with self._lock:
+            self._forget_disk(key)
+            self._disk[key] = (time.time(), len(body))
+            self._disk_total += len(body)
+            evicted = []
+            while self._disk:
+                old_key, (created, _) = next(iter(self._disk.items()))
+                if self._disk_total <= self.disk_bytes and not self._expired(created):
+                    break
+                self._forget_disk(old_key)
+                evicted.append(old_key)
+                self.stats["evictions"] += 1
+        for old_key in evicted:
+            try:
+                os.remove(self._path(old_key))
+            except FileNotFoundError:
+                # Removed by another worker meanwhile
+                pass
+
+    def _scan_disk(self):
+        files = []
+        with os.scandir(self.disk_dir) as entries:
+            for entry in entries:
+                try:
+                    if entry.name.endswith(".json"):
+                        stat = entry.stat()
+                        files.append((stat.st_mtime, entry.name[:-len(".json")], stat.st_size))
+                except FileNotFoundError:
+                    # Removed by another worker meanwhile
+                    pass
+        with self._lock:
+            self._disk = OrderedDict((key, (created, size)) for created, key, size in sorted(files))
+            self._disk_total = sum(size for _, _, size in files)
+            self._disk_scanned = time.time()
+
+    def _forget_disk(self, key: str):
+        entry = self._disk.pop(key, None) if self._disk is not None else None
+        if entry is not None:
+            self._disk_total -= entry[1]
+
+
+result_cache = ResultCache(config.RESULT_CACHE_BYTES, config.RESULT_CACHE_TTL_SECONDS, config.RESULT_CACHE_DIR,
+                           config.RESULT_CACHE_DISK_BYTES)
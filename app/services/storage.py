@@ -0,0 +1,202 @@
+# Storage backends for reports and spilled datasets.
+#
+# A location is either a directory (local, or a volume shared by every worker and replica) or an
+# s3://bucket/prefix URL for S3 or an S3-compatible server such as MinIO. Objects are written
+# through a staging file and published in one step, so readers in other processes never see a
+# partial object: a rename within the directory for local storage, a single PUT for S3.
+
+import functools
+import hashlib
+import io
+import os
+import tempfile
+import uuid
+from urllib.parse import urlparse
+
+from app import config
+
+
+def file_etag(path: str, block_size: int = 1024 * 1024) -> str:
+    """Strong ETag from the file's content, so it survives restarts and copies."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+class LocalStorage:
+    def __init__(self, root: str):
+        self.root = root
+
+    def local_path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def staging_path(self, key: str) -> str:
+        """A unique path to write a new object to before commit(); hidden from list()."""
+        os.makedirs(self.root, exist_ok=True)
+        # Next to the final path, so publishing it is an atomic rename
+        return os.path.join(self.root, f".{key}.{uuid.uuid4().hex}.tmp")
+
+    def commit(self, staging_path: str, key: str):
+        os.replace(staging_path, self.local_path(key))
+
+    def discard(self, staging_path: str):
+        try:
+            os.remove(staging_path)
+        except FileNotFoundError:
+            pass
+
+    def size(self, key: str):
+        """Size of the object in bytes, or None if there is no such object."""
+        try:
+            return os.path.getsize(self.local_path(key))
+        except OSError:
+            return None
+
+    def etag(self, key: str) -> str:
+        return file_etag(self.local_path(key))
+
+    def open(self, key: str):
+        return open(self.local_path(key), "rb")
+
+    def read_range(self, key: str, start: int, end: int, block_size: int = 64 * 1024):
+        """Bytes start..end (inclusive) of the object, in blocks."""
+        with open(self.local_path(key), "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                block = f.read(min(block_size, remaining))
+                if not block:
+                    break
+                remaining -= len(block)
+                yield block
+
+    def delete(self, key: str):
+        try:
+            os.remove(self.local_path(key))
+        except FileNotFoundError:
+            pass
+
+    def list(self):
+        """(key, bytes, modified timestamp) of every object."""
+        if not os.path.isdir(self.root):
+            return
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                if not entry.name.startswith(".") and entry.is_file():
+                    stat = entry.stat()
+                    yield entry.name, stat.st_size, stat.st_mtime
+
+
+def _not_found(error: Exception) -> bool:
+    code = getattr(error, "response", {}).get("Error", {}).get("Code")
+    return code in ("404", "NoSuchKey", "NotFound")
+
+
+class S3Storage:
+    def __init__(self, bucket: str, prefix: str = "", client=None):
+        """
+        Objects in an S3 bucket, under `prefix`.
+        :param client: A boto3 S3 client; by default one is created for config.S3_ENDPOINT_URL (unset
+                       for AWS), with credentials from the usual AWS environment variables. boto3
+                       clients are thread-safe and keep a pool of up to S3_MAX_POOL_CONNECTIONS
+                       keep-alive connections.
+        """
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        if client is None:
+            try:
+                import boto3
+                from botocore.config import Config
+            except ImportError as e:
+                raise RuntimeError("s3:// storage requires boto3 (pip install boto3).") from e
+            client = boto3.client(
+                "s3", endpoint_url=config.S3_ENDPOINT_URL or None,
+                config=Config(max_pool_connections=config.S3_MAX_POOL_CONNECTIONS,
+                              retries={"max_attempts": 5, "mode": "standard"}),
+            )
+        self.client = client
+
+    def _key(self, key: str) -> str:
+        return self.prefix + key
+
+    def local_path(self, key: str):
+        return None
+
+    def staging_path(self, key: str) -> str:
+        fd, path = tempfile.mkstemp(suffix=os.path.splitext(key)[1])
+        os.close(fd)
+        return path
+
+    def commit(self, staging_path: str, key: str):
+        # A PUT replaces the object in one step; readers see the old object or the new one
+        try:
+            with open(staging_path, "rb") as f:
+                self.client.put_object(Bucket=self.bucket, Key=self._key(key), Body=f)
+        finally:
+            os.remove(staging_path)
+
+    def discard(self, staging_path: str):
+        try:
+            os.remove(staging_path)
+        except FileNotFoundError:
+            pass
+
+    def _head(self, key: str):
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._key(key))
+        except Exception as e:
+            if _not_found(e):
+                return None
+            raise
+
+    def size(self, key: str):
+        head = self._head(key)
+        return None if head is None else head["ContentLength"]
+
+    def etag(self, key: str) -> str:
+        return self._head(key)["ETag"]
+
+    def open(self, key: str):
+        # Readers such as Parquet need to seek, so the object is fetched whole
+        body = self.client.get_object(Bucket=self.bucket, Key=self._key(key))["Body"]
+        return io.BytesIO(body.read())
+
+    def read_range(self, key: str, start: int, end: int, block_size: int = 64 * 1024):
+        body = self.client.get_object(Bucket=self.bucket, Key=self._key(key), Range=f"bytes={start}-{end}")["Body"]
+        try:
+            for block in iter(lambda: body.read(block_size), b""):
+                yield block
+        finally:
+            body.close()
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(key))
+
+    def list(self):
+        kwargs = {"Bucket": self.bucket, "Prefix": self.prefix}
+        while True:
+            page = self.client.list_objects_v2(**kwargs)
+            for obj in page.get("Contents", []):
+                key = obj["Key"][len(self.prefix):]
+                if key and "/" not in key:
+                    yield key, obj["Size"], obj["LastModified"].timestamp()
+            if not page.get("IsTruncated"):
+                return
+            kwargs["ContinuationToken"] = page["NextContinuationToken"]
+
+
+@functools.lru_cache(maxsize=None)
+def _open_location(location: str):
+    url = urlparse(location)
+    if url.scheme == "s3":
+        return S3Storage(url.netloc, url.path)
+    return LocalStorage(location)
+
+
+def open_storage(location):
+    """Storage for a directory or an s3://bucket/prefix URL; storage objects are returned as they are."""
+    if isinstance(location, (LocalStorage, S3Storage)):
+        return location
+    return _open_location(location)
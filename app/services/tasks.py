@@ -0,0 +1,121 @@
+# CPU-bound jobs dispatched through the compute executor.
+# Each task takes the dataset as its first argument and must stay a module-level
+# function so it can be sent to worker processes.
+
+import copy
+import io
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LinearRegression
+from sklearn.preprocessing import LabelEncoder
+
+from app.services.analysis_engine import AnalysisEngine, aggregation_model
+from app.services.data_processing import CLEANING, clean_data, preprocessing
+from app.services.model_registry import FittedModel
+from app.services.profiling import build_profile
+from app.services.report_generator import ReportGenerator
+from app.utils.file_handler import concat_chunks
+from app.utils.metrics import count_rows, timed
+
+
+def process_dataset(df, encoding="dense", memory=False):
+    """
+    Clean and preprocess a DataFrame (or streamed chunks).
+    Returns the resulting column names and the time of each pipeline stage, plus its peak memory if `memory`.
+    """
+    stages = []
+    if isinstance(df, pd.DataFrame):
+        df_cleaned = CLEANING.run(df, stages, memory)
+    else:
+        df_cleaned = concat_chunks(clean_data(df))
+    columns = preprocessing(encoding).run(df_cleaned, stages, memory).columns.tolist()
+    return {"columns": columns, "stages": stages}
+
+
+def profile_dataset(df, exact=True):
+    return build_profile(df, exact=exact)
+
+
+def descriptive_statistics(df, exact=True):
+    return AnalysisEngine(df).descriptive_statistics(exact=exact)
+
+
+def fit_linear_regression_xy(df: pd.DataFrame, x_column: str, y_column: str) -> FittedModel:
+    """Fit y on a single x column, label-encoding categorical data; slope and intercept are in the metrics."""
+    # The dataset may be shared, so encode on a copy of the two columns
+    df = df[list(dict.fromkeys([x_column, y_column]))].copy()
+    encoders = {}
+
+    # Encode categorical data if necessary
+    if df[x_column].dtype == 'object':
+        le = LabelEncoder()
+        df[x_column] = le.fit_transform(df[x_column])
+        encoders[x_column] = le.classes_.tolist()
+
+    if df[y_column].dtype == 'object':
+        le = LabelEncoder()
+        df[y_column] = le.fit_transform(df[y_column])
+
+    # Extracting the x and y values
+    X = df[[x_column]].values
+    y = df[y_column].values
+
+    # Perform linear regression
+    model = LinearRegression()
+    with timed("fit_linear_regression"):
+        model.fit(X, y)
+    count_rows("fit_linear_regression", len(X))
+
+    # Keep the slope and intercept with the model
+    metrics = {"slope": model.coef_[0], "intercept": model.intercept_}
+    return FittedModel("linear_regression", model, [x_column], y_column, encoders=encoders, metrics=metrics)
+
+
+def fit_tree_model(df: pd.DataFrame, target_column: str, feature_columns: list, model: str = "decision_tree",
+                   params: dict = None, search: bool = False, sample_rows: int = None) -> FittedModel:
+    return AnalysisEngine(df).fit_tree_model(target_column, feature_columns, model, params, search, sample_rows)
+
+
+def fit_incremental_regression(df, target_column: str, feature_columns: list = None,
+                               model: FittedModel = None) -> FittedModel:
+    """Out-of-core linear regression over a DataFrame or streamed chunks, optionally appending to `model`."""
+    return AnalysisEngine(df).fit_incremental_regression(target_column, feature_columns, model)
+
+
+def fit_aggregation(df, spec: dict, model: FittedModel = None) -> FittedModel:
+    """Aggregate a DataFrame (or streamed chunks) as described by GroupedAggregator.spec(), optionally onto `model`."""
+    return AnalysisEngine(df).fit_aggregation(**spec, model=model)
+
+
+def merge_aggregations(models: list) -> FittedModel:
+    """Combine aggregations of separate shards of the rows; the inputs are left unchanged."""
+    with timed("merge_aggregations"):
+        aggregator = copy.deepcopy(models[0].estimator)
+        for model in models[1:]:
+            aggregator.merge(model.estimator)
+    return aggregation_model(aggregator)
+
+
+def predict(df: pd.DataFrame, model: FittedModel) -> list:
+    """Score rows with a fitted model; ValueError if they lack the model's features."""
+    return predict_array(df, model).tolist()
+
+
+def predict_array(df: pd.DataFrame, model: FittedModel) -> np.ndarray:
+    with timed("predict"):
+        predictions = model.predict(df)
+    count_rows("predict", len(predictions))
+    return predictions
+
+
+def create_report(df: pd.DataFrame, output_pdf_path: str, chart_backend: str = None, profile: dict = None,
+                  progress=None):
+    ReportGenerator(df, chart_backend, profile=profile).create_report(output_pdf_path, progress)
+    return output_pdf_path
+
+
+def render_report(df: pd.DataFrame, chart_backend: str = None, profile: dict = None) -> bytes:
+    """Build the report PDF entirely in memory and return its bytes."""
+    output = io.BytesIO()
+    ReportGenerator(df, chart_backend, profile=profile).create_report(output)
+    return output.getvalue()
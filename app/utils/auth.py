@@ -0,0 +1,23 @@
+# Access to the admin routes and to on-demand request profiling, both off unless ADMIN_TOKEN is set.
+
+import hmac
+
+from fastapi import Header, HTTPException
+
+from app import config
+
+ADMIN_TOKEN_HEADER = "X-Admin-Token"
+
+
+def admin_token_valid(token: str) -> bool:
+    if not config.ADMIN_TOKEN or token is None:
+        return False
+    return hmac.compare_digest(token.encode(), config.ADMIN_TOKEN.encode())
+
+
+async def require_admin(token: str = Header(None, alias=ADMIN_TOKEN_HEADER)):
+    """Dependency of admin routes: 404 while ADMIN_TOKEN is unset, 401 without the right X-Admin-Token."""
+    if not config.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not admin_token_valid(token):
+        raise HTTPException(status_code=401, detail="Invalid admin token.")
@@ -1,19 +1,285 @@
 import pandas as pd
+import numpy as np
 import io
+import mmap
+import operator
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+from typing import Iterable, Iterator
+from pandas.api.types import is_string_dtype, union_categoricals
 
-def read_file(file: io.BytesIO, file_name: str = None) -> pd.DataFrame:
-    """Read a file-like object and return a pandas DataFrame."""
-    
+from app import config
+from app.utils.metrics import count_rows, timed
+
+INT32_MIN, INT32_MAX = np.iinfo(np.int32).min, np.iinfo(np.int32).max
+
+COLUMNAR_FORMATS = ('.parquet', '.feather', '.arrow', '.arrows', '.ipc')
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+# Row filters are (column, op, value) tuples, ANDed together, in the form pyarrow.parquet accepts
+FILTER_OPERATORS = {
+    "==": operator.eq, "!=": operator.ne,
+    "<": operator.lt, "<=": operator.le,
+    ">": operator.gt, ">=": operator.ge,
+}
+
+def read_file(file: io.BytesIO, file_name: str = None, columns: list = None, filters: list = None,
+              dtypes: dict = None) -> pd.DataFrame:
+    """
+    Read a file-like object and return a pandas DataFrame.
+    :param columns: Read only these columns (the ones present; callers check for missing names).
+                    Parquet and Arrow files skip the other columns entirely, CSV skips parsing them.
+    :param filters: Keep only rows matching every (column, op, value) filter. Parquet skips row groups
+                    whose statistics rule them out; CSV is filtered chunk by chunk while parsing.
+    :param dtypes: Column -> dtype hints for CSV and Excel, which then skip type inference for those columns.
+    """
+    with timed("parse"):
+        df = _read_file(file, file_name, columns, filters, dtypes)
+    count_rows("parse", len(df))
+    return df
+
+def _read_file(file, file_name, columns, filters, dtypes) -> pd.DataFrame:
     # If file_name is provided, use it; otherwise, fallback to a default or raise an error
     if file_name:
+        # Filter columns are read too and dropped once the rows are filtered
+        read_columns = _with_filter_columns(columns, filters)
+        wanted = (lambda col: col in read_columns) if read_columns is not None else None
+        dtypes = _hints(dtypes, read_columns)
         if file_name.endswith('.csv'):
-            return pd.read_csv(file)
+            if filters:
+                chunks = pd.read_csv(file, usecols=wanted, dtype=dtypes, chunksize=config.STREAM_CHUNK_ROWS)
+                with chunks:
+                    df = concat_chunks(filter_rows(chunk, filters) for chunk in chunks)
+            else:
+                df = pd.read_csv(file, usecols=wanted, dtype=dtypes)
+        elif file_name.endswith('.jsonl') or file_name.endswith('.ndjson'):
+            df = _project(pd.read_json(file, lines=True), read_columns)
         elif file_name.endswith('.json'):
-            return pd.read_json(file)
+            df = _project(pd.read_json(file), read_columns)
         elif file_name.endswith('.xlsx') or file_name.endswith('.xls'):
-            return pd.read_excel(file)
+            df = pd.read_excel(file, usecols=wanted, dtype=dtypes)
+        elif file_name.endswith(COLUMNAR_FORMATS):
+            # Arrow data is filtered before conversion, so dropped rows never reach pandas
+            return _project(_read_arrow_table(file, file_name, read_columns, filters).to_pandas(), columns)
         else:
             raise ValueError(f"Unsupported file format: {file_name}")
+        if filters and not file_name.endswith('.csv'):
+            df = filter_rows(df, filters)
+        return _project(df, columns) if read_columns != columns else df
     else:
         raise ValueError("File name not provided or cannot be determined.")
 
+def _project(df: pd.DataFrame, columns) -> pd.DataFrame:
+    return df if columns is None else df[[col for col in df.columns if col in columns]]
+
+def _with_filter_columns(columns, filters):
+    if columns is None or not filters:
+        return columns
+    return list(dict.fromkeys([*columns, *(col for col, _, _ in filters)]))
+
+def _hints(dtypes, columns):
+    if not dtypes:
+        return None
+    return {col: dtype for col, dtype in dtypes.items() if columns is None or col in columns}
+
+def _filter_value(value, string_column: bool):
+    # Unquoted numbers compare as text against string columns, e.g. zip codes
+    return str(value) if string_column and not isinstance(value, str) else value
+
+def filter_rows(df: pd.DataFrame, filters: list) -> pd.DataFrame:
+    """Rows of df matching every (column, op, value) filter; nulls never match, as in Arrow."""
+    if not filters:
+        return df
+    mask = np.ones(len(df), dtype=bool)
+    for col, op, value in filters:
+        if col not in df.columns:
+            raise ValueError(f"Unknown filter column: {col}")
+        series = df[col]
+        value = _filter_value(value, is_string_dtype(series.dtype) or isinstance(series.dtype, pd.CategoricalDtype))
+        try:
+            mask &= (FILTER_OPERATORS[op](series, value) & series.notna()).to_numpy(dtype=bool)
+        except TypeError:
+            raise ValueError(f"Cannot compare column {col} with {value!r}")
+    return df[mask].reset_index(drop=True)
+
+def _arrow_filter(filters: list, schema: pa.Schema):
+    """pyarrow filter expression, or None; ValueError for columns the file does not have."""
+    if not filters:
+        return None
+    coerced = []
+    for col, op, value in filters:
+        if col not in schema.names:
+            raise ValueError(f"Unknown filter column: {col}")
+        field_type = schema.field(col).type
+        coerced.append((col, op, _filter_value(value, pa.types.is_string(field_type) or pa.types.is_large_string(field_type))))
+    return pq.filters_to_expression(coerced)
+
+def _arrow_source(file) -> pa.Buffer:
+    """
+    Zero-copy Arrow view of an upload: a memory map of a spooled file that has rolled over to disk,
+    otherwise the bytes read once.
+    """
+    raw = getattr(file, '_file', file)  # SpooledTemporaryFile keeps its BytesIO or TemporaryFile here
+    if not isinstance(raw, (io.BytesIO, io.StringIO)):
+        try:
+            raw.flush()
+            return pa.py_buffer(mmap.mmap(raw.fileno(), 0, access=mmap.ACCESS_READ))
+        except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+            pass
+    file.seek(0)
+    return pa.py_buffer(file.read())
+
+def _read_arrow_table(file, file_name: str, columns=None, filters=None) -> pa.Table:
+    source = pa.BufferReader(_arrow_source(file))
+    try:
+        if file_name.endswith('.parquet'):
+            schema = pq.ParquetFile(source).schema_arrow
+            names = [col for col in schema.names if col in columns] if columns is not None else None
+            source.seek(0)
+            # Row groups whose min/max statistics cannot match the filters are skipped unread
+            return pq.read_table(source, columns=names, filters=_arrow_filter(filters, schema))
+        # Feather v2 is the Arrow IPC file format; .arrows is the IPC stream format
+        reader = pa.ipc.open_stream(source) if file_name.endswith('.arrows') else _open_ipc(source)
+        if isinstance(reader, pa.ipc.RecordBatchFileReader) and columns is not None:
+            # The file format can decode (and decompress) just the selected columns
+            source.seek(0)
+            table = feather.read_table(source, columns=[col for col in reader.schema.names if col in columns])
+        else:
+            table = reader.read_all()
+            if columns is not None:
+                table = table.select([col for col in table.column_names if col in columns])
+        expression = _arrow_filter(filters, table.schema)
+        return table.filter(expression) if expression is not None else table
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+        raise ValueError(f"Could not read {file_name}: {e}")
+
+def _open_ipc(source: pa.BufferReader):
+    # .arrow and .ipc files may hold either IPC format; the file format starts with a magic number
+    magic = source.read(6)
+    source.seek(0)
+    return pa.ipc.open_file(source) if magic == b'ARROW1' else pa.ipc.open_stream(source)
+
+def write_arrow_stream(df: pd.DataFrame) -> bytes:
+    """Serialize a DataFrame as an Arrow IPC stream, e.g. to export analysis results."""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def read_file_chunks(file, file_name: str = None, chunksize: int = None, columns: list = None,
+                     filters: list = None, dtypes: dict = None) -> Iterator[pd.DataFrame]:
+    """
+    Stream a CSV or JSON-lines file-like object as DataFrame chunks of `chunksize` rows.
+    Dtypes are inferred from the first chunk and every chunk is downcast the same way.
+    JSON files are read as JSON lines, since a single JSON document cannot be streamed.
+    columns, filters and dtypes are as for read_file(); filtered chunks can be shorter than chunksize.
+    """
+    chunksize = chunksize or config.STREAM_CHUNK_ROWS
+    if not file_name:
+        raise ValueError("File name not provided or cannot be determined.")
+    read_columns = _with_filter_columns(columns, filters)
+    if file_name.endswith('.csv'):
+        wanted = (lambda col: col in read_columns) if read_columns is not None else None
+        chunks = _iter_chunks(pd.read_csv(file, chunksize=chunksize, usecols=wanted, dtype=_hints(dtypes, read_columns)))
+    elif file_name.endswith(('.jsonl', '.ndjson', '.json')):
+        chunks = _iter_chunks(pd.read_json(file, lines=True, chunksize=chunksize))
+    elif file_name.endswith(COLUMNAR_FORMATS):
+        chunks = _iter_arrow_batches(file, file_name, chunksize, read_columns)
+    else:
+        raise ValueError(f"Streaming is not supported for file format: {file_name}")
+    if columns is not None or filters:
+        chunks = (_project(filter_rows(chunk, filters), columns) for chunk in chunks)
+    return _timed_chunks(chunks)
+
+def _timed_chunks(chunks) -> Iterator[pd.DataFrame]:
+    # Parsing happens as the consumer pulls chunks, so each chunk is timed separately
+    chunks = iter(chunks)
+    while True:
+        with timed("parse"):
+            chunk = next(chunks, None)
+        if chunk is None:
+            return
+        count_rows("parse", len(chunk))
+        yield chunk
+
+def _iter_chunks(reader) -> Iterator[pd.DataFrame]:
+    dtypes = None
+    with reader:
+        for chunk in reader:
+            if dtypes is None:
+                dtypes = infer_downcast_dtypes(chunk)
+            yield apply_dtypes(chunk, dtypes)
+
+def _iter_arrow_batches(file, file_name: str, chunksize: int, columns: list = None) -> Iterator[pd.DataFrame]:
+    # Arrow data is already typed, so no dtype inference; batches are re-sliced to chunksize rows
+    source = pa.BufferReader(_arrow_source(file))
+    try:
+        if file_name.endswith('.parquet'):
+            parquet = pq.ParquetFile(source)
+            names = [col for col in parquet.schema_arrow.names if col in columns] if columns is not None else None
+            batches = parquet.iter_batches(batch_size=chunksize, columns=names)
+        elif file_name.endswith('.arrows'):
+            batches = pa.ipc.open_stream(source)
+        else:
+            reader = _open_ipc(source)
+            batches = ([reader.get_batch(i) for i in range(reader.num_record_batches)]
+                       if isinstance(reader, pa.ipc.RecordBatchFileReader) else reader)
+    except pa.ArrowInvalid as e:
+        raise ValueError(f"Could not read {file_name}: {e}")
+    return _rechunk(batches, chunksize, columns)
+
+def _rechunk(batches, chunksize: int, columns: list = None) -> Iterator[pd.DataFrame]:
+    for batch in batches:
+        if columns is not None:
+            batch = batch.select([col for col in batch.schema.names if col in columns])
+        for start in range(0, batch.num_rows, chunksize):
+            yield batch.slice(start, chunksize).to_pandas()
+
+def infer_downcast_dtypes(df: pd.DataFrame, max_category_ratio: float = 0.5) -> dict:
+    """Pick smaller dtypes: int64 -> int32 when values fit, object -> category when cardinality is low."""
+    dtypes = {}
+    for col in df.columns:
+        series = df[col]
+        if series.dtype == 'int64':
+            if series.empty or (series.min() >= INT32_MIN and series.max() <= INT32_MAX):
+                dtypes[col] = 'int32'
+        elif series.dtype == 'object':
+            if len(series) and series.nunique() <= max_category_ratio * len(series):
+                dtypes[col] = 'category'
+    return dtypes
+
+def apply_dtypes(df: pd.DataFrame, dtypes: dict) -> pd.DataFrame:
+    """Cast a chunk to the inferred dtypes, skipping columns where a later chunk does not fit."""
+    casts = {}
+    for col, dtype in dtypes.items():
+        if col not in df.columns:
+            continue
+        series = df[col]
+        if dtype == 'int32':
+            # Later chunks can hold NaNs or values outside the int32 range
+            if series.dtype != 'int64' or series.min() < INT32_MIN or series.max() > INT32_MAX:
+                continue
+        elif series.dtype != 'object':
+            continue
+        casts[col] = dtype
+    return df.astype(casts) if casts else df
+
+def concat_chunks(chunks: Iterable[pd.DataFrame], columns=None) -> pd.DataFrame:
+    """
+    Concatenate chunks, optionally keeping only `columns` (a list, or a callable taking a chunk).
+    Categorical columns are unioned so they stay categorical despite per-chunk categories.
+    """
+    parts = []
+    for chunk in chunks:
+        selected = columns(chunk) if callable(columns) else columns
+        parts.append(chunk[selected] if selected is not None else chunk)
+    if not parts:
+        return pd.DataFrame()
+
+    for col in parts[0].columns:
+        if all(col in p.columns and isinstance(p[col].dtype, pd.CategoricalDtype) for p in parts):
+            categories = union_categoricals([p[col] for p in parts]).categories
+            parts = [p.assign(**{col: p[col].cat.set_categories(categories)}) for p in parts]
+    return pd.concat(parts, ignore_index=True)
@@ -0,0 +1,58 @@
+# Import-time report for a module, based on the interpreter's own -X importtime output.
+#
+#   python -m app.utils.importtime app.cli.cli --top 15 --budget-ms 500
+
+import argparse
+import subprocess
+import sys
+from typing import NamedTuple
+
+
+class ImportTime(NamedTuple):
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def measure_imports(module: str, python: str = sys.executable) -> list:
+    """Import `module` in a fresh interpreter and return one ImportTime per module it loaded."""
+    result = subprocess.run(
+        [python, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True,
+    )
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        times.append(ImportTime(name.strip(), int(self_us), int(cumulative_us), depth))
+    return times
+
+
+def total_ms(times: list, module: str) -> float:
+    """Cumulative import time of `module` in milliseconds."""
+    return next(t.cumulative_us for t in reversed(times) if t.module == module) / 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report how long importing a module takes.")
+    parser.add_argument("module")
+    parser.add_argument("--top", type=int, default=15, help="Number of slowest imports to list.")
+    parser.add_argument("--budget-ms", type=float, help="Exit with status 1 if the import takes longer.")
+    args = parser.parse_args(argv)
+
+    times = measure_imports(args.module)
+    total = total_ms(times, args.module)
+    print(f"{args.module}: {total:.1f} ms")
+    for t in sorted(times, key=lambda t: t.self_us, reverse=True)[:args.top]:
+        print(f"{t.self_us / 1000:8.1f} ms self {t.cumulative_us / 1000:8.1f} ms cumulative  {t.module}")
+    if args.budget_ms is not None and total > args.budget_ms:
+        print(f"Over budget: {total:.1f} ms > {args.budget_ms:.1f} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,344 @@
+# In-process metrics in the Prometheus text exposition format, plus per-request stage timings.
+#
+# Code paths time themselves with `with timed("parse"):` and report row counts with count_rows().
+# Work running on compute workers buffers its observations (collect()) and the executor replays
+# them in the serving process (replay()), so those stages reach /metrics and the request's
+# Server-Timing breakdown as well. Recording is a perf_counter call and a locked bucket update.
+#
+# With several web workers, each one writes a snapshot of its metrics to a shared directory every
+# few seconds (start_flushing()), and render(directory) adds up the snapshots of all of them, so
+# /metrics covers the whole server whichever worker answers the scrape.
+
+import bisect
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+PREFIX = "ai_employee_"
+# Request header that asks for a Server-Timing breakdown of the request's stages
+TIMING_HEADER = b"x-timing"
+# Seconds, from sub-millisecond parses to multi-minute reports
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_registry = []
+# Called before metrics are rendered or snapshotted, to set gauges that are read at scrape time
+_collectors = []
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+_buffer = contextvars.ContextVar("metrics_buffer", default=None)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = PREFIX + name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: tuple, **extra) -> dict:
+        return {**dict(zip(self.labelnames, key)), **extra}
+
+    def render(self, values: dict = None) -> list:
+        """Text format lines for this metric's own values, or for values by label key (e.g. merged ones)."""
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        if values is None:
+            values = self.snapshot()
+        for key, value in sorted(values.items()):
+            lines += self._samples(key, value)
+        return lines
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return self._snapshot()
+
+    def _snapshot(self) -> dict:
+        return dict(self._values)
+
+    @staticmethod
+    def _add(total, value):
+        return total + value
+
+    def _samples(self, key, value) -> list:
+        return [f"{self.name}{_format_labels(self._labels(key))} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (not cumulative) counts, then sum and count
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _snapshot(self) -> dict:
+        return {key: (list(counts), total, count) for key, (counts, total, count) in self._values.items()}
+
+    @staticmethod
+    def _add(total, value):
+        return [[a + b for a, b in zip(total[0], value[0])], total[1] + value[1], total[2] + value[2]]
+
+    def _samples(self, key, state) -> list:
+        counts, total, count = state
+        lines, cumulative = [], 0
+        for bound, bucket in zip(self.buckets, counts):
+            cumulative += bucket
+            lines.append(f"{self.name}_bucket{_format_labels(self._labels(key, le=bound))} {cumulative}")
+        lines.append(f"{self.name}_bucket{_format_labels(self._labels(key, le='+Inf'))} {count}")
+        lines.append(f"{self.name}_sum{_format_labels(self._labels(key))} {_format_value(total)}")
+        lines.append(f"{self.name}_count{_format_labels(self._labels(key))} {count}")
+        return lines
+
+
+def on_collect(fn):
+    """Register fn() to be called before the metrics are rendered or written out."""
+    _collectors.append(fn)
+    return fn
+
+
+def _collect():
+    for fn in _collectors:
+        fn()
+
+
+def render(directory: str = None) -> str:
+    """
+    Every registered metric in the Prometheus text format.
+    :param directory: Directory the worker processes write their snapshots to. The values of all of them are
+                      added up: this process's as they are now, the others' as of their last flush. Gauges of
+                      workers that have exited are left out; their counters and histograms still count.
+    """
+    if directory is None:
+        _collect()
+        return "\n".join(line for metric in _registry for line in metric.render()) + "\n"
+    write_snapshot(directory)
+    merged = _merge_snapshots(directory)
+    return "\n".join(line for metric in _registry for line in metric.render(merged.get(metric.name, {}))) + "\n"
+
+
+def write_snapshot(directory: str):
+    """Write this process's metrics to directory/<pid>.json."""
+    _collect()
+    snapshot = {metric.name: [[list(key), value] for key, value in metric.snapshot().items()] for metric in _registry}
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{os.getpid()}.json")
+    # Renamed into place, so other workers never read a partial snapshot
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"pid": os.getpid(), "metrics": snapshot}, f)
+    os.replace(tmp_path, path)
+
+
+def _merge_snapshots(directory: str) -> dict:
+    metrics = {metric.name: metric for metric in _registry}
+    merged = {}
+    for name in os.listdir(directory):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            # Removed meanwhile
+            continue
+        alive = _process_alive(snapshot["pid"])
+        for metric_name, values in snapshot["metrics"].items():
+            metric = metrics.get(metric_name)
+            if metric is None or (metric.kind == "gauge" and not alive):
+                continue
+            totals = merged.setdefault(metric_name, {})
+            for key, value in values:
+                key = tuple(key)
+                totals[key] = metric._add(totals[key], value) if key in totals else value
+    return merged
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def start_flushing(directory: str, interval: float):
+    """
+    Write this process's snapshot to directory every interval seconds, from a daemon thread.
+    Returns a function that stops the thread and writes a last snapshot.
+    """
+    stopped = threading.Event()
+
+    def run():
+        while not stopped.wait(interval):
+            try:
+                write_snapshot(directory)
+            except OSError:
+                # Try again at the next interval
+                pass
+
+    threading.Thread(target=run, name="metrics-flush", daemon=True).start()
+
+    def stop():
+        stopped.set()
+        write_snapshot(directory)
+
+    return stop
+
+
+http_requests = Counter("http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+http_latency = Histogram("http_request_duration_seconds", "Time to the start of the response.", ("method", "route"))
+bytes_ingested = Counter("request_bytes_total", "Request body bytes received, by route.", ("route",))
+stage_latency = Histogram("stage_duration_seconds", "Time spent in each processing stage.", ("stage",))
+rows_processed = Counter("rows_processed_total", "Rows handled by each processing stage.", ("stage",))
+
+
+def observe_stage(stage: str, seconds: float):
+    buffer = _buffer.get()
+    if buffer is not None:
+        buffer.append(("stage", stage, seconds))
+        return
+    stage_latency.observe(seconds, stage=stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((stage, seconds))
+
+
+def count_rows(stage: str, rows: int):
+    buffer = _buffer.get()
+    if buffer is not None:
+        buffer.append(("rows", stage, rows))
+        return
+    rows_processed.inc(rows, stage=stage)
+
+
+@contextmanager
+def timed(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+
+def collect(fn, *args):
+    """Call fn(*args) with observations buffered; returns (result, observations) for replay()."""
+    observations = []
+    token = _buffer.set(observations)
+    try:
+        return fn(*args), observations
+    finally:
+        _buffer.reset(token)
+
+
+def replay(observations: list):
+    for kind, stage, value in observations:
+        if kind == "stage":
+            observe_stage(stage, value)
+        else:
+            count_rows(stage, value)
+
+
+def server_timing(timings: list, total: float) -> str:
+    """Server-Timing header value, in milliseconds, with repeated stages added up."""
+    stages = {}
+    for stage, seconds in timings:
+        stages[stage] = stages.get(stage, 0.0) + seconds
+    stages["total"] = total
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in stages.items())
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        """
+        ASGI middleware counting requests, latency and body bytes per route template. Requests sent
+        with an X-Timing header get a Server-Timing response header listing the time of each stage.
+        """
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        headers = dict(scope["headers"])
+        timings = [] if headers.get(TIMING_HEADER) else None
+        token = _request_timings.set(timings)
+        status = 500
+        elapsed = None
+
+        async def send_with_metrics(message):
+            nonlocal status, elapsed
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                elapsed = time.perf_counter() - start
+                if timings is not None:
+                    message = {**message, "headers": [*message.get("headers", []),
+                                                      (b"server-timing", server_timing(timings, elapsed).encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            _request_timings.reset(token)
+            # Route templates rather than raw paths keep the label set bounded
+            route = getattr(scope.get("route"), "path", "unmatched")
+            method = scope["method"]
+            http_requests.inc(method=method, route=route, status=status)
+            http_latency.observe(elapsed if elapsed is not None else time.perf_counter() - start,
+                                 method=method, route=route)
+            length = headers.get(b"content-length")
+            if length and length.isdigit():
+                bytes_ingested.inc(int(length), route=route)
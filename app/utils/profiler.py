@@ -0,0 +1,270 @@
+# Sampling profiler for slow requests.
+#
+# While at least one request is being profiled, a daemon thread wakes every PROFILE_INTERVAL_MS,
+# reads the stack of every busy thread with sys._current_frames() and adds each stack to the
+# sessions that thread is working for. Nothing is traced between samples, so the cost is one
+# stack walk per thread per interval. A request owns the event loop thread while its task runs,
+# and the threads it hands work to through run_in_threadpool() (or any call wrapped in
+# in_session()) while they run it; concurrent requests never see each other's stacks. Compute
+# tasks run in worker processes are sampled there (profile_call) and their stacks merged into
+# the request's session. Sessions are written as collapsed stacks
+# ("frame;frame;frame count" lines), which speedscope and flamegraph.pl open directly.
+
+import asyncio
+import collections
+import contextvars
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+from starlette.concurrency import run_in_threadpool as _run_in_threadpool
+
+from app import config
+from app.utils.auth import ADMIN_TOKEN_HEADER, admin_token_valid
+
+# Request header that forces a profile to be kept whatever the request's latency
+PROFILE_HEADER = b"x-profile"
+PROFILE_SUFFIX = ".folded"
+PROFILE_NAME = re.compile(r"[\w.-]+\.folded")
+
+# Leaf frames of threads that are blocked waiting for work rather than running it
+_IDLE_FRAMES = {
+    ("threading.py", "wait"), ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"), ("queue.py", "get"), ("socket.py", "accept"),
+    ("connection.py", "_recv"), ("connection.py", "_poll"), ("base_events.py", "_run_once"),
+    ("thread.py", "_worker"), ("connection.py", "wait"),
+}
+
+_session = contextvars.ContextVar("profile_session", default=None)
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+
+
+def sample_stacks(exclude=()) -> list:
+    """Collapsed stacks of the busy threads of this process, rooted at the thread name."""
+    return list(_thread_stacks(exclude).values())
+
+
+def _thread_stacks(exclude=()) -> dict:
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    stacks = {}
+    for ident, frame in sys._current_frames().items():
+        if ident in exclude or (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in _IDLE_FRAMES:
+            continue
+        labels = []
+        while frame is not None:
+            labels.append(_frame_label(frame.f_code))
+            frame = frame.f_back
+        labels.append(names.get(ident, str(ident)).replace(";", ":"))
+        stacks[ident] = ";".join(reversed(labels))
+    return stacks
+
+
+class ProfileSession:
+    def __init__(self, task: asyncio.Task = None, all_threads: bool = False):
+        """
+        Stack samples of one request.
+        :param task: The request's task; the event loop thread is sampled while it is the one running.
+        :param all_threads: Sample every thread of the process, as in a worker process running one task.
+        """
+        self.counts = collections.Counter()  # collapsed stack -> samples
+        self.started = time.perf_counter()
+        self.task = task
+        self._loop = task.get_loop() if task is not None else None
+        self._loop_thread = threading.get_ident() if task is not None else None
+        # Threads working for the session -> how many times they have entered it; None for every thread
+        self.threads = None if all_threads else collections.Counter()
+
+    def samples(self, ident: int) -> bool:
+        if self.threads is None or self.threads[ident] > 0:
+            return True
+        # The event loop thread is shared by all requests
+        return ident == self._loop_thread and asyncio.current_task(self._loop) is self.task
+
+    def merge(self, counts: dict, prefix: str = None):
+        for stack, count in counts.items():
+            self.counts[f"{prefix};{stack}" if prefix else stack] += count
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.counts.most_common())
+
+
+class Sampler:
+    def __init__(self, interval: float):
+        """
+        Process-wide stack sampler shared by all open sessions.
+        :param interval: Seconds between samples.
+        """
+        self.interval = interval
+        self._sessions = []
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._thread = None
+
+    def start(self, session: ProfileSession) -> ProfileSession:
+        with self._lock:
+            self._sessions.append(session)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+                self._thread.start()
+            self._wake.notify()
+        return session
+
+    def stop(self, session: ProfileSession) -> ProfileSession:
+        with self._lock:
+            if session in self._sessions:
+                self._sessions.remove(session)
+        return session
+
+    @contextmanager
+    def attached(self, session: ProfileSession):
+        """Sample the calling thread into session, if not None, until the block exits."""
+        if session is None or session.threads is None:
+            yield
+            return
+        ident = threading.get_ident()
+        with self._lock:
+            session.threads[ident] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                session.threads[ident] -= 1
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            with self._lock:
+                # Sleep without sampling while nothing is being profiled
+                while not self._sessions:
+                    self._wake.wait()
+                sessions = list(self._sessions)
+            stacks = _thread_stacks(exclude={own})
+            with self._lock:
+                # Sessions stopped meanwhile are no longer updated, so their counts can be read safely
+                for session in sessions:
+                    if session in self._sessions:
+                        session.counts.update(stack for ident, stack in stacks.items() if session.samples(ident))
+            time.sleep(self.interval)
+
+
+sampler = Sampler(config.PROFILE_INTERVAL_MS / 1000)
+
+
+def current_session() -> ProfileSession:
+    return _session.get()
+
+
+def in_session(fn, *args, **kwargs):
+    """Call fn, sampling the calling thread into the session of the current context (if any) meanwhile."""
+    with sampler.attached(_session.get()):
+        return fn(*args, **kwargs)
+
+
+async def run_in_threadpool(fn, *args, **kwargs):
+    """starlette's run_in_threadpool, with the worker thread sampled for the request being profiled."""
+    # The worker thread runs in a copy of this context, so in_session() finds the request's session
+    return await _run_in_threadpool(in_session, fn, *args, **kwargs)
+
+
+def profile_call(fn, *args):
+    """Call fn(*args) under the sampler; returns (result, {collapsed stack: samples})."""
+    # Worker processes run one task at a time, so all of their threads work for it
+    session = sampler.start(ProfileSession(all_threads=True))
+    try:
+        result = fn(*args)
+    finally:
+        sampler.stop(session)
+    return result, dict(session.counts)
+
+
+def _slug(text: str) -> str:
+    return re.sub(r"[^\w-]+", "_", text).strip("_") or "root"
+
+
+def profile_name(method: str, route: str, seconds: float) -> str:
+    timestamp = datetime.now().strftime("%Y%m%dT%H%M%S")
+    return f"{timestamp}_{method}_{_slug(route)}_{seconds * 1000:.0f}ms_{uuid.uuid4().hex[:8]}{PROFILE_SUFFIX}"
+
+
+def save_profile(session: ProfileSession, name: str, directory: str = None, kept: int = None) -> str:
+    """Write a session's collapsed stacks, keeping only the newest `kept` profiles; returns the path."""
+    directory = directory or config.PROFILES_DIR
+    kept = kept or config.PROFILES_KEPT
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, name)
+    with open(path, "w") as f:
+        f.write(session.collapsed())
+    for old in list_profiles(directory)[kept:]:
+        try:
+            os.remove(os.path.join(directory, old["name"]))
+        except FileNotFoundError:
+            pass
+    return path
+
+
+def list_profiles(directory: str = None) -> list:
+    """Saved profiles, newest first."""
+    directory = directory or config.PROFILES_DIR
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in os.listdir(directory):
+        if PROFILE_NAME.fullmatch(name):
+            stat = os.stat(os.path.join(directory, name))
+            profiles.append({"name": name, "bytes": stat.st_size,
+                             "created": datetime.fromtimestamp(stat.st_mtime).isoformat()})
+    return sorted(profiles, key=lambda profile: profile["created"], reverse=True)
+
+
+class ProfilingMiddleware:
+    def __init__(self, app, threshold: float = None):
+        """
+        ASGI middleware sampling every request and saving the profiles of requests slower than
+        `threshold` seconds, or sent with an X-Profile header and the admin token (X-Admin-Token).
+        The latter learn the saved profile's name from the X-Profile response header; slow ones are
+        found with GET /admin/profiles.
+        """
+        self.app = app
+        self.threshold = config.PROFILE_THRESHOLD_SECONDS if threshold is None else threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        token = headers.get(ADMIN_TOKEN_HEADER.lower().encode())
+        # Otherwise any client could have its requests profiled and written to disk
+        forced = bool(headers.get(PROFILE_HEADER)) and admin_token_valid(token and token.decode("latin-1"))
+        session = sampler.start(ProfileSession(task=asyncio.current_task()))
+        token = _session.set(session)
+        name = None
+
+        async def send_with_profile(message):
+            nonlocal name
+            if forced and message["type"] == "http.response.start":
+                name = profile_name(scope["method"], _route(scope), time.perf_counter() - session.started)
+                message = {**message, "headers": [*message.get("headers", []), (b"x-profile", name.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_profile)
+        finally:
+            _session.reset(token)
+            sampler.stop(session)
+            elapsed = time.perf_counter() - session.started
+            if name is None and (forced or elapsed >= self.threshold):
+                name = profile_name(scope["method"], _route(scope), elapsed)
+            if name is not None:
+                await asyncio.to_thread(save_profile, session, name)
+
+
+def _route(scope) -> str:
+    return getattr(scope.get("route"), "path", scope["path"])
@@ -0,0 +1,131 @@
+# Response layer for analysis results.
+#
+# JSON is rendered by orjson, which serializes NumPy arrays and scalars natively instead of going
+# through FastAPI's generic encoder. Row-shaped results (predictions, per-column statistics) can
+# instead be streamed as NDJSON lines or Arrow IPC record batches, one chunk of rows at a time, so
+# large results are never held in memory whole. Clients pick the format with the `format` query
+# parameter or the Accept header.
+
+import io
+from typing import Iterator
+
+import numpy as np
+import orjson
+import pandas as pd
+import pyarrow as pa
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from app.utils.file_handler import ARROW_MEDIA_TYPE
+
+JSON_MEDIA_TYPE = "application/json"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+# Values of the `format` query parameter
+FORMATS = {"json": JSON_MEDIA_TYPE, "ndjson": NDJSON_MEDIA_TYPE, "arrow": ARROW_MEDIA_TYPE}
+
+
+def _default(obj):
+    # What orjson does not serialize natively
+    if isinstance(obj, (np.ndarray, pd.Series, pd.Index)):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if hasattr(obj, "isoformat"):
+        return obj.isoformat()
+    if obj is pd.NA or obj is pd.NaT:
+        return None
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content) -> bytes:
+    """JSON bytes; NaN and infinities become null."""
+    return orjson.dumps(content, default=_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def _match(media_range: str, offered: tuple):
+    if media_range == "*/*":
+        return offered[0]
+    if media_range.endswith("/*"):
+        return next((media_type for media_type in offered if media_type.startswith(media_range[:-1])), None)
+    return media_range if media_range in offered else None
+
+
+def negotiate(request: Request, format: str = None, offered: tuple = tuple(FORMATS.values())) -> str:
+    """
+    Media type of the response: the one named by `format` if given, else the offered type the Accept
+    header ranks highest. The first offered one (JSON) is used without an Accept header, or when it
+    names none of the offered types, as clients sending e.g. text/plain got JSON before.
+    Raises HTTPException 400 for an unknown format.
+    """
+    if format is not None:
+        if FORMATS.get(format) not in offered:
+            names = [name for name, media_type in FORMATS.items() if media_type in offered]
+            raise HTTPException(status_code=400, detail=f"Unsupported format: {format}; use one of {', '.join(names)}.")
+        return FORMATS[format]
+    accept = request.headers.get("accept")
+    best, best_q = offered[0], 0.0
+    for part in (accept or "").split(","):
+        media_range, *params = [piece.strip() for piece in part.split(";")]
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        media_type = _match(media_range.lower(), offered)
+        # Earlier ranges win ties
+        if media_type is not None and q > best_q:
+            best, best_q = media_type, q
+    return best
+
+
+def _drain(sink: io.BytesIO) -> bytes:
+    data = sink.getvalue()
+    sink.seek(0)
+    sink.truncate()
+    return data
+
+
+def _ndjson(frames: Iterator[pd.DataFrame]) -> Iterator[bytes]:
+    for frame in frames:
+        if len(frame):
+            yield frame.to_json(orient="records", lines=True, date_format="iso", double_precision=15).encode()
+
+
+def _arrow(frames: Iterator[pd.DataFrame]) -> Iterator[bytes]:
+    sink = io.BytesIO()
+    writer = None
+    for frame in frames:
+        batch = pa.RecordBatch.from_pandas(frame, preserve_index=False)
+        if writer is None:
+            # The first frame fixes the schema, so it is sent even when empty
+            writer = pa.ipc.new_stream(sink, batch.schema)
+        writer.write_batch(batch)
+        yield _drain(sink)
+    if writer is not None:
+        writer.close()
+        yield _drain(sink)
+
+
+def stream_frames(frames: Iterator[pd.DataFrame], media_type: str, headers: dict = None) -> StreamingResponse:
+    """
+    Stream DataFrame chunks as NDJSON (one object per row) or as an Arrow IPC stream (one record
+    batch per chunk). Chunks are produced lazily, on a worker thread, as the client reads.
+    """
+    encode = _arrow if media_type == ARROW_MEDIA_TYPE else _ndjson
+    return StreamingResponse(encode(frames), media_type=media_type, headers=headers)
+
+
+def frame_chunks(df: pd.DataFrame, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """Slices of `chunk_rows` rows; an empty frame yields itself, so streams keep their schema."""
+    for start in range(0, max(len(df), 1), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
@@ -0,0 +1,41 @@
+# Benchmarks are slow and machine-dependent, so they only run when asked for:
+#
+#   RUN_BENCHMARKS=1 [BENCHMARK_SCALE=small|medium|large] python -m pytest tests/benchmarks
+#
+# Each run writes .benchmarks/latest.json and fails benchmarks that regress by more than
+# BENCHMARK_THRESHOLD against baseline.json; BENCHMARK_SAVE=1 stores the run as the new baseline.
+
+import os
+
+import pytest
+
+from tests.benchmarks import harness
+
+if not os.getenv("RUN_BENCHMARKS"):
+    collect_ignore_glob = ["test_*.py"]
+
+
+@pytest.fixture(scope="session")
+def benchmark_results():
+    results = {}
+    yield results
+    harness.write_results(results, harness.RESULTS_PATH)
+    if os.getenv("BENCHMARK_SAVE"):
+        harness.write_results(results, harness.BASELINE_PATH)
+
+
+@pytest.fixture
+def bench(request, benchmark_results):
+    """Measure a callable under the test's id and fail on a regression against the baseline."""
+    baseline = {} if os.getenv("BENCHMARK_SAVE") else harness.load_baseline()
+
+    def run(fn, rounds: int = 1):
+        name = request.node.name
+        measurement = harness.measure(fn, rounds)
+        benchmark_results[name] = measurement
+        problems = harness.regressions(name, measurement, baseline)
+        if problems:
+            pytest.fail("Benchmark regression: " + "; ".join(problems))
+        return measurement
+
+    return run
@@ -0,0 +1,73 @@
+# Synthetic datasets for the benchmarks: mixed dtypes with controlled null and duplicate rates.
+
+import functools
+import io
+import os
+
+import numpy as np
+import pandas as pd
+
+# (rows, columns) shapes run at each BENCHMARK_SCALE
+SCALES = {
+    "small": [(10_000, 10), (10_000, 100)],
+    "medium": [(1_000_000, 10), (100_000, 100), (10_000, 1000)],
+    "large": [(10_000_000, 10), (1_000_000, 100), (100_000, 1000)],
+}
+
+
+def shapes():
+    scale = os.getenv("BENCHMARK_SCALE", "small")
+    if scale not in SCALES:
+        raise ValueError(f"BENCHMARK_SCALE must be one of {', '.join(SCALES)}")
+    return SCALES[scale]
+
+
+def shape_id(shape) -> str:
+    return "{}x{}".format(*shape)
+
+
+@functools.lru_cache(maxsize=4)
+def make_dataset(rows: int, columns: int, null_rate: float = 0.05, duplicate_rate: float = 0.05,
+                 categories: int = 20, seed: int = 0) -> pd.DataFrame:
+    """
+    Columns cycle through float64, int64 and string categories of the given cardinality.
+    Nulls are injected into float and string columns; duplicate_rate of the rows are
+    exact copies of other rows. Cached, so treat the result as read-only.
+    """
+    rng = np.random.default_rng(seed)
+    labels = np.array([f"cat{i}" for i in range(categories)], dtype=object)
+    data = {}
+    for i in range(columns):
+        kind = i % 3
+        if kind == 0:
+            values = rng.normal(100, 15, rows)
+            values[rng.random(rows) < null_rate] = np.nan
+        elif kind == 1:
+            values = rng.integers(0, 1_000_000, rows)
+        else:
+            values = labels[rng.integers(0, categories, rows)]
+            values[rng.random(rows) < null_rate] = None
+        data[f"{('num', 'int', 'cat')[kind]}{i}"] = values
+    df = pd.DataFrame(data)
+
+    duplicates = int(rows * duplicate_rate)
+    if duplicates:
+        source = rng.choice(rows, duplicates, replace=False)
+        target = rng.choice(rows, duplicates, replace=False)
+        df.iloc[target] = df.iloc[source].to_numpy()
+        df = df.astype({col: 'int64' for col in df.columns if col.startswith('int')})
+    return df
+
+
+@functools.lru_cache(maxsize=4)
+def make_csv(rows: int, columns: int) -> bytes:
+    buffer = io.StringIO()
+    make_dataset(rows, columns).to_csv(buffer, index=False)
+    return buffer.getvalue().encode()
+
+
+@functools.lru_cache(maxsize=4)
+def make_parquet(rows: int, columns: int, row_group_size: int = 10_000) -> bytes:
+    buffer = io.BytesIO()
+    make_dataset(rows, columns).to_parquet(buffer, row_group_size=row_group_size)
+    return buffer.getvalue()
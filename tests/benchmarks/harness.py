@@ -0,0 +1,126 @@
+# Timing, peak memory and baseline comparison for the benchmarks.
+
+import gc
+import json
+import os
+import platform
+import resource
+import threading
+import time
+from typing import NamedTuple
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+RESULTS_PATH = os.path.join(".benchmarks", "latest.json")
+
+# Allowed slowdown (and memory growth) over the baseline before a benchmark fails
+THRESHOLD = float(os.getenv("BENCHMARK_THRESHOLD", "0.25"))
+# Time differences below this are noise whatever the ratio
+MIN_SECONDS = 0.05
+MIN_RSS_MB = 16
+
+
+class Measurement(NamedTuple):
+    seconds: float  # best wall time over the rounds
+    peak_rss_mb: float  # peak resident memory above the starting point, this process and its children
+
+
+def _rss_bytes(pid="self") -> int:
+    with open(f"/proc/{pid}/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def _children(pid) -> list:
+    children = []
+    try:
+        for task in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{task}/children") as f:
+                children += f.read().split()
+    except OSError:
+        return []
+    return children + [grandchild for child in children for grandchild in _children(child)]
+
+
+def total_rss_bytes() -> int:
+    """RSS of this process plus its worker processes; falls back to the process peak without /proc."""
+    try:
+        total = _rss_bytes()
+    except OSError:
+        # ru_maxrss is in KiB on Linux and bytes on macOS
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if platform.system() == "Darwin" else maxrss * 1024
+    for child in _children(os.getpid()):
+        try:
+            total += _rss_bytes(child)
+        except OSError:
+            pass
+    return total
+
+
+class _PeakSampler(threading.Thread):
+    def __init__(self, interval: float = 0.005):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = total_rss_bytes()
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.is_set():
+            self.peak = max(self.peak, total_rss_bytes())
+            self._done.wait(self.interval)
+
+    def stop(self) -> int:
+        self._done.set()
+        self.join()
+        return max(self.peak, total_rss_bytes())
+
+
+def measure(fn, rounds: int = 1) -> Measurement:
+    """Call fn() `rounds` times, sampling RSS in the background."""
+    best, peak = float("inf"), 0.0
+    for _ in range(rounds):
+        gc.collect()
+        start_rss = total_rss_bytes()
+        sampler = _PeakSampler()
+        sampler.start()
+        start = time.perf_counter()
+        try:
+            fn()
+        finally:
+            elapsed = time.perf_counter() - start
+            peak_bytes = sampler.stop()
+        best = min(best, elapsed)
+        peak = max(peak, (peak_bytes - start_rss) / 2 ** 20)
+    return Measurement(best, peak)
+
+
+def load_baseline() -> dict:
+    if not os.path.exists(BASELINE_PATH):
+        return {}
+    with open(BASELINE_PATH) as f:
+        return json.load(f)["results"]
+
+
+def regressions(name: str, measurement: Measurement, baseline: dict) -> list:
+    """Describe each metric that exceeds its baseline by more than THRESHOLD."""
+    previous = baseline.get(name)
+    if previous is None:
+        return []
+    problems = []
+    if measurement.seconds > max(previous["seconds"] * (1 + THRESHOLD), previous["seconds"] + MIN_SECONDS):
+        problems.append(f"{name}: {measurement.seconds:.3f}s vs baseline {previous['seconds']:.3f}s")
+    if measurement.peak_rss_mb > max(previous["peak_rss_mb"] * (1 + THRESHOLD), previous["peak_rss_mb"] + MIN_RSS_MB):
+        problems.append(f"{name}: {measurement.peak_rss_mb:.0f} MiB vs baseline {previous['peak_rss_mb']:.0f} MiB")
+    return problems
+
+
+def write_results(results: dict, path: str):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    existing = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            existing = json.load(f)["results"]
+    existing.update({name: m._asdict() for name, m in results.items()})
+    with open(path, "w") as f:
+        json.dump({"python": platform.python_version(), "machine": platform.machine(),
+                   "results": dict(sorted(existing.items()))}, f, indent=2)
+        f.write("\n")
@@ -0,0 +1,75 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.dataset_store import dataset_store
+from app.services.profiling import profile_cache
+from app.services.result_cache import result_cache
+from tests.benchmarks.datasets import make_csv, shape_id, shapes
+
+SHAPES = pytest.mark.parametrize("shape", shapes(), ids=shape_id)
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(app) as client:
+        # Start the compute workers up front so pool startup is not timed
+        client.post("/descriptive/", files={"file": ("warmup.csv", b"x\n1\n2\n")}).raise_for_status()
+        yield client
+
+
+def upload(client, shape) -> str:
+    response = client.post("/datasets/", files={"file": ("data.csv", make_csv(*shape))})
+    assert response.status_code == 200
+    return response.json()["dataset_id"]
+
+
+@SHAPES
+def test_upload_dataset(bench, client, shape):
+    contents = make_csv(*shape)
+
+    def run():
+        # Drop the stored copy so every round parses the upload again
+        dataset_store.clear()
+        client.post("/datasets/", files={"file": ("data.csv", contents)}).raise_for_status()
+
+    bench(run)
+
+
+@SHAPES
+def test_descriptive_endpoint(bench, client, shape):
+    dataset_id = upload(client, shape)
+
+    def run():
+        # Measure the computation, not a cached result
+        profile_cache.clear()
+        result_cache.clear()
+        client.post("/descriptive/", params={"dataset_id": dataset_id}).raise_for_status()
+
+    bench(run)
+
+
+@SHAPES
+def test_descriptive_endpoint_stream(bench, client, shape):
+    contents = make_csv(*shape)
+
+    def run():
+        result_cache.clear()
+        client.post("/descriptive/", params={"stream": True, "exact": False},
+                    files={"file": ("data.csv", contents)}).raise_for_status()
+
+    bench(run)
+
+
+@SHAPES
+def test_process_endpoint(bench, client, shape):
+    dataset_id = upload(client, shape)
+    bench(lambda: client.post("/process/", params={"dataset_id": dataset_id}).raise_for_status())
+
+
+@pytest.mark.parametrize("shape", [s for s in shapes() if s[1] <= 100], ids=shape_id)
+def test_generate_report_endpoint(bench, client, shape):
+    dataset_id = upload(client, shape)
+    bench(lambda: client.post("/generate_report/", params={
+        "dataset_id": dataset_id, "chart_backend": "matplotlib", "download": True,
+    }).raise_for_status())
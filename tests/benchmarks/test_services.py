@@ -0,0 +1,157 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.analysis_engine import AnalysisEngine
+from app.services.chart_renderer import ChartRenderer
+from app.services.data_processing import clean_data, preprocess_data
+from app.services.profiling import build_profile
+from app.services.query_plan import plan_query
+from app.services.report_generator import ReportGenerator
+from app.utils.file_handler import read_file, read_file_chunks
+from app import config
+from tests.benchmarks import harness
+from tests.benchmarks.datasets import make_csv, make_dataset, make_parquet, shape_id, shapes
+
+SHAPES = pytest.mark.parametrize("shape", shapes(), ids=shape_id)
+# One chart per column makes wide reports dominated by rendering, so they are left out
+REPORT_SHAPES = pytest.mark.parametrize("shape", [s for s in shapes() if s[1] <= 100], ids=shape_id)
+
+
+def feature_columns(df, count=3):
+    return [col for col in df.columns if col.startswith(('num', 'int'))][1:count + 1]
+
+
+@SHAPES
+def test_read_csv(bench, shape):
+    contents = make_csv(*shape)
+    bench(lambda: read_file(io.BytesIO(contents), "data.csv"))
+
+
+def regression_plan(df, where=None):
+    # What /decision_tree/ reads: three features and a target, whatever the file's width
+    return plan_query([*feature_columns(df), 'int1'], where)
+
+
+@SHAPES
+def test_read_csv_projected(bench, shape):
+    contents = make_csv(*shape)
+    plan = regression_plan(make_dataset(*shape))
+    bench(lambda: plan.read(io.BytesIO(contents), "data.csv"))
+
+
+@SHAPES
+def test_read_csv_filtered(bench, shape):
+    contents = make_csv(*shape)
+    plan = regression_plan(make_dataset(*shape), "int1<100000")
+    bench(lambda: plan.read(io.BytesIO(contents), "data.csv"))
+
+
+@SHAPES
+def test_read_parquet(bench, shape):
+    contents = make_parquet(*shape)
+    bench(lambda: read_file(io.BytesIO(contents), "data.parquet"))
+
+
+@SHAPES
+def test_read_parquet_projected(bench, shape):
+    contents = make_parquet(*shape)
+    plan = regression_plan(make_dataset(*shape))
+    bench(lambda: plan.read(io.BytesIO(contents), "data.parquet"))
+
+
+@SHAPES
+def test_read_parquet_filtered(bench, shape):
+    contents = make_parquet(*shape)
+    plan = regression_plan(make_dataset(*shape), "int1<100000")
+    bench(lambda: plan.read(io.BytesIO(contents), "data.parquet"))
+
+
+@SHAPES
+def test_read_csv_chunks(bench, shape):
+    contents = make_csv(*shape)
+    bench(lambda: sum(len(chunk) for chunk in read_file_chunks(io.BytesIO(contents), "data.csv")))
+
+
+@SHAPES
+def test_clean_data(bench, shape):
+    df = make_dataset(*shape)
+    bench(lambda: clean_data(df))
+
+
+@SHAPES
+def test_preprocess_data(bench, shape):
+    df = make_dataset(*shape)
+    bench(lambda: preprocess_data(df.copy()))
+
+
+@SHAPES
+def test_profile(bench, shape):
+    df = make_dataset(*shape)
+    bench(lambda: build_profile(df))
+
+
+@SHAPES
+def test_descriptive_statistics(bench, shape):
+    df = make_dataset(*shape)
+    bench(lambda: AnalysisEngine(df).descriptive_statistics())
+
+
+@SHAPES
+def test_descriptive_statistics_approximate(bench, shape):
+    df = make_dataset(*shape)
+    bench(lambda: AnalysisEngine(df).descriptive_statistics(exact=False))
+
+
+@SHAPES
+def test_linear_regression(bench, shape):
+    df = make_dataset(*shape)
+    columns = feature_columns(df)
+    data = df[columns + ['int1']].dropna()
+    bench(lambda: AnalysisEngine(data).linear_regression('int1'))
+
+
+@SHAPES
+def test_decision_tree_regression(bench, shape):
+    df = make_dataset(*shape)
+    columns = feature_columns(df)
+    data = df[columns + ['int1']].dropna()
+    bench(lambda: AnalysisEngine(data).decision_tree_regression('int1', columns))
+
+
+@REPORT_SHAPES
+def test_create_report(bench, shape):
+    df = make_dataset(*shape)
+    bench(lambda: ReportGenerator(df, chart_backend="matplotlib").create_report(io.BytesIO()))
+
+
+def bar_charts(count: int = 3):
+    # Distinct series, so every round renders instead of hitting the image cache
+    rng = np.random.default_rng(0)
+    return [(f"chart{i}", "bar", pd.Series(rng.normal(100, 15, config.CHART_MAX_POINTS), name="value"))
+            for i in range(count)]
+
+
+def warm_renderer(backend: str) -> ChartRenderer:
+    renderer = ChartRenderer(backend, workers=1, cache_entries=0)
+    # Imports, and for plotly the Kaleido process, are paid once per process, not per chart
+    renderer.render([("warmup", "bar", pd.Series([1.0, 2.0], name="value"))])
+    return renderer
+
+
+@pytest.mark.parametrize("backend", ["matplotlib", "plotly"])
+def test_render_bar_charts(bench, backend):
+    renderer = warm_renderer(backend)
+    bench(lambda: renderer.render(bar_charts()), rounds=2)
+
+
+def test_matplotlib_renders_faster_than_plotly():
+    # The matplotlib backend is meant as the lower-latency one, at the largest series reports chart
+    seconds = {}
+    for backend in ("matplotlib", "plotly"):
+        renderer = warm_renderer(backend)
+        seconds[backend] = harness.measure(lambda: renderer.render(bar_charts()), rounds=2).seconds
+    assert seconds["matplotlib"] < seconds["plotly"]
+
@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+from app.services.accumulators import ColumnStatsAccumulator, KLLSketch, MomentsAccumulator
+from app.services.analysis_engine import AnalysisEngine
+
+
+def exact_statistics(df):
+    numeric = df.select_dtypes(include='number')
+    return {
+        "mean": numeric.mean().to_dict(),
+        "median": numeric.median().to_dict(),
+        "std_dev": numeric.std().to_dict(),
+        "min": numeric.min().to_dict(),
+        "max": numeric.max().to_dict(),
+        "count": numeric.count().to_dict(),
+    }
+
+
+def split(df, parts):
+    bounds = np.linspace(0, len(df), parts + 1).astype(int)
+    return [df.iloc[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])]
+
+
+def make_data(rows=20000, seed=1):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'normal': rng.normal(100, 15, rows),
+        'skewed': rng.lognormal(0, 1, rows),
+        'ints': rng.integers(0, 1000, rows),
+        'label': rng.choice(['a', 'b'], rows),
+    })
+    df.loc[df.sample(frac=0.1, random_state=seed).index, 'normal'] = np.nan
+    return df
+
+
+def test_exact_matches_pandas():
+    df = make_data()
+    result = AnalysisEngine(df).descriptive_statistics()
+    expected = exact_statistics(df)
+    for stat in expected:
+        for col, value in expected[stat].items():
+            assert np.isclose(result[stat][col], value, rtol=1e-9), (stat, col)
+    assert isinstance(result['min']['ints'], int)
+
+
+def test_approximate_median_within_rank_error():
+    df = make_data()
+    error = 0.01
+    result = AnalysisEngine(df).descriptive_statistics(exact=False, error=error)
+    for col in ('normal', 'skewed', 'ints'):
+        values = df[col].dropna().to_numpy()
+        rank = np.searchsorted(np.sort(values), result['median'][col]) / len(values)
+        assert abs(rank - 0.5) <= error, col
+        assert result['count'][col] == len(values)
+
+
+def test_chunked_and_sharded_states_merge():
+    df = make_data()
+    expected = exact_statistics(df)
+
+    shards = []
+    for shard in split(df, 4):
+        accumulator = ColumnStatsAccumulator(exact=False)
+        for chunk in split(shard, 3):
+            accumulator.update(chunk)
+        shards.append(accumulator)
+    merged = shards[0]
+    for other in shards[1:]:
+        merged.merge(other)
+
+    result = merged.summary()
+    for stat in ('mean', 'std_dev', 'min', 'max', 'count'):
+        for col, value in expected[stat].items():
+            assert np.isclose(result[stat][col], value, rtol=1e-9), (stat, col)
+
+
+def test_moments_merge_handles_new_columns():
+    a, b = MomentsAccumulator(), MomentsAccumulator()
+    a.update(['x'], np.array([[1.0], [2.0]]))
+    b.update(['y', 'x'], np.array([[5.0, 3.0], [7.0, np.nan]]))
+    a.merge(b)
+    assert a.columns == ['x', 'y']
+    assert a.count.tolist() == [3, 2]
+    assert a.mean.tolist() == [2.0, 6.0]
+
+
+def test_sketch_memory_is_bounded():
+    sketch = KLLSketch(error=0.02)
+    for _ in range(20):
+        sketch.update(np.random.default_rng(0).random(50000))
+    assert sketch.count == 1000000
+    assert sum(len(c) for c in sketch.compactors) < 3 * sketch.k
+    assert abs(sketch.quantile(0.9) - 0.9) <= 0.02
@@ -0,0 +1,169 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import config
+from app.routes import analysis
+from app.services.aggregation import GroupedAggregator, factorize_keys
+from app.services.analysis_engine import AnalysisEngine
+from app.services.executor import ComputeExecutor
+from app.services.model_registry import ModelRegistry
+
+
+@pytest.fixture
+def sales():
+    rng = np.random.default_rng(0)
+    n = 5000
+    df = pd.DataFrame({
+        "region": rng.choice(["north", "south", "east", None], n),
+        "customer": rng.integers(0, 20, n),
+        "time": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 10 * 86400, n), unit="s"),
+        "amount": rng.normal(100, 10, n),
+        "quantity": rng.integers(0, 5, n).astype(float),
+    })
+    df.loc[::7, "amount"] = np.nan
+    return df
+
+
+def expected(df: pd.DataFrame, keys: list, column: str) -> pd.DataFrame:
+    return df.dropna(subset=keys).groupby(keys)[column].agg(["count", "sum", "mean", "std", "min", "max"])
+
+
+def assert_quantiles(result: pd.DataFrame, df: pd.DataFrame, keys: list, column: str, quantiles: list):
+    # Sketched quantiles are values of the group ranked within the error bound of q
+    tolerance = 3 * config.QUANTILE_ERROR
+    for key, values in df.dropna(subset=keys).groupby(keys)[column]:
+        values = values.dropna().to_numpy()
+        for q in quantiles:
+            estimate = result.loc[key, f"{column}_p{q * 100:g}"]
+            if not values.size:
+                assert np.isnan(estimate)
+                continue
+            assert (values < estimate).mean() - tolerance <= q <= (values <= estimate).mean() + tolerance
+
+
+def test_factorize_keys():
+    codes, keys, valid = factorize_keys([pd.Series(["a", "b", "a", None, "b"]), pd.Series([1, 1, 1, 2, 2])])
+    assert codes.tolist() == [0, 1, 0, 2] and valid.tolist() == [True, True, True, False, True]
+    assert [list(values) for values in keys] == [["a", "b", "b"], [1, 1, 2]]
+
+
+def test_grouped_statistics_match_pandas(sales):
+    aggregator = GroupedAggregator(["region", "customer"], ["amount", "quantity"], "time", "1D", quantiles=[0.9, 0.5])
+    # Chunk by chunk, as for streamed uploads and appended rows
+    for start in range(0, len(sales), 1200):
+        aggregator.update(sales.iloc[start:start + 1200])
+    result = aggregator.result().set_index(["region", "customer", "window"])
+
+    sales = sales.assign(window=sales["time"].dt.floor("1D"))
+    want = expected(sales, ["region", "customer", "window"], "amount")
+    assert result.index.equals(want.index)
+    for name in want.columns:
+        np.testing.assert_allclose(result[f"amount_{name}"], want[name])
+    assert_quantiles(result, sales, ["region", "customer", "window"], "amount", [0.5, 0.9])
+    assert aggregator.rows == sales["region"].notna().sum() == result["rows"].sum()
+
+
+def test_shards_merge_to_the_whole(sales):
+    whole = GroupedAggregator(["region"], quantiles=[0.5])
+    whole.update(sales)
+    first, second = GroupedAggregator(["region"], quantiles=[0.5]), GroupedAggregator(["region"], quantiles=[0.5])
+    first.update(sales.iloc[:1000])
+    second.update(sales.iloc[1000:])
+    first.merge(second)
+    merged = first.result()
+    pd.testing.assert_frame_equal(merged.drop(columns=merged.filter(like="_p50").columns),
+                                  whole.result().drop(columns=merged.filter(like="_p50").columns))
+    for column in ("customer", "amount", "quantity"):
+        assert_quantiles(merged.set_index("region"), sales, "region", column, [0.5])
+    assert whole.value_columns == ["customer", "amount", "quantity"]
+
+    with pytest.raises(ValueError):
+        first.merge(GroupedAggregator(["customer"]))
+
+
+def test_rolling_windows(sales):
+    aggregator = GroupedAggregator(["region"], ["amount"], "time", "1D")
+    aggregator.update(sales)
+    result = aggregator.result(rolling=3)
+
+    sales = sales.dropna(subset=["region"]).assign(window=sales["time"].dt.floor("1D"))
+    for row in result.itertuples():
+        rows = sales[(sales["region"] == row.region) & (sales["window"] <= row.window)
+                     & (sales["window"] > row.window - pd.Timedelta("3D"))]
+        assert row.rows == len(rows)
+        assert row.amount_sum == pytest.approx(rows["amount"].sum())
+        assert row.amount_std == pytest.approx(rows["amount"].std())
+        assert row.amount_max == rows["amount"].max()
+
+    with pytest.raises(ValueError):
+        GroupedAggregator(["region"]).result(rolling=3)
+
+
+def test_windows_only_and_invalid_specs():
+    df = pd.DataFrame({"time": ["2024-01-01T00:10:00Z", "2024-01-01T00:50:00Z", "2024-01-01T01:05:00Z", "bad"],
+                       "value": [1.0, 2.0, 3.0, 4.0]})
+    result = AnalysisEngine(df).grouped_aggregation([], time_column="time", window="1h")
+    assert result["window"].dt.hour.tolist() == [0, 1] and result["value_sum"].tolist() == [3.0, 3.0]
+
+    for spec in ({"group_by": []}, {"group_by": ["a"], "window": "1h"}, {"group_by": ["a"], "quantiles": [2]},
+                 {"group_by": [], "time_column": "t", "window": "often"}):
+        with pytest.raises(ValueError):
+            GroupedAggregator(**spec)
+    with pytest.raises(ValueError):
+        AnalysisEngine(pd.DataFrame({"a": [1], "b": ["x"]})).grouped_aggregation(["a"], ["b"])
+
+
+def test_appending_updates_an_aggregation(sales):
+    engine = AnalysisEngine(sales.iloc[:3000])
+    model = engine.fit_aggregation(["region"], ["amount"], "time", "1D")
+    appended = AnalysisEngine(sales.iloc[3000:]).fit_aggregation(None, model=model)
+    assert model.metrics["rows"] < appended.metrics["rows"] == sales["region"].notna().sum()
+    pd.testing.assert_frame_equal(appended.estimator.result(),
+                                  AnalysisEngine(sales).grouped_aggregation(["region"], ["amount"], "time", "1D"))
+
+
+def test_aggregate_endpoint(sales, tmp_path, monkeypatch):
+    monkeypatch.setattr(analysis, "model_registry", ModelRegistry(str(tmp_path), 16, 16))
+    monkeypatch.setattr(analysis, "compute", ComputeExecutor("thread", 2, 8, 60))
+    # Small shards, so the dataset is split across both workers
+    monkeypatch.setattr(config, "AGGREGATION_SHARD_ROWS", 1000)
+    app = FastAPI()
+    app.include_router(analysis.router)
+    client = TestClient(app)
+
+    def upload(df):
+        return {"file": ("sales.csv", df.to_csv(index=False).encode(), "text/csv")}
+
+    params = {"group_by": "region", "columns": "amount", "quantiles": "0.5,0.9"}
+    response = client.post("/aggregate/", params=params, files=upload(sales.iloc[:4000]))
+    assert response.status_code == 200
+    body = response.json()
+    want = expected(sales.iloc[:4000], ["region"], "amount")
+    assert [row["region"] for row in body["result"]] == want.index.tolist()
+    assert_quantiles(pd.DataFrame(body["result"]).set_index("region"), sales.iloc[:4000], "region", "amount", [0.5, 0.9])
+
+    response = client.post(f"/aggregate/{body['aggregation_id']}/append", params={"format": "arrow"},
+                           files=upload(sales.iloc[4000:]))
+    assert response.status_code == 200
+    table = pa.ipc.open_stream(response.content).read_all().to_pandas()
+    np.testing.assert_allclose(table["amount_mean"], expected(sales, ["region"], "amount")["mean"])
+
+    aggregation_id = response.headers["x-aggregation-id"]
+    assert client.get(f"/aggregate/{aggregation_id}").json()["rows"] == sales["region"].notna().sum()
+    assert client.get("/aggregate/" + "0" * 64).status_code == 404
+    assert client.post("/aggregate/", params={"group_by": "region", "window": "1h"},
+                       files=upload(sales)).status_code == 400
+
+
+def test_quantile_state_is_bounded():
+    df = pd.DataFrame({"group": np.zeros(200000, dtype=int), "value": np.arange(200000.0)})
+    aggregator = GroupedAggregator(["group"], ["value"], quantiles=[0.5])
+    for start in range(0, len(df), 50000):
+        aggregator.update(df.iloc[start:start + 50000])
+    items, _ = aggregator._sketches[0][0].weighted_items()
+    assert len(items) < 2000
+    assert aggregator.result()["value_p50"][0] == pytest.approx(100000, rel=3 * config.QUANTILE_ERROR)
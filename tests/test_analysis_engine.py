@@ -1,4 +1,5 @@
 import unittest
+import numpy as np
 import pandas as pd
 from app.services.analysis_engine import AnalysisEngine
 
@@ -33,6 +34,34 @@ class TestAnalysisEngine(unittest.TestCase):
         self.assertIn('predictions', result)
         self.assertIn('r_squared', result)
 
+    def test_tree_models_with_limits(self):
+        for model in ('decision_tree', 'random_forest', 'gradient_boosting'):
+            fitted = self.analysis_engine.fit_tree_model('target', ['feature1', 'feature2'], model=model,
+                                                         params={'max_depth': 2, 'max_leaf_nodes': None})
+            self.assertEqual(fitted.algorithm, model)
+            self.assertEqual(fitted.params, {'max_depth': 2})
+            self.assertIn('r_squared', fitted.metrics)
+            self.assertEqual(len(fitted.predict(self.data)), 5)
+
+    def test_tree_model_rejects_bad_options(self):
+        with self.assertRaises(ValueError):
+            self.analysis_engine.fit_tree_model('target', ['feature1'], model='svm')
+        with self.assertRaises(ValueError):
+            self.analysis_engine.fit_tree_model('target', ['feature1'], params={'n_estimators': 10})
+        with self.assertRaises(ValueError):
+            self.analysis_engine.fit_tree_model('target', ['feature1'], search=True)
+
+    def test_tree_search_on_sampled_rows(self):
+        rng = np.random.default_rng(0)
+        data = pd.DataFrame({'x': rng.random(400), 'noise': rng.random(400)})
+        data['y'] = (data['x'] * 4).round()
+        fitted = AnalysisEngine(data).fit_tree_model('y', ['x', 'noise'], model='random_forest',
+                                                     params={'n_estimators': 10}, search=True, sample_rows=200)
+        self.assertEqual(fitted.metrics['rows_used'], 200)
+        self.assertGreater(fitted.metrics['cv_r_squared'], 0.9)
+        self.assertEqual(fitted.params['n_estimators'], 10)
+        self.assertIn('max_depth', fitted.metrics['best_params'])
+
     def test_invalid_data(self):
         empty_df = pd.DataFrame()
         analysis_engine = AnalysisEngine(empty_df)
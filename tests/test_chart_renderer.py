@@ -0,0 +1,37 @@
+import pandas as pd
+import pytest
+from app.services.chart_renderer import ChartRenderer
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+@pytest.mark.parametrize('backend', ['plotly', 'matplotlib'])
+def test_render_returns_png_bytes(backend):
+    renderer = ChartRenderer(backend, workers=2, cache_entries=8)
+    df = pd.DataFrame({'value': [1, 3, 2], 'label': ['a', 'b', 'a']})
+    images = renderer.render([('value', 'bar', df['value']), ('label', 'pie', df['label'].value_counts())])
+
+    assert list(images) == ['value', 'label']
+    assert all(image.data.startswith(PNG_SIGNATURE) for image in images.values())
+    assert all((image.width, image.height) == (700, 500) for image in images.values())
+
+
+def test_unchanged_data_is_served_from_cache():
+    renderer = ChartRenderer('matplotlib', workers=1, cache_entries=8)
+    series = pd.Series([1, 2, 3], name='value')
+    first = renderer.render([('value', 'bar', series)])
+    second = renderer.render([('value', 'bar', series.copy())])
+
+    assert first == second
+    assert renderer.stats == {'hits': 1, 'misses': 1}
+
+    renderer.render([('value', 'bar', series + 1)])
+    assert renderer.stats['misses'] == 2
+
+
+def test_progress_is_reported():
+    renderer = ChartRenderer('matplotlib', workers=2, cache_entries=8)
+    calls = []
+    renderer.render([(name, 'bar', pd.Series([1, 2], name=name)) for name in 'abc'],
+                    progress=lambda done, total: calls.append((done, total)))
+    assert calls[0] == (0, 3) and calls[-1] == (3, 3)
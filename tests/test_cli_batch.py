@@ -0,0 +1,116 @@
+import json
+
+import httpx
+import pytest
+from rich.console import Console
+
+from app.cli.batch import BatchJob, BatchRunner, analysis_params, jobs_from_glob, jobs_from_manifest
+
+
+class FakeServer:
+    """Handler for httpx.MockTransport mimicking the dataset and analysis routes."""
+
+    def __init__(self, fail_first=0, forget=(), report_statuses=()):
+        self.requests = []
+        self.datasets = {}
+        self.fail_first = fail_first
+        self.forget = set(forget)
+        self.report_statuses = list(report_statuses)
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        if self.fail_first:
+            self.fail_first -= 1
+            return httpx.Response(503, json={"detail": "Compute worker crashed, retry later."})
+        if request.url.path == "/datasets/":
+            dataset_id = f"d{len(self.datasets)}"
+            self.datasets[dataset_id] = request.content
+            return httpx.Response(200, json={"dataset_id": dataset_id})
+        dataset_id = request.url.params["dataset_id"]
+        if dataset_id in self.forget:
+            self.forget.discard(dataset_id)
+            return httpx.Response(404, json={"detail": "Dataset not found."})
+        if request.url.path == "/generate_report/" and self.report_statuses:
+            return httpx.Response(self.report_statuses.pop(0), json={"detail": "Busy."})
+        if request.url.path == "/generate_report/":
+            return httpx.Response(200, json={"report_id": f"report_{dataset_id}.pdf"})
+        if "missing" in request.url.params.get("x", ""):
+            return httpx.Response(400, json={"detail": "Invalid column names."})
+        return httpx.Response(200, json={"slope": 2.0, "dataset_id": dataset_id})
+
+    def paths(self):
+        return [request.url.path for request in self.requests]
+
+
+def run(jobs, server, retries=3):
+    runner = BatchRunner("http://test", concurrency=2, retries=retries, backoff=0,
+                         console=Console(quiet=True), transport=httpx.MockTransport(server))
+    return runner.run(jobs)
+
+
+@pytest.fixture
+def files(tmp_path):
+    for name in ("a.csv", "b.csv", "c.csv"):
+        (tmp_path / name).write_text(f"x,y\n1,{name}\n")
+    return tmp_path
+
+
+def test_each_file_is_uploaded_once_and_referenced_by_id(files):
+    server = FakeServer()
+    jobs = jobs_from_glob(str(files / "*.csv"), "linear_regression", {"x": "x", "y": "y"}, report=True)
+    results = run(jobs, server)
+
+    assert [result["file"] for result in results] == [str(files / name) for name in ("a.csv", "b.csv", "c.csv")]
+    assert server.paths().count("/datasets/") == 3
+    assert all(result["analysis"]["dataset_id"] == result["dataset_id"] for result in results)
+    assert all(result["report_id"] == f"report_{result['dataset_id']}.pdf" for result in results)
+    assert b"1,a.csv" in b"".join(server.datasets.values())
+
+
+def test_retries_and_reuploads(files):
+    server = FakeServer(fail_first=2, forget={"d0"})
+    results = run([BatchJob(str(files / "a.csv"), "descriptive")], server)
+    assert "error" not in results[0]
+    # Two 503s, the upload, a 404 for the forgotten dataset, the re-upload and the analysis
+    assert server.paths() == ["/datasets/"] * 3 + ["/descriptive/", "/datasets/", "/descriptive/"]
+    assert results[0]["dataset_id"] == "d1"
+
+
+def test_reports_are_only_retried_when_refused(files):
+    # A 429 is retried, but after a 504 the report may still be rendering, so it is not requested again
+    server = FakeServer(report_statuses=[429, 504])
+    results = run([BatchJob(str(files / "a.csv"), report=True)], server)
+    assert server.paths() == ["/datasets/"] + ["/generate_report/"] * 2
+    assert results[0]["error"].startswith("504")
+
+
+def test_errors_are_reported_per_file(files):
+    server = FakeServer()
+    jobs = [BatchJob(str(files / "a.csv"), "linear_regression", {"x": "missing", "y": "y"}),
+            BatchJob(str(files / "nope.csv"), "descriptive"),
+            BatchJob(str(files / "b.csv"), "descriptive")]
+    results = run(jobs, server)
+    assert "400" in results[0]["error"] and "Invalid column names." in results[0]["error"]
+    assert "error" in results[1]
+    assert "analysis" in results[2]
+
+    results = run([BatchJob(str(files / "c.csv"))], FakeServer(fail_first=5), retries=2)
+    assert results[0]["error"].startswith("503")
+
+
+def test_manifest_and_params(files):
+    manifest = files / "jobs.json"
+    manifest.write_text(json.dumps([
+        {"file": "a.csv", "type": "decision_tree", "params": {"target_column": "y", "feature_columns": "x"}},
+        {"file": "b.csv", "report": True},
+    ]))
+    jobs = jobs_from_manifest(str(manifest))
+    assert jobs == [BatchJob(str(files / "a.csv"), "decision_tree", {"target_column": "y", "feature_columns": "x"}),
+                    BatchJob(str(files / "b.csv"), None, {}, True)]
+
+    manifest.write_text(json.dumps([{"file": "a.csv", "type": "clustering"}]))
+    with pytest.raises(ValueError):
+        jobs_from_manifest(str(manifest))
+
+    assert analysis_params("linear_regression", x_column="a", y_column="b", target_column="t") == {"x": "a", "y": "b"}
+    assert analysis_params("descriptive", x_column="a") == {}
@@ -0,0 +1,16 @@
+from app import config
+from app.nlp.nlp_utils import interpret_query, process_user_query, stop_words
+from app.utils.importtime import measure_imports, total_ms
+
+
+def test_cli_import_is_fast_and_skips_nltk():
+    times = measure_imports("app.cli.cli")
+    assert not any(t.module == "nltk" for t in times)
+    assert total_ms(times, "app.cli.cli") < config.CLI_IMPORT_BUDGET_MS
+
+
+def test_query_uses_bundled_stopwords():
+    tokens = process_user_query("Please analyze the data in this file")
+    assert tokens == ['please', 'analyze', 'data', 'file']
+    assert interpret_query(tokens) == "analysis"
+    assert stop_words() is stop_words()
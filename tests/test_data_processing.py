@@ -1,5 +1,10 @@
+import numpy as np
 import pandas as pd
-from app.services.data_processing import clean_data, preprocess_data
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.routes import analysis
+from app.services.data_processing import CLEANING, clean_data, preprocess_data, preprocessing
+from app.services.executor import ComputeExecutor
 
 def test_clean_data():
     data = {'col1': [1, 2, 2, None], 'col2': [3, 4, 4, None]}
@@ -16,4 +21,57 @@ def test_preprocess_data():
     
     assert 'col2_A' in df_preprocessed.columns
     assert 'col2_B' in df_preprocessed.columns
+    # Dense one-hot columns unless sparse ones are asked for
+    assert df_preprocessed['col2_A'].dtype == bool
     assert df_preprocessed.isnull().sum().sum() == 0  # Ensure no missing values
+
+def test_pipeline_matches_pandas_cleaning_and_scaling():
+    df = pd.DataFrame({'a': [1, 2, 2, None, 5, 7], 'b': [3.0, 4.0, 4.0, 1.0, 8.0, 2.0], 'c': list('xyyzxz')})
+    expected = df.drop_duplicates().dropna()
+    cleaned = clean_data(df)
+    assert cleaned.index.tolist() == expected.index.tolist()
+
+    scaled = preprocess_data(cleaned, encoding="codes")
+    numeric = expected[['a', 'b']]
+    pd.testing.assert_frame_equal(scaled[['a', 'b']], ((numeric - numeric.mean()) / numeric.std()).astype('float32'))
+    assert scaled['c'].tolist() == [0, 1, 0, 2]
+    assert df['a'].iloc[0] == 1  # input left unchanged
+
+def test_sparse_encoding_matches_dummies():
+    df = pd.DataFrame({'col1': [1, 2, 3, 4], 'col2': ['A', 'B', None, 'A']})
+    sparse = preprocess_data(df, encoding="sparse")
+    dense = pd.get_dummies(df, columns=['col2'])
+    assert sparse.columns.tolist() == dense.columns.tolist()
+    assert (sparse[['col2_A', 'col2_B']].sparse.to_dense().to_numpy() == dense[['col2_A', 'col2_B']].to_numpy()).all()
+
+def test_pipeline_reports_each_stage():
+    df = pd.DataFrame({'col1': [1, 2, 2, None], 'col2': ['A', 'B', 'B', 'A']})
+    report = []
+    (CLEANING + preprocessing("sparse")).run(df, report, memory=True)
+    assert [stage['stage'] for stage in report] == [
+        'drop_nulls_and_duplicates', 'standardize_numeric', 'encode_categoricals_sparse']
+    assert all(stage['peak_bytes'] > 0 for stage in report)
+    # Memory is only traced on request
+    report = []
+    CLEANING.run(df, report)
+    assert [set(stage) for stage in report] == [{'stage', 'seconds'}]
+
+def test_clean_chunks_drops_rows_seen_in_earlier_chunks():
+    chunks = [pd.DataFrame({'a': [1, 2, 1]}), pd.DataFrame({'a': [2.0, 3.0]}), pd.DataFrame({'a': [3, 4]})]
+    assert [chunk['a'].tolist() for chunk in clean_data(iter(chunks))] == [[1, 2], [3.0], [4]]
+
+def test_clean_chunks_matches_dropping_duplicates_of_the_whole():
+    # Enough chunks for the seen hashes to be merged into larger runs several times
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({'a': rng.integers(0, 50, 3000), 'b': rng.choice(['x', 'y', 'z'], 3000)})
+    chunks = [df.iloc[start:start + 97] for start in range(0, len(df), 97)]
+    cleaned = pd.concat(clean_data(iter(chunks)))
+    pd.testing.assert_frame_equal(cleaned, df.drop_duplicates())
+
+def test_streamed_parse_errors_are_bad_requests(monkeypatch):
+    monkeypatch.setattr(analysis, "compute", ComputeExecutor("thread", 1, 4, 60))
+    app = FastAPI()
+    app.include_router(analysis.router)
+    response = TestClient(app).post("/process/", params={"stream": True},
+                                    files={"file": ("bad.csv", b"a,b\n1,2\n3,4,5\n", "text/csv")})
+    assert response.status_code == 400 and "Could not parse" in response.json()["detail"]
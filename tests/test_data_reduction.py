@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+from app.services.data_reduction import downsample_series, histogram, lttb, top_k_with_other
+from app.services.report_generator import ReportGenerator
+
+
+def test_lttb_keeps_endpoints_and_peaks():
+    y = np.zeros(10000)
+    y[1234] = 50.0
+    y[8765] = -50.0
+    idx = lttb(y, 100)
+
+    assert len(idx) == 100
+    assert idx[0] == 0 and idx[-1] == len(y) - 1
+    assert np.all(np.diff(idx) > 0)
+    assert 1234 in idx and 8765 in idx
+
+
+def test_downsample_keeps_small_series():
+    series = pd.Series([1.0, None, 3.0])
+    assert downsample_series(series, 10).tolist() == [1.0, 3.0]
+
+
+def test_histogram_counts_every_value():
+    series = pd.Series(np.random.default_rng(0).normal(size=100000))
+    binned = histogram(series, max_bins=50)
+    assert len(binned) <= 50
+    assert binned.sum() == len(series)
+
+
+def test_top_k_with_other():
+    series = pd.Series(['a'] * 5 + ['b'] * 3 + ['c', 'd'])
+    counts = top_k_with_other(series, 2)
+    assert counts.to_dict() == {'a': 5, 'b': 3, 'Other': 2}
+
+
+def test_chart_points_are_bounded(monkeypatch):
+    rows = 100000
+    df = pd.DataFrame({
+        'value': np.random.default_rng(0).random(rows),
+        'label': [f'user{i}' for i in range(rows)],
+    })
+    captured = {}
+
+    class Renderer:
+        def render(self, charts, progress=None):
+            captured.update({name: data for name, _, data in charts})
+            return {}
+
+    monkeypatch.setattr('app.services.report_generator.get_renderer', lambda backend: Renderer())
+    ReportGenerator(df, max_points=500).generate_visualizations()
+
+    assert len(captured['value']) == 500
+    assert len(captured['label']) <= 500
+    assert captured['label'].sum() == rows
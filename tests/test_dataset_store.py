@@ -0,0 +1,86 @@
+import io
+import pandas as pd
+from app.services.dataset_store import DatasetStore
+from app.services.query_plan import QueryPlan
+from app.services.storage import LocalStorage
+
+CSV = b"a,b\n1,x\n2,y\n3,z\n"
+
+
+def test_same_bytes_parsed_once(tmp_path):
+    store = DatasetStore(max_bytes=10 ** 9, spill_dir=str(tmp_path))
+    first, _ = store.add(CSV, "data.csv")
+    second, _ = store.add(CSV, "other_name.csv")
+
+    assert first == second
+    assert store.stats["misses"] == 1
+    assert store.stats["hits"] == 1
+    assert store.get(first)["a"].tolist() == [1, 2, 3]
+
+
+def test_eviction_spills_to_disk(tmp_path):
+    store = DatasetStore(max_bytes=1, spill_dir=str(tmp_path))
+    first, _ = store.add(CSV, "data.csv")
+    second, _ = store.add(b"a,b\n4,w\n", "data.csv")
+
+    assert store.stats["evictions"] == 1
+    assert store.stats["spills"] == 1
+    assert list(tmp_path.iterdir())
+
+    # The evicted frame is reloaded from its spill file
+    df = store.get(first)
+    assert store.stats["disk_hits"] == 1
+    pd.testing.assert_frame_equal(df, pd.DataFrame({"a": [1, 2, 3], "b": ["x", "y", "z"]}))
+    assert second in store
+
+
+def test_unknown_id(tmp_path):
+    store = DatasetStore(max_bytes=10 ** 9, spill_dir=str(tmp_path))
+    assert "0" * 64 not in store
+    assert "../etc/passwd" not in store
+
+
+def test_add_file_projects_columns_without_storing(tmp_path):
+    store = DatasetStore(max_bytes=10 ** 9, spill_dir=str(tmp_path))
+    dataset_id, df = store.add_file(io.BytesIO(CSV), "data.csv", QueryPlan(["b"]))
+
+    assert dataset_id == store.dataset_id(CSV, "data.csv")
+    assert df.columns.tolist() == ["b"]
+    assert dataset_id not in store
+
+    store.add_file(io.BytesIO(CSV), "data.csv")
+    _, df = store.add_file(io.BytesIO(CSV), "data.csv", QueryPlan(["a"]))
+    assert df["a"].tolist() == [1, 2, 3]
+    assert store.stats["hits"] == 1
+
+
+def test_add_file_filters_stored_and_new_datasets(tmp_path):
+    store = DatasetStore(max_bytes=10 ** 9, spill_dir=str(tmp_path))
+    plan = QueryPlan(["b"], (("a", ">=", 2),))
+    _, df = store.add_file(io.BytesIO(CSV), "data.csv", plan)
+    assert df.to_dict("list") == {"b": ["y", "z"]}
+
+    store.add_file(io.BytesIO(CSV), "data.csv")
+    _, df = store.add_file(io.BytesIO(CSV), "data.csv", plan)
+    assert df.to_dict("list") == {"b": ["y", "z"]}
+
+
+def test_storage_is_used_outside_the_lock(tmp_path):
+    class CheckedStorage(LocalStorage):
+        def size(self, key):
+            assert not store._lock.locked()
+            return super().size(key)
+
+        def open(self, key):
+            assert not store._lock.locked()
+            return super().open(key)
+
+        def commit(self, staging_path, key):
+            assert not store._lock.locked()
+            super().commit(staging_path, key)
+
+    store = DatasetStore(max_bytes=1, spill_dir=CheckedStorage(str(tmp_path)), write_through=True)
+    first, _ = store.add(CSV, "data.csv")
+    second, _ = store.add(b"a,b\n4,w\n", "data.csv")
+    assert store.get(first)["a"].tolist() == [1, 2, 3] and first in store and second in store
+    assert store.stats["disk_hits"] == 1 and not store._spilling
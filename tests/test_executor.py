@@ -0,0 +1,77 @@
+import asyncio
+import time
+import pandas as pd
+import pytest
+from fastapi import HTTPException
+from app.services import tasks
+from app.services.executor import ComputeExecutor, SharedFrame, _attach_frame
+
+DATA = pd.DataFrame({'x': [1, 2, 3, 4], 'y': [2.0, 4.0, 6.0, 8.0], 'c': ['a', 'b', 'a', 'b']})
+
+
+def slow_task(df, seconds):
+    time.sleep(seconds)
+    return len(df)
+
+
+def test_shared_frame_round_trip():
+    shared = SharedFrame(DATA)
+    try:
+        pd.testing.assert_frame_equal(_attach_frame(shared.handle), DATA)
+    finally:
+        shared.release()
+
+
+@pytest.mark.parametrize('mode', ['thread', 'process'])
+def test_run_task(mode):
+    executor = ComputeExecutor(mode, max_workers=1, queue_size=1, timeout=60)
+    try:
+        model = asyncio.run(executor.run(tasks.fit_linear_regression_xy, DATA, 'x', 'y'))
+    finally:
+        executor.shutdown()
+    assert model.metrics['slope'] == pytest.approx(2.0)
+
+
+def test_full_queue_is_rejected():
+    executor = ComputeExecutor('thread', max_workers=1, queue_size=0, timeout=60)
+
+    async def submit_two():
+        return await asyncio.gather(executor.run(slow_task, DATA, 0.2), executor.run(slow_task, DATA, 0),
+                                    return_exceptions=True)
+
+    try:
+        first, second = asyncio.run(submit_two())
+    finally:
+        executor.shutdown()
+    assert first == 4
+    assert isinstance(second, HTTPException) and second.status_code == 429
+
+
+def test_timeout():
+    executor = ComputeExecutor('thread', max_workers=1, queue_size=1, timeout=0.05)
+    try:
+        with pytest.raises(HTTPException) as error:
+            asyncio.run(executor.run(slow_task, DATA, 0.5))
+    finally:
+        executor.shutdown()
+    assert error.value.status_code == 504
+
+
+def test_timed_out_jobs_hold_their_slot_until_they_end():
+    executor = ComputeExecutor('thread', max_workers=1, queue_size=1, timeout=0.1)
+
+    async def main():
+        # The second job is still waiting for the worker when it times out, so it is cancelled
+        results = await asyncio.gather(executor.run(slow_task, DATA, 0.5), executor.run(slow_task, DATA, 0),
+                                       return_exceptions=True)
+        await asyncio.sleep(0)
+        after_timeout = executor.pending
+        await asyncio.sleep(0.6)
+        return results, after_timeout, executor.pending
+
+    try:
+        results, after_timeout, after_job = asyncio.run(main())
+    finally:
+        executor.shutdown()
+    assert [error.status_code for error in results] == [504, 504]
+    assert after_timeout == 1 and after_job == 0
@@ -0,0 +1,99 @@
+import io
+import pandas as pd
+import numpy as np
+import pytest
+from app.utils.file_handler import read_file, read_file_chunks, concat_chunks, filter_rows, write_arrow_stream
+from app.services.data_processing import clean_data
+from app.services.analysis_engine import AnalysisEngine
+from app.services.report_generator import ReportGenerator
+
+CSV = "id,value,group\n1,10,a\n2,20,b\n2,20,b\n3,,a\n4,40,b\n5,50,a\n1,10,a\n"
+
+
+def chunks(chunksize=2):
+    return read_file_chunks(io.StringIO(CSV), "data.csv", chunksize=chunksize)
+
+
+def test_read_file_chunks_downcasts():
+    parts = list(chunks(chunksize=4))
+    assert len(parts) == 2
+    assert parts[0]['id'].dtype == 'int32'
+    assert isinstance(parts[0]['group'].dtype, pd.CategoricalDtype)
+
+    df = concat_chunks(parts)
+    assert len(df) == 7
+    assert isinstance(df['group'].dtype, pd.CategoricalDtype)
+
+
+def test_clean_data_on_chunks_matches_dataframe():
+    expected = clean_data(pd.read_csv(io.StringIO(CSV)))
+    streamed = concat_chunks(clean_data(chunks()))
+    assert streamed['id'].tolist() == expected['id'].tolist()
+
+
+def test_descriptive_statistics_on_chunks():
+    expected = AnalysisEngine(pd.read_csv(io.StringIO(CSV))).descriptive_statistics()
+    streamed = AnalysisEngine(chunks()).descriptive_statistics()
+    assert streamed['median'] == expected['median']
+    assert streamed['count'] == expected['count']
+
+
+def test_generate_summary_on_chunks():
+    expected = ReportGenerator(pd.read_csv(io.StringIO(CSV))).generate_summary()
+    assert ReportGenerator(chunks()).generate_summary() == expected
+
+
+def columnar_files():
+    df = pd.DataFrame({'id': range(10), 'value': [float(i) for i in range(10)], 'group': list('ababababab')})
+    parquet, feather = io.BytesIO(), io.BytesIO()
+    df.to_parquet(parquet)
+    df.to_feather(feather)
+    return df, {'data.parquet': parquet.getvalue(), 'data.feather': feather.getvalue(),
+                'data.arrows': write_arrow_stream(df)}
+
+
+def test_columnar_formats_with_projection(tmp_path):
+    df, files = columnar_files()
+    for name, contents in files.items():
+        pd.testing.assert_frame_equal(read_file(io.BytesIO(contents), name), df)
+        projected = read_file(io.BytesIO(contents), name, columns=['group', 'id', 'missing'])
+        assert projected.columns.tolist() == ['id', 'group']
+
+        # A spooled upload that rolled over to disk is memory-mapped rather than read
+        path = tmp_path / name
+        path.write_bytes(contents)
+        with open(path, 'rb') as f:
+            pd.testing.assert_frame_equal(read_file(f, name), df)
+
+
+def test_columnar_formats_stream_in_chunks():
+    df, files = columnar_files()
+    for name, contents in files.items():
+        parts = list(read_file_chunks(io.BytesIO(contents), name, chunksize=4))
+        assert [len(part) for part in parts] == [4, 4, 2]
+        pd.testing.assert_frame_equal(concat_chunks(parts), df)
+
+
+def test_filters_are_pushed_down_to_every_format():
+    df, files = columnar_files()
+    files['data.csv'] = df.to_csv(index=False).encode()
+    filters = [('value', '>=', 4), ('group', '==', 'b'), ('id', '!=', 9)]
+    for name, contents in files.items():
+        filtered = read_file(io.BytesIO(contents), name, columns=['id'], filters=filters)
+        assert filtered['id'].tolist() == [5, 7], name
+        with pytest.raises(ValueError):
+            read_file(io.BytesIO(contents), name, filters=[('missing', '==', 1)])
+
+
+def test_filter_rows_drops_nulls_and_compares_text_columns_as_text():
+    df = pd.DataFrame({'zip': ['02139', '10001', None], 'n': [1.0, np.nan, 3.0]})
+    assert filter_rows(df, [('n', '!=', 1)])['n'].tolist() == [3.0]
+    assert filter_rows(df, [('zip', '==', 10001)])['zip'].tolist() == ['10001']
+    with pytest.raises(ValueError):
+        filter_rows(df, [('n', '<', 'abc')])
+
+
+def test_csv_dtype_hints():
+    contents = b'a,b\n1,x\n2,y\n'
+    df = read_file(io.BytesIO(contents), 'data.csv', dtypes={'a': 'float64', 'c': 'int64'})
+    assert df['a'].dtype == 'float64'
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+from app.services.analysis_engine import AnalysisEngine
+from app.services.incremental_regression import IncrementalLinearRegression
+
+
+def make_data(rows=20000, seed=0):
+    rng = np.random.default_rng(seed)
+    # Features on very different scales and offsets, to exercise the numerics
+    df = pd.DataFrame({
+        'a': rng.normal(0, 1, rows),
+        'b': rng.normal(1e6, 100, rows),
+        'c': rng.normal(5, 1e4, rows),
+    })
+    df['y'] = 3 * df['a'] - 0.2 * df['b'] + 1e-3 * df['c'] + rng.normal(0, 1, rows)
+    return df
+
+
+def chunks(df, size):
+    return (df.iloc[start:start + size] for start in range(0, len(df), size))
+
+
+def test_matches_full_fit():
+    df = make_data()
+    expected = AnalysisEngine(df).linear_regression('y')
+    streamed = AnalysisEngine(chunks(df, 3333)).linear_regression('y')
+
+    for col, coef in expected['coefficients'].items():
+        assert streamed['coefficients'][col] == pytest.approx(coef, rel=1e-8)
+    assert streamed['intercept'] == pytest.approx(expected['intercept'], rel=1e-8)
+    assert streamed['r_squared'] == pytest.approx(expected['r_squared'], rel=1e-10)
+
+
+def test_append_equals_fit_on_all_rows():
+    df = make_data()
+    engine = AnalysisEngine(df.iloc[:5000])
+    first = engine.fit_incremental_regression('y')
+    appended = AnalysisEngine(chunks(df.iloc[5000:], 4000)).fit_incremental_regression('y', model=first)
+
+    assert first.metrics['rows'] == 5000
+    assert appended.metrics['rows'] == len(df)
+    full = AnalysisEngine(df).fit_incremental_regression('y')
+    assert np.allclose(appended.estimator.coef_, full.estimator.coef_, rtol=1e-9)
+
+
+def test_merge_of_shards():
+    df = make_data(rows=1000)
+    X, y = df[['a', 'b', 'c']].to_numpy(), df['y'].to_numpy()
+    left = IncrementalLinearRegression().partial_fit(X[:300], y[:300])
+    right = IncrementalLinearRegression().partial_fit(X[300:], y[300:])
+    whole = IncrementalLinearRegression().partial_fit(X, y)
+    assert np.allclose(left.merge(right).coef_, whole.coef_, rtol=1e-9)
+
+
+def test_non_numeric_features_are_rejected():
+    df = pd.DataFrame({'x': ['a', 'b'], 'y': [1.0, 2.0]})
+    with pytest.raises(ValueError):
+        AnalysisEngine(df).linear_regression('y', incremental=True)
@@ -0,0 +1,78 @@
+import json
+import os
+import subprocess
+import sys
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.utils import metrics
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = metrics.Histogram("test_latency_seconds", "Test.", ("stage",), buckets=(0.1, 1))
+    for value in (0.05, 0.5, 0.5, 5):
+        histogram.observe(value, stage='a"b')
+    lines = histogram.render()
+    assert 'ai_employee_test_latency_seconds_bucket{stage="a\\"b",le="0.1"} 1' in lines
+    assert 'ai_employee_test_latency_seconds_bucket{stage="a\\"b",le="1"} 3' in lines
+    assert 'ai_employee_test_latency_seconds_bucket{stage="a\\"b",le="+Inf"} 4' in lines
+    assert 'ai_employee_test_latency_seconds_count{stage="a\\"b"} 4' in lines
+
+
+def test_collected_observations_are_replayed():
+    def work(rows):
+        with metrics.timed("test_stage"):
+            metrics.count_rows("test_stage", rows)
+        return "done"
+
+    before = metrics.rows_processed._values.get(("test_stage",), 0)
+    result, observations = metrics.collect(work, 7)
+    assert result == "done"
+    assert [kind for kind, _, _ in observations] == ["rows", "stage"]
+    assert metrics.rows_processed._values.get(("test_stage",), 0) == before
+
+    metrics.replay(observations)
+    assert metrics.rows_processed._values[("test_stage",)] == before + 7
+
+
+def test_middleware_adds_server_timing_on_request():
+    app = FastAPI()
+    app.add_middleware(metrics.MetricsMiddleware)
+
+    @app.post("/items/{item_id}")
+    async def item(item_id: int):
+        with metrics.timed("lookup"):
+            pass
+        return {"item_id": item_id}
+
+    client = TestClient(app)
+    assert "server-timing" not in client.post("/items/1").headers
+    timing = client.post("/items/2", headers={"X-Timing": "1"}).headers["server-timing"]
+    assert timing.startswith("lookup;dur=") and "total;dur=" in timing
+
+    text = metrics.render()
+    assert 'ai_employee_http_requests_total{method="POST",route="/items/{item_id}",status="200"} 2' in text
+
+
+def test_render_adds_up_worker_snapshots(tmp_path):
+    counter = metrics.Counter("test_jobs_total", "Test.", ("kind",))
+    gauge = metrics.Gauge("test_queue_depth", "Test.")
+    histogram = metrics.Histogram("test_wait_seconds", "Test.", buckets=(1,))
+    counter.inc(2, kind="a")
+    gauge.set(3)
+    histogram.observe(0.5)
+
+    exited = subprocess.Popen([sys.executable, "-c", "pass"])
+    exited.wait()
+    other = {counter.name: [[["a"], 5], [["b"], 1]], gauge.name: [[[], 4]], histogram.name: [[[], [[1], 0.5, 1]]]}
+    # Snapshots of a worker still running and of one that has exited
+    for pid in (os.getppid(), exited.pid):
+        (tmp_path / f"{pid}.json").write_text(json.dumps({"pid": pid, "metrics": other}))
+
+    text = metrics.render(str(tmp_path))
+    assert 'ai_employee_test_jobs_total{kind="a"} 12' in text
+    assert 'ai_employee_test_jobs_total{kind="b"} 2' in text
+    assert 'ai_employee_test_queue_depth 7' in text
+    assert 'ai_employee_test_wait_seconds_bucket{le="1"} 3' in text and 'ai_employee_test_wait_seconds_sum 1.5' in text
+    assert (tmp_path / f"{os.getpid()}.json").exists()
@@ -0,0 +1,85 @@
+import threading
+
+import pandas as pd
+import pytest
+from app.services import model_registry, tasks
+from app.services.analysis_engine import AnalysisEngine
+from app.services.model_registry import ModelRegistry, model_key
+
+DATA = pd.DataFrame({'x': [1, 2, 3, 4, 5], 'c': ['a', 'b', 'a', 'b', 'c'], 'y': [2.0, 4.0, 6.0, 8.0, 11.0]})
+
+
+def test_model_key_depends_on_every_input():
+    key = model_key('d' * 64, 'decision_tree', ['x', 'c'], 'y', {'max_depth': 3})
+    assert key == model_key('d' * 64, 'decision_tree', ['x', 'c'], 'y', {'max_depth': 3})
+    assert key != model_key('d' * 64, 'decision_tree', ['c', 'x'], 'y', {'max_depth': 3})
+    assert key != model_key('d' * 64, 'decision_tree', ['x', 'c'], 'y', {'max_depth': 4})
+    assert key != model_key('e' * 64, 'decision_tree', ['x', 'c'], 'y', {'max_depth': 3})
+
+
+def test_stored_model_survives_a_new_registry(tmp_path):
+    model = AnalysisEngine(DATA).fit_decision_tree('y', ['x', 'c'])
+    key = model_key('d' * 64, 'decision_tree', ['x', 'c'], 'y')
+    ModelRegistry(str(tmp_path), max_entries=4, memory_entries=1).put(key, model)
+
+    registry = ModelRegistry(str(tmp_path), max_entries=4, memory_entries=1)
+    loaded = registry.get(key)
+    assert registry.stats['disk_hits'] == 1
+    assert loaded.predict(DATA).tolist() == model.predict(DATA).tolist()
+    assert registry.get('not-a-model-id') is None
+
+
+def test_least_recently_used_models_are_evicted(tmp_path):
+    registry = ModelRegistry(str(tmp_path), max_entries=2, memory_entries=2)
+    model = tasks.fit_linear_regression_xy(DATA, 'x', 'y')
+    keys = [model_key('d' * 64, 'linear_regression', [str(i)], 'y') for i in range(3)]
+    registry.put(keys[0], model)
+    registry.put(keys[1], model)
+    registry.get(keys[0])
+    registry.put(keys[2], model)
+
+    assert keys[0] in registry and keys[2] in registry
+    assert keys[1] not in registry
+    assert registry.stats['evictions'] == 1
+
+
+def test_new_rows_are_encoded_like_training_rows():
+    model = tasks.fit_linear_regression_xy(DATA, 'c', 'y')
+    assert len(model.predict(pd.DataFrame({'c': ['b', 'a']}))) == 2
+    with pytest.raises(ValueError):
+        model.predict(pd.DataFrame({'c': ['z']}))
+    with pytest.raises(ValueError):
+        model.predict(pd.DataFrame({'x': [1]}))
+
+
+def test_predictions_are_opt_in():
+    result = AnalysisEngine(DATA).decision_tree_regression('y', ['x'], include_predictions=False)
+    assert 'predictions' not in result
+    assert 'r_squared' in result
+
+
+def test_lookups_do_not_wait_for_a_slow_load(tmp_path, monkeypatch):
+    registry = ModelRegistry(str(tmp_path), max_entries=4, memory_entries=1)
+    model = tasks.fit_linear_regression_xy(DATA, 'x', 'y')
+    loaded, stored = (model_key('d' * 64, 'linear_regression', [name], 'y') for name in ('loaded', 'stored'))
+    registry.put(stored, model)
+    registry.put(loaded, model)
+
+    started, release = threading.Event(), threading.Event()
+    load = model_registry.joblib.load
+
+    def slow_load(path):
+        started.set()
+        release.wait(10)
+        return load(path)
+
+    monkeypatch.setattr(model_registry.joblib, 'load', slow_load)
+    reader = threading.Thread(target=registry.get, args=(stored,))
+    reader.start()
+    try:
+        assert started.wait(10)
+        assert loaded in registry and registry.info()['loaded'] == 1
+    finally:
+        release.set()
+        reader.join()
+    assert registry.stats['disk_hits'] == 1
@@ -0,0 +1,114 @@
+import threading
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import config
+from app.routes import admin
+from app.utils import profiler
+
+
+def busy_loop(done: threading.Event):
+    while not done.is_set():
+        sum(range(1000))
+
+
+def spin(seconds: float):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_sampler_records_busy_threads_only():
+    done = threading.Event()
+    worker = threading.Thread(target=busy_loop, args=(done,), name="busy")
+    worker.start()
+    try:
+        _, stacks = profiler.profile_call(time.sleep, 0.2)
+    finally:
+        done.set()
+        worker.join()
+    assert any(stack.startswith("busy;") and "busy_loop" in stack for stack in stacks)
+    # The caller sleeping in time.sleep is busy too; idle pool threads are left out
+    assert all(";_worker (thread.py" not in stack.rsplit(";", 1)[-1] for stack in stacks)
+
+
+def test_middleware_saves_slow_and_requested_profiles(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "PROFILES_DIR", str(tmp_path))
+    monkeypatch.setattr(config, "ADMIN_TOKEN", "secret")
+    app = FastAPI()
+    app.add_middleware(profiler.ProfilingMiddleware, threshold=0.5)
+
+    @app.get("/work/{seconds}")
+    async def work(seconds: float):
+        # Half on the event loop, half on a worker thread
+        spin(seconds / 2)
+        await profiler.run_in_threadpool(spin, seconds / 2)
+        return {}
+
+    client = TestClient(app)
+    assert "x-profile" not in client.get("/work/0").headers
+    # Only admins can have a request profiled
+    assert "x-profile" not in client.get("/work/0", headers={"X-Profile": "1", "X-Admin-Token": "guess"}).headers
+    assert profiler.list_profiles() == []
+
+    name = client.get("/work/0.05", headers={"X-Profile": "1", "X-Admin-Token": "secret"}).headers["x-profile"]
+    client.get("/work/0.6")
+    profiles = profiler.list_profiles()
+    assert len(profiles) == 2 and name in [p["name"] for p in profiles]
+    assert all("_GET_work_seconds_" in p["name"] for p in profiles)
+    lines = (tmp_path / name).read_text().splitlines()
+    assert any("work (test_profiler.py" in line and "spin (test_profiler.py" in line for line in lines)
+    assert any("spin (test_profiler.py" in line and "work (test_profiler.py" not in line for line in lines)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+
+
+def test_sessions_sample_only_their_own_threads():
+    done = threading.Event()
+    session = profiler.ProfileSession()
+
+    def request_work():
+        with profiler.sampler.attached(session):
+            busy_loop(done)
+
+    threads = [threading.Thread(target=request_work, name="mine"),
+               threading.Thread(target=busy_loop, args=(done,), name="other")]
+    profiler.sampler.start(session)
+    for thread in threads:
+        thread.start()
+    try:
+        time.sleep(0.2)
+    finally:
+        done.set()
+        for thread in threads:
+            thread.join()
+        profiler.sampler.stop(session)
+    assert any(stack.startswith("mine;") for stack in session.counts)
+    # Neither another request's thread nor this one, sleeping outside the session
+    assert not any(stack.startswith(("other;", "MainThread;")) for stack in session.counts)
+
+
+def test_save_profile_keeps_newest(tmp_path):
+    session = profiler.ProfileSession()
+    session.merge({"a;b": 2})
+    for i in range(3):
+        profiler.save_profile(session, f"p{i}.folded", str(tmp_path), kept=2)
+        time.sleep(0.01)
+    assert [p["name"] for p in profiler.list_profiles(str(tmp_path))] == ["p2.folded", "p1.folded"]
+    assert (tmp_path / "p2.folded").read_text() == "a;b 2\n"
+
+
+def test_admin_routes_need_the_admin_token(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "PROFILES_DIR", str(tmp_path))
+    app = FastAPI()
+    app.include_router(admin.router)
+    client = TestClient(app)
+    # Disabled while no token is configured
+    assert client.get("/admin/profiles").status_code == 404
+
+    monkeypatch.setattr(config, "ADMIN_TOKEN", "secret")
+    assert client.get("/admin/profiles").status_code == 401
+    assert client.get("/admin/profiles", headers={"X-Admin-Token": "guess"}).status_code == 401
+    response = client.get("/admin/profiles", headers={"X-Admin-Token": "secret"})
+    assert response.status_code == 200 and response.json()["profiles"] == []
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+from app.services.analysis_engine import AnalysisEngine
+from app.services.profiling import ProfileCache, build_profile
+from app.services.report_generator import ReportGenerator
+
+
+def make_data(rows=10000, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'value': rng.normal(50, 10, rows),
+        'ints': rng.integers(0, 100, rows),
+        'label': rng.choice([f'l{i}' for i in range(40)], rows),
+    })
+    df.loc[df.sample(frac=0.1, random_state=seed).index, 'value'] = np.nan
+    return df
+
+
+def test_numeric_profile_matches_pandas():
+    df = make_data()
+    entry = build_profile(df)['columns']['value']
+    expected = df['value'].describe()
+
+    assert entry['kind'] == 'numeric'
+    assert (entry['count'], entry['nulls']) == (expected['count'], df['value'].isna().sum())
+    assert np.isclose(entry['std_dev'], expected['std'])
+    for label in ('25%', '50%', '75%'):
+        assert np.isclose(entry['quantiles'][label], expected[label])
+    assert sum(entry['histogram']['counts']) == entry['count']
+    assert len(entry['histogram']['edges']) == len(entry['histogram']['counts']) + 1
+
+
+def test_categorical_profile_keeps_top_k():
+    df = make_data()
+    entry = build_profile(df)['columns']['label']
+    expected = df['label'].value_counts()
+
+    assert entry['unique'] == 40
+    assert [item['count'] for item in entry['top']] == expected.iloc[:20].tolist()
+    assert entry['other'] == expected.iloc[20:].sum()
+
+
+def test_profile_of_chunks_matches_dataframe():
+    df = make_data()
+    chunks = (df.iloc[start:start + 999] for start in range(0, len(df), 999))
+    streamed, expected = build_profile(chunks)['columns'], build_profile(df)['columns']
+
+    assert streamed['label'] == expected['label']
+    for col in ('value', 'ints'):
+        assert streamed[col]['quantiles'] == expected[col]['quantiles']
+        assert streamed[col]['histogram'] == expected[col]['histogram']
+        assert np.isclose(streamed[col]['std_dev'], expected[col]['std_dev'], rtol=1e-12)
+
+
+def test_approximate_profile_counts_every_value():
+    df = make_data()
+    entry = build_profile(df, exact=False)['columns']['value']
+    assert abs(sum(entry['histogram']['counts']) - entry['count']) <= entry['count'] * 0.01
+
+
+def test_profile_is_the_source_for_statistics_and_summary():
+    df = make_data()
+    profile = build_profile(df)
+    profile['columns']['ints']['mean'] = -1.0
+
+    assert AnalysisEngine(df, profile).descriptive_statistics()['mean']['ints'] == -1.0
+    summary = ReportGenerator(df, profile=profile).generate_summary()
+    assert any(s.startswith('Summary of ints:') and '-1.0' in s for s in summary)
+
+
+def test_cache_builds_once_per_dataset():
+    df = make_data(rows=100)
+    cache = ProfileCache(max_entries=1)
+    first = cache.get_or_build('a', df)
+    assert cache.get_or_build('a', df) is first
+    assert cache.stats == {'hits': 1, 'misses': 1}
+
+    cache.get_or_build('b', df)
+    assert cache.get('a') is None
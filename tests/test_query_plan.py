@@ -0,0 +1,37 @@
+import io
+
+import pandas as pd
+import pytest
+
+from app.services.query_plan import QueryPlan, parse_filters, plan_query
+
+
+def test_parse_filters():
+    assert parse_filters("age>=18, city = Paris,zip=='02139',score<0.5") == (
+        ("age", ">=", 18), ("city", "==", "Paris"), ("zip", "==", "02139"), ("score", "<", 0.5))
+    assert parse_filters(None) == ()
+    with pytest.raises(ValueError):
+        parse_filters("age")
+
+
+def test_plan_query_keeps_model_params_stable_without_filters():
+    plan = plan_query(["x", "y", "x"])
+    assert plan.columns == ["x", "y"]
+    assert plan.params() == {}
+    assert plan_query(["x"], "y>1").params() == {"where": [["y", ">", 1]]}
+    assert QueryPlan().reads_everything
+
+
+def test_read_and_apply_agree():
+    df = pd.DataFrame({"x": [1, 2, 3, 4], "y": [1.0, None, 3.0, 4.0], "city": ["a", "b", "a", "b"]})
+    csv = df.to_csv(index=False).encode()
+    parquet = io.BytesIO()
+    df.to_parquet(parquet, row_group_size=2)
+    plan = plan_query(["x"], "y>1,city!=b")
+
+    expected = pd.DataFrame({"x": [3]})
+    pd.testing.assert_frame_equal(plan.apply(df), expected)
+    pd.testing.assert_frame_equal(plan.read(io.BytesIO(csv), "data.csv"), expected)
+    pd.testing.assert_frame_equal(plan.read(io.BytesIO(parquet.getvalue()), "data.parquet"), expected)
+    chunks = list(plan.read_chunks(io.BytesIO(csv), "data.csv"))
+    assert pd.concat(chunks)["x"].tolist() == [3]
@@ -0,0 +1,77 @@
+import os
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.routes import reports
+from app.services.report_catalog import ReportCatalog
+
+
+def write_report(directory, name, size):
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, name), "wb") as f:
+        f.write(bytes(range(256)) * (size // 256) + bytes(size % 256))
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    return ReportCatalog(str(tmp_path / "catalog.sqlite3"), str(tmp_path / "reports"))
+
+
+def test_existing_reports_are_indexed_once(tmp_path):
+    write_report(tmp_path / "reports", "old.pdf", 100)
+    catalog = ReportCatalog(str(tmp_path / "catalog.sqlite3"), str(tmp_path / "reports"))
+    total, entries = catalog.list()
+    assert total == 1 and entries[0]["report_id"] == "old.pdf" and entries[0]["etag"] is None
+    assert catalog.get("old.pdf")["etag"].startswith('"')
+
+
+def test_list_filters_sorts_and_pages(catalog):
+    for i, (dataset, size) in enumerate([("d1", 300), ("d2", 100), ("d1", 200)]):
+        write_report(catalog.reports_dir, f"r{i}.pdf", size)
+        catalog.add(f"r{i}.pdf", dataset, ["a", "b"], rows=10)
+
+    total, page = catalog.list(limit=2)
+    assert total == 3 and [e["report_id"] for e in page] == ["r2.pdf", "r1.pdf"]
+    assert page[0]["columns"] == ["a", "b"]
+    assert [e["report_id"] for e in catalog.list(offset=2)[1]] == ["r0.pdf"]
+    assert [e["report_id"] for e in catalog.list(dataset_id="d1", sort="bytes", descending=False)[1]] == ["r2.pdf", "r0.pdf"]
+    with pytest.raises(ValueError):
+        catalog.list(sort="bytes; DROP TABLE reports")
+
+
+def test_quota_evicts_oldest_reports(tmp_path):
+    catalog = ReportCatalog(str(tmp_path / "catalog.sqlite3"), str(tmp_path / "reports"), max_bytes=250)
+    for i in range(3):
+        write_report(catalog.reports_dir, f"r{i}.pdf", 100)
+        catalog.add(f"r{i}.pdf")
+        time.sleep(0.01)
+    assert catalog.info() == {"reports": 2, "bytes": 200}
+    assert not os.path.exists(catalog.path("r0.pdf"))
+
+
+def test_download_supports_etag_and_ranges(catalog, monkeypatch):
+    monkeypatch.setattr(reports, "report_catalog", catalog)
+    write_report(catalog.reports_dir, "r.pdf", 1000)
+    etag = catalog.add("r.pdf")["etag"]
+
+    from fastapi import FastAPI
+    app = FastAPI()
+    app.include_router(reports.router)
+    client = TestClient(app)
+
+    full = client.get("/download_report/r.pdf")
+    assert full.status_code == 200 and len(full.content) == 1000 and full.headers["etag"] == etag
+    assert client.get("/download_report/r.pdf", headers={"If-None-Match": etag}).status_code == 304
+
+    part = client.get("/download_report/r.pdf", headers={"Range": "bytes=990-"})
+    assert part.status_code == 206 and part.content == full.content[990:]
+    assert part.headers["content-range"] == "bytes 990-999/1000"
+    assert client.get("/download_report/r.pdf", headers={"Range": "bytes=-10"}).content == full.content[-10:]
+    assert client.get("/download_report/r.pdf", headers={"Range": "bytes=2000-"}).status_code == 416
+    stale = client.get("/download_report/r.pdf", headers={"Range": "bytes=0-9", "If-Range": '"other"'})
+    assert stale.status_code == 200 and len(stale.content) == 1000
+
+    listing = client.get("/reports/?limit=1").json()
+    assert listing["available_reports"] == ["r.pdf"] and listing["total"] == 1
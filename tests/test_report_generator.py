@@ -1,6 +1,8 @@
+import io
 import unittest
 import pandas as pd
 import os
+from app.services.chart_renderer import ChartImage
 from app.services.report_generator import ReportGenerator
 
 class TestReportGenerator(unittest.TestCase):
@@ -19,6 +21,22 @@ class TestReportGenerator(unittest.TestCase):
 
         # Additional validation can be added here if needed
 
+    def test_report_written_to_file_object(self):
+        buffer = io.BytesIO()
+        self.report_generator.create_report(buffer)
+        self.assertTrue(buffer.getvalue().startswith(b'%PDF'))
+
+    def test_layout_keeps_images_on_the_page(self):
+        image = ChartImage(b'', 700, 500)
+        summaries = [f"Summary of c{i}:\n" + "line\n" * 10 for i in range(6)]
+        pages = self.report_generator.layout_pages(summaries, {f"c{i}": image for i in range(6)})
+
+        images = [op for page in pages for op in page if op[0] == "image"]
+        self.assertEqual(len(images), 6)
+        for _, _, y, width, height, _ in images:
+            self.assertEqual((width, height), (400, 400 * 500 / 700))
+            self.assertGreaterEqual(y, 100)
+
     def tearDown(self):
         if os.path.exists(self.output_file):
             os.remove(self.output_file)
@@ -0,0 +1,125 @@
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+import pandas as pd
+import pytest
+from app import config
+from app.services.dataset_store import dataset_store
+from app.services.executor import ComputeExecutor
+from app.services.report_catalog import ReportCatalog
+from app.services.report_jobs import ReportJobQueue, DONE, FAILED, QUEUED, RUNNING
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "REPORTS_DIR", str(tmp_path / "reports"))
+    monkeypatch.setattr(dataset_store, "spill_dir", str(tmp_path / "datasets"))
+    # Worker processes, so progress is recorded from outside the serving process
+    executor = ComputeExecutor("process", max_workers=1, queue_size=8, timeout=120)
+    jobs = ReportJobQueue(str(tmp_path / "jobs.sqlite3"), workers=2,
+                          catalog=ReportCatalog(str(tmp_path / "catalog.sqlite3")), executor=executor)
+    yield jobs
+    jobs.shutdown()
+    executor.shutdown()
+
+
+def run(queue, body):
+    """Run the queue's jobs on an event loop while body() runs in a thread; returns body's result."""
+    async def main():
+        queue.start()
+        try:
+            return await asyncio.to_thread(body)
+        finally:
+            queue.shutdown()
+
+    return asyncio.run(main())
+
+
+def wait_for(queue, job_id, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job["status"] in (DONE, FAILED):
+            return job
+        time.sleep(0.1)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+
+def test_job_reports_progress_and_result(queue, tmp_path):
+    dataset_id, _ = dataset_store.add(b"a,b\n1,x\n2,y\n3,x\n", "jobs.csv")
+    job = run(queue, lambda: wait_for(queue, queue.submit(dataset_id)))
+
+    assert job["status"] == DONE, job["error"]
+    assert job["charts_done"] == job["charts_total"] == 2
+    assert (tmp_path / "reports" / job["report_id"]).exists()
+    entry = queue.catalog.get(job["report_id"])
+    assert entry["dataset_id"] == dataset_id and entry["columns"] == ["a", "b"] and entry["rows"] == 3
+
+
+def test_queued_jobs_resume_after_restart(queue, tmp_path):
+    dataset_id, _ = dataset_store.add(b"a\n1\n2\n", "restart.csv")
+    dataset_store.persist(dataset_id)
+    with queue._connect() as db:
+        db.execute(
+            "INSERT INTO report_jobs (job_id, dataset_id, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+            ("left-over", dataset_id, QUEUED, "2024-01-01", "2024-01-01"),
+        )
+
+    assert run(queue, lambda: wait_for(queue, "left-over"))["status"] == DONE
+
+
+def test_only_jobs_of_exited_workers_are_requeued(queue):
+    exited = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"],
+                            capture_output=True, text=True).stdout.strip()
+    live = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+    host = socket.gethostname()
+    # Jobs with an unknown dataset fail fast once requeued; "restarted" was claimed under this
+    # process's name by a previous run
+    rows = [("live", f"{host}:{live.pid}"), ("exited", f"{host}:{exited}"), ("remote", "elsewhere:1"),
+            ("restarted", f"{host}:{os.getpid()}")]
+    with queue._connect() as db:
+        for job_id, owner in rows:
+            db.execute("INSERT INTO report_jobs (job_id, dataset_id, status, created_at, updated_at, owner) "
+                       "VALUES (?, ?, ?, ?, ?, ?)", (job_id, "0" * 64, RUNNING, "2024-01-01", "2999-01-01", owner))
+
+    try:
+        assert run(queue, lambda: [wait_for(queue, job_id)["status"] for job_id in ("exited", "restarted")]) \
+            == [FAILED, FAILED]
+        assert queue.get("live")["status"] == RUNNING
+        assert queue.get("remote")["status"] == RUNNING
+    finally:
+        live.kill()
+        live.wait()
+
+
+def test_leases_are_checked_periodically(queue, monkeypatch):
+    monkeypatch.setattr(config, "REPORT_JOB_RECHECK_SECONDS", 0.1)
+
+    def body():
+        # A job of another host that stopped making progress after the queue started
+        with queue._connect() as db:
+            db.execute("INSERT INTO report_jobs (job_id, dataset_id, status, created_at, updated_at, owner) "
+                       "VALUES (?, ?, ?, ?, ?, ?)", ("expired", "0" * 64, RUNNING, "2024-01-01", "2024-01-01",
+                                                     "elsewhere:1"))
+        return wait_for(queue, "expired")
+
+    assert run(queue, body)["status"] == FAILED
+
+
+def test_jobs_interrupted_by_shutdown_finish_after_restart(queue):
+    dataset_id, _ = dataset_store.add(b"a,b\n1,x\n2,y\n", "interrupted.csv")
+
+    def submit_and_wait_until_running():
+        job_id = queue.submit(dataset_id)
+        deadline = time.time() + 60
+        while queue.get(job_id)["status"] == QUEUED and time.time() < deadline:
+            time.sleep(0.01)
+        return job_id
+
+    job_id = run(queue, submit_and_wait_until_running)
+    job = queue.get(job_id)
+    assert job["status"] == QUEUED and job["owner"] is None
+    assert run(queue, lambda: wait_for(queue, job_id))["status"] == DONE
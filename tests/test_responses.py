@@ -0,0 +1,69 @@
+import asyncio
+
+import numpy as np
+import orjson
+import pandas as pd
+import pyarrow as pa
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app.utils.file_handler import ARROW_MEDIA_TYPE
+from app.utils.responses import (JSON_MEDIA_TYPE, NDJSON_MEDIA_TYPE, FastJSONResponse, frame_chunks, negotiate,
+                                 stream_frames)
+
+
+def request(accept=None):
+    headers = [(b"accept", accept.encode())] if accept is not None else []
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+def body(response) -> bytes:
+    async def read():
+        return b"".join([chunk async for chunk in response.body_iterator])
+    return asyncio.run(read())
+
+
+def test_negotiate():
+    assert negotiate(request()) == JSON_MEDIA_TYPE
+    assert negotiate(request("*/*")) == JSON_MEDIA_TYPE
+    assert negotiate(request("application/x-ndjson")) == NDJSON_MEDIA_TYPE
+    assert negotiate(request("application/json;q=0.5, application/vnd.apache.arrow.stream")) == ARROW_MEDIA_TYPE
+    assert negotiate(request("text/html, application/*;q=0.2")) == JSON_MEDIA_TYPE
+    # The format parameter overrides the Accept header
+    assert negotiate(request("application/json"), "ndjson") == NDJSON_MEDIA_TYPE
+
+    # Unrecognized Accept headers get JSON, as before content negotiation
+    assert negotiate(request("text/plain")) == JSON_MEDIA_TYPE
+    assert negotiate(request("text/html, image/*")) == JSON_MEDIA_TYPE
+    with pytest.raises(HTTPException) as e:
+        negotiate(request(), "xml")
+    assert e.value.status_code == 400
+    with pytest.raises(HTTPException):
+        negotiate(request(), "arrow", offered=(JSON_MEDIA_TYPE,))
+
+
+def test_fast_json_handles_numpy_and_pandas_values():
+    content = {"a": np.arange(3), "b": np.float64("nan"), "c": np.int64(7), 1: pd.Timestamp("2024-01-02"),
+               "d": pd.Series([1.5, 2.5]), "e": np.array(["x", None], dtype=object)}
+    assert orjson.loads(FastJSONResponse(content).body) == {
+        "a": [0, 1, 2], "b": None, "c": 7, "1": "2024-01-02T00:00:00", "d": [1.5, 2.5], "e": ["x", None]}
+
+
+def test_stream_frames():
+    df = pd.DataFrame({"row": np.arange(5), "prediction": [0.1, 0.2, np.nan, 0.4, 0.5]})
+
+    lines = body(stream_frames(frame_chunks(df, 2), NDJSON_MEDIA_TYPE)).decode().splitlines()
+    assert [orjson.loads(line) for line in lines] == [
+        {"row": 0, "prediction": 0.1}, {"row": 1, "prediction": 0.2}, {"row": 2, "prediction": None},
+        {"row": 3, "prediction": 0.4}, {"row": 4, "prediction": 0.5}]
+
+    reader = pa.ipc.open_stream(body(stream_frames(frame_chunks(df, 2), ARROW_MEDIA_TYPE)))
+    batches = list(reader)
+    assert [batch.num_rows for batch in batches] == [2, 2, 1]
+    pd.testing.assert_frame_equal(pa.Table.from_batches(batches).to_pandas(), df)
+
+    # An empty result is still a readable stream with its schema
+    table = pa.ipc.open_stream(body(stream_frames(frame_chunks(df.iloc[:0], 2), ARROW_MEDIA_TYPE))).read_all()
+    assert table.num_rows == 0 and table.column_names == ["row", "prediction"]
+    assert body(stream_frames(frame_chunks(df.iloc[:0], 2), NDJSON_MEDIA_TYPE)) == b""
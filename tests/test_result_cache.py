@@ -0,0 +1,179 @@
+import asyncio
+import os
+
+import pandas as pd
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from app.routes import analysis
+from app.services.dataset_store import DatasetStore
+from app.services.executor import ComputeExecutor
+from app.services.model_registry import ModelRegistry
+from app.services.result_cache import ResultCache, etag_matches, result_etag, result_key
+
+
+def test_result_key_and_etags():
+    key = result_key("descriptive", "d1", {"exact": True, "where": None})
+    assert key == result_key("descriptive", "d1", {"exact": True})
+    assert key != result_key("descriptive", "d1", {"exact": False})
+    assert key != result_key("profile", "d1", {"exact": True})
+
+    etag = result_etag(key)
+    assert etag_matches(etag, etag) and etag_matches(f'"x", {etag[2:]}', etag) and etag_matches("*", etag)
+    assert not etag_matches(None, etag) and not etag_matches('"other"', etag)
+
+
+def test_least_recently_used_results_are_evicted():
+    cache = ResultCache(max_bytes=10, ttl=0)
+    cache.put("a", b"aaaa")
+    cache.put("b", b"bbbb")
+    assert cache.get("a") == b"aaaa"
+    cache.put("c", b"cccc")
+    assert cache.get("b") is None and cache.get("a") == b"aaaa" and cache.get("c") == b"cccc"
+    # Results larger than the whole cache are not kept
+    cache.put("d", b"d" * 11)
+    assert cache.get("d") is None
+    assert cache.info()["bytes"] == 8 and cache.stats["evictions"] == 1
+
+
+def test_expired_results_are_not_served(tmp_path):
+    cache = ResultCache(max_bytes=100, ttl=60, disk_dir=str(tmp_path), disk_bytes=100)
+    cache.put("a", b"a")
+    assert cache.get("a") == b"a"
+    cache._results["a"] = (b"a", 0.0)
+    os.utime(tmp_path / "a.json", (0, 0))
+    assert cache.get("a") is None and not os.path.exists(tmp_path / "a.json")
+
+
+def test_disk_tier_survives_a_new_cache(tmp_path):
+    cache = ResultCache(max_bytes=100, ttl=0, disk_dir=str(tmp_path), disk_bytes=10)
+    cache.put("a", b"aaaa")
+    os.utime(tmp_path / "a.json", (1, 1))
+    cache.put("b", b"bbbb")
+    cache.put("c", b"cccc")
+    # The oldest result on disk went to stay within disk_bytes
+    assert sorted(os.listdir(tmp_path)) == ["b.json", "c.json"]
+
+    restarted = ResultCache(max_bytes=100, ttl=0, disk_dir=str(tmp_path), disk_bytes=10)
+    assert restarted.get("b") == b"bbbb" and restarted.get("a") is None
+    assert restarted.stats["disk_hits"] == 1
+
+
+def test_identical_requests_share_one_computation():
+    cache = ResultCache(max_bytes=1000, ttl=0)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"value": len(calls)}
+
+    async def main():
+        results = await asyncio.gather(*(cache.get_or_compute("k", compute) for _ in range(5)))
+        again = await cache.get_or_compute("k", compute)
+        return results, again
+
+    results, again = asyncio.run(main())
+    assert len(calls) == 1 and cache.stats["shared"] == 4
+    assert {body for body, _ in results} == {b'{"value":1}'} and again == (b'{"value":1}', True)
+
+
+def test_shared_computations_only_see_prepared_inputs():
+    cache = ResultCache(max_bytes=1000, ttl=0)
+    prepared = []
+
+    async def prepare():
+        # Stands for reading the request's upload, which is closed once that request ends
+        prepared.append(1)
+        return "rows"
+
+    async def compute(data):
+        await asyncio.sleep(0.05)
+        return {"data": data}
+
+    async def main():
+        first = asyncio.ensure_future(cache.get_or_compute("k", compute, prepare=prepare))
+        await asyncio.sleep(0.01)
+        second = asyncio.ensure_future(cache.get_or_compute("k", compute, prepare=prepare))
+        await asyncio.sleep(0)
+        # The first client hangs up; the request waiting on its computation is still served
+        first.cancel()
+        return await second
+
+    assert asyncio.run(main()) == (b'{"data":"rows"}', False)
+    assert len(prepared) == 1 and cache.stats["shared"] == 1
+
+
+def test_failed_computations_are_not_cached():
+    cache = ResultCache(max_bytes=1000, ttl=0)
+
+    async def fail():
+        raise HTTPException(status_code=400, detail="bad")
+
+    with pytest.raises(HTTPException):
+        asyncio.run(cache.get_or_compute("k", fail))
+    assert cache.get("k") is None and not cache._flights
+
+
+def test_cached_analysis_routes(tmp_path, monkeypatch):
+    monkeypatch.setattr(analysis, "result_cache", ResultCache(max_bytes=10 ** 6, ttl=0))
+    registry = ModelRegistry(str(tmp_path), 16, 16)
+    monkeypatch.setattr(analysis, "model_registry", registry)
+    monkeypatch.setattr(analysis, "compute", ComputeExecutor("thread", 1, 4, 60))
+    app = FastAPI()
+    app.include_router(analysis.router)
+    client = TestClient(app)
+    data = pd.DataFrame({"x": [1.0, 2.0, 3.0, 4.0], "y": [2.0, 4.1, 5.9, 8.0]}).to_csv(index=False).encode()
+
+    def post(path, params, headers=None):
+        return client.post(path, params=params, files={"file": ("d.csv", data, "text/csv")}, headers=headers)
+
+    first = post("/descriptive/", {})
+    second = post("/descriptive/", {})
+    assert first.headers["x-cache"] == "miss" and second.headers["x-cache"] == "hit"
+    assert first.json() == second.json() and first.headers["etag"] == second.headers["etag"]
+    assert post("/descriptive/", {"exact": False}).headers["etag"] != first.headers["etag"]
+
+    # Clients holding the ETag skip the download
+    unchanged = post("/descriptive/", {}, headers={"If-None-Match": first.headers["etag"]})
+    assert unchanged.status_code == 304 and unchanged.content == b""
+
+    fitted = post("/linear_regression/", {"x": "x", "y": "y"})
+    assert post("/linear_regression/", {"x": "x", "y": "y"}).headers["x-cache"] == "hit"
+    # Once the model is gone, the result is recomputed so its model_id can be used again
+    os.remove(registry._path(fitted.json()["model_id"]))
+    registry._models.clear()
+    refitted = post("/linear_regression/", {"x": "x", "y": "y"}, headers={"If-None-Match": fitted.headers["etag"]})
+    assert refitted.status_code == 200 and refitted.headers["x-cache"] == "miss"
+    assert fitted.json()["model_id"] in registry
+
+    assert post("/linear_regression/", {"x": "x", "y": "nope"}).status_code == 400
+    assert post("/decision_tree/", {"target_column": "y", "feature_columns": "x"}).headers["x-cache"] == "miss"
+
+    # The upload is hashed once, for the cache key, and the id reused to load it
+    hashed = []
+    dataset_id_of_file = DatasetStore.dataset_id_of_file
+    monkeypatch.setattr(DatasetStore, "dataset_id_of_file",
+                        staticmethod(lambda *args: hashed.append(1) or dataset_id_of_file(*args)))
+    assert post("/profile/", {}).headers["x-cache"] == "miss" and len(hashed) == 1
+
+
+def test_disk_usage_is_tracked_without_listing_the_directory(tmp_path, monkeypatch):
+    cache = ResultCache(max_bytes=100, ttl=0, disk_dir=str(tmp_path), disk_bytes=10)
+    cache.put("a", b"aaaa")
+    # Another worker's result, counted once the directory is listed again
+    (tmp_path / "w.json").write_bytes(b"wwww")
+    os.utime(tmp_path / "w.json", (1, 1))
+
+    def scandir(path):
+        raise AssertionError("listed the directory")
+
+    with monkeypatch.context() as patched:
+        patched.setattr(os, "scandir", scandir)
+        cache.put("b", b"bbbb")
+        assert cache._disk_total == 8 and "w.json" in os.listdir(tmp_path)
+
+    monkeypatch.setattr("app.services.result_cache.DISK_RESCAN_SECONDS", 0)
+    cache.put("c", b"cccc")
+    assert sorted(os.listdir(tmp_path)) == ["b.json", "c.json"] and cache._disk_total == 8
@@ -0,0 +1,166 @@
+import hashlib
+import io
+import os
+from datetime import datetime, timezone
+
+import pandas as pd
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routes import reports
+from app.services.dataset_store import DatasetStore
+from app.services.report_catalog import ReportCatalog
+from app.services.storage import LocalStorage, S3Storage, open_storage
+
+
+class ClientError(Exception):
+    def __init__(self, code):
+        super().__init__(code)
+        self.response = {"Error": {"Code": code}}
+
+
+class InMemoryS3:
+    """The subset of the boto3 S3 client the storage uses, keeping objects in a dict like a local MinIO."""
+
+    def __init__(self):
+        self.objects = {}
+
+    def _get(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise ClientError("NoSuchKey")
+        return self.objects[(Bucket, Key)]
+
+    def put_object(self, Bucket, Key, Body):
+        data = Body.read()
+        self.objects[(Bucket, Key)] = (data, datetime.now(timezone.utc))
+        return {"ETag": f'"{hashlib.md5(data).hexdigest()}"'}
+
+    def head_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise ClientError("404")
+        data, _ = self.objects[(Bucket, Key)]
+        return {"ContentLength": len(data), "ETag": f'"{hashlib.md5(data).hexdigest()}"'}
+
+    def get_object(self, Bucket, Key, Range=None):
+        data, _ = self._get(Bucket, Key)
+        if Range is not None:
+            start, end = Range[len("bytes="):].split("-")
+            data = data[int(start):int(end) + 1]
+        return {"Body": io.BytesIO(data)}
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop((Bucket, Key), None)
+
+    def list_objects_v2(self, Bucket, Prefix, ContinuationToken=None):
+        keys = sorted(key for bucket, key in self.objects if bucket == Bucket and key.startswith(Prefix))
+        start = int(ContinuationToken or 0)
+        page = keys[start:start + 2]
+        contents = [{"Key": key, "Size": len(self.objects[(Bucket, key)][0]),
+                     "LastModified": self.objects[(Bucket, key)][1]} for key in page]
+        truncated = start + 2 < len(keys)
+        return {"Contents": contents, "IsTruncated": truncated, "NextContinuationToken": str(start + 2)}
+
+
+@pytest.fixture(params=["local", "s3"])
+def storage(request, tmp_path):
+    if request.param == "local":
+        return LocalStorage(str(tmp_path / "store"))
+    return S3Storage("bucket", "reports/", client=InMemoryS3())
+
+
+def put(storage, key, data: bytes):
+    path = storage.staging_path(key)
+    with open(path, "wb") as f:
+        f.write(data)
+    storage.commit(path, key)
+
+
+def test_storage_contract(storage):
+    assert storage.size("a.pdf") is None
+    data = bytes(range(256)) * 4
+    put(storage, "a.pdf", data)
+    put(storage, "b.pdf", b"b")
+    put(storage, "c.pdf", b"cc")
+
+    assert storage.size("a.pdf") == 1024
+    assert storage.etag("a.pdf").startswith('"')
+    with storage.open("a.pdf") as f:
+        assert f.read() == data
+    assert b"".join(storage.read_range("a.pdf", 10, 1009, block_size=100)) == data[10:1010]
+    assert sorted((key, size) for key, size, _ in storage.list()) == [("a.pdf", 1024), ("b.pdf", 1), ("c.pdf", 2)]
+
+    # Replacing an object publishes the new bytes in one step
+    put(storage, "b.pdf", b"new")
+    with storage.open("b.pdf") as f:
+        assert f.read() == b"new"
+
+    storage.delete("b.pdf")
+    storage.delete("b.pdf")
+    assert storage.size("b.pdf") is None
+
+    staged = storage.staging_path("d.pdf")
+    storage.discard(staged)
+    assert not os.path.exists(staged)
+    assert "d.pdf" not in [key for key, _, _ in storage.list()]
+
+
+def test_local_staging_files_are_hidden_until_committed(tmp_path):
+    storage = LocalStorage(str(tmp_path))
+    staged = storage.staging_path("r.pdf")
+    with open(staged, "wb") as f:
+        f.write(b"partial")
+    assert list(storage.list()) == [] and storage.size("r.pdf") is None
+    assert os.path.dirname(staged) == str(tmp_path)
+
+
+def test_open_storage(tmp_path):
+    assert isinstance(open_storage(str(tmp_path)), LocalStorage)
+    assert open_storage(str(tmp_path)) is open_storage(str(tmp_path))
+    storage = S3Storage("bucket", client=InMemoryS3())
+    assert open_storage(storage) is storage
+
+
+def test_reports_on_s3_are_shared_between_catalogs(tmp_path):
+    storage = S3Storage("bucket", "reports", client=InMemoryS3())
+    first = ReportCatalog(str(tmp_path / "first.sqlite3"), storage)
+    # A replica with its own catalog, listing the same bucket
+    second = ReportCatalog(str(tmp_path / "second.sqlite3"), storage, sync_seconds=0.001)
+    assert second.list() == (0, [])
+
+    path = first.staging_path("r.pdf")
+    with open(path, "wb") as f:
+        f.write(b"%PDF" * 100)
+    entry = first.publish(path, "r.pdf", "d1", ["a"], rows=5)
+    assert entry["bytes"] == 400 and not os.path.exists(path)
+
+    assert second.get("r.pdf")["etag"] == entry["etag"]
+    total, entries = second.list()
+    assert total == 1 and entries[0]["report_id"] == "r.pdf"
+
+    app = FastAPI()
+    app.include_router(reports.router)
+    reports.report_catalog, saved = second, reports.report_catalog
+    try:
+        client = TestClient(app)
+        response = client.get("/download_report/r.pdf")
+        assert response.status_code == 200 and response.content == b"%PDF" * 100
+        assert response.headers["etag"] == entry["etag"]
+        response = client.get("/download_report/r.pdf", headers={"Range": "bytes=396-"})
+        assert response.status_code == 206 and response.content == b"%PDF"
+    finally:
+        reports.report_catalog = saved
+
+    second.remove("r.pdf")
+    assert first.storage.size("r.pdf") is None
+
+
+def test_datasets_written_through_are_loaded_by_other_stores():
+    storage = S3Storage("bucket", "datasets", client=InMemoryS3())
+    writer = DatasetStore(max_bytes=10 ** 9, spill_dir=storage, write_through=True)
+    dataset_id, df = writer.add(b"a,b\n1,x\n2,y\n", "shared.csv")
+
+    reader = DatasetStore(max_bytes=10 ** 9, spill_dir=storage)
+    assert dataset_id in reader
+    pd.testing.assert_frame_equal(reader.get(dataset_id), df)
+    assert reader.stats["disk_hits"] == 1